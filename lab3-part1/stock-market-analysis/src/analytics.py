@@ -0,0 +1,195 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from settings import config
+
+# Return periods per year of the stored bars
+PERIODS_PER_YEAR = {"trading": 252, "calendar": 365}
+
+
+def align_prices(frames: Dict[str, pd.DataFrame], column: str = "adj_close"):
+    """Align the prices of many tickers on the union of their dates.
+
+    Returns `(dates, tickers, prices)` where `prices` is a (dates x tickers) float64 matrix with
+    NaN on the days a ticker has no bar. Tickers without data are left out.
+    """
+    tickers = [ticker for ticker, df in frames.items() if df is not None and not df.empty]
+    days = [frames[ticker]["datetime"].to_numpy(dtype="datetime64[D]") for ticker in tickers]
+    dates = np.unique(np.concatenate(days)) if days else np.array([], dtype="datetime64[D]")
+
+    prices = np.full((len(dates), len(tickers)), np.nan)
+    for i, ticker in enumerate(tickers):
+        prices[np.searchsorted(dates, days[i]), i] = frames[ticker][column].to_numpy(
+            dtype="float64"
+        )
+    return dates, tickers, prices
+
+
+def forward_fill_in_place(values: np.ndarray):
+    # Carry the last valid value of every column over its NaNs, leading NaNs are kept
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+    rows = np.where(missing, 0, np.arange(len(values))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    values[:] = values[rows, np.arange(values.shape[1])]
+    return values
+
+
+def compute_returns(prices: np.ndarray, missing: np.ndarray = None):
+    # Simple returns, NaN before a ticker's first price and on the `missing` days. The return of
+    # the first bar after a gap spans the whole gap
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = prices[1:] / prices[:-1] - 1
+    if missing is not None:
+        returns[missing[1:]] = np.nan
+    return returns
+
+
+def infer_periods_per_year(dates: np.ndarray, valid: np.ndarray):
+    """Return periods per year of every column, from the spacing of the dates it has a price on.
+
+    Rows stored on trading days have about 252 bars a year, rows stored on calendar days (e.g.
+    before the trading calendar was the default) 365. Columns with less than two dates get the
+    count of `OHLC_CALENDAR`.
+    """
+    if len(dates) == 0:
+        return np.full(valid.shape[1], PERIODS_PER_YEAR[config.OHLC_CALENDAR], dtype="float64")
+
+    days = dates.astype("datetime64[D]").astype("int64")
+    counts = valid.sum(axis=0)
+    first = days[np.argmax(valid, axis=0)]
+    last = days[len(days) - 1 - np.argmax(valid[::-1], axis=0)]
+    span = np.where(counts > 1, last - first, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bars_per_year = (counts - 1) / span * 365.25
+
+    candidates = np.array(sorted(PERIODS_PER_YEAR.values()), dtype="float64")
+    nearest = candidates[np.abs(bars_per_year[:, None] - candidates).argmin(axis=1)]
+    return np.where(span > 0, nearest, PERIODS_PER_YEAR[config.OHLC_CALENDAR])
+
+
+def _column_moments(returns: np.ndarray):
+    valid = ~np.isnan(returns)
+    counts = valid.sum(axis=0)
+    filled = np.where(valid, returns, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = filled.sum(axis=0) / counts
+    centered = np.where(valid, returns - means, 0.0)
+    return valid, counts, means, centered
+
+
+def rolling_volatility(returns: np.ndarray, window: int, periods_per_year: np.ndarray):
+    """Annualized standard deviation of the returns over a trailing `window`, in O(n)."""
+    valid = ~np.isnan(returns)
+    filled = np.where(valid, returns, 0.0)
+    zeros = np.zeros((1, returns.shape[1]))
+    cum = np.concatenate([zeros, np.cumsum(filled, axis=0)])
+    cum_sq = np.concatenate([zeros, np.cumsum(filled**2, axis=0)])
+    cum_n = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    s, s2, n = (c[window:] - c[:-window] for c in (cum, cum_sq, cum_n))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = np.where(n > 1, (s2 - s**2 / n) / (n - 1), np.nan)
+    return np.sqrt(np.clip(variance, 0, None) * periods_per_year)
+
+
+def max_drawdowns(prices: np.ndarray):
+    peaks = np.fmax.accumulate(prices, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nanmin(prices / peaks - 1, axis=0, initial=0.0)
+
+
+def covariance(returns: np.ndarray, periods_per_year: np.ndarray):
+    """Annualized covariance matrix over the days both tickers have a return.
+
+    Computed with two matrix products, using every column's own mean. Every pair is annualized
+    with the geometric mean of the periods per year of its two columns.
+    """
+    valid, _, _, centered = _column_moments(returns)
+    valid = valid.astype("float64")
+    pair_counts = valid.T @ valid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = (centered.T @ centered) / (pair_counts - 1)
+    cov[pair_counts < 2] = np.nan
+    return cov * np.sqrt(np.outer(periods_per_year, periods_per_year))
+
+
+def correlation(cov: np.ndarray):
+    std = np.sqrt(np.diag(cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.clip(cov / np.outer(std, std), -1.0, 1.0)
+
+
+def summarize(
+    prices: np.ndarray, returns: np.ndarray, periods_per_year: np.ndarray, risk_free_rate
+):
+    # Per column performance metrics of a (dates x tickers) price matrix and its returns
+    _, counts, means, centered = _column_moments(returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt((centered**2).sum(axis=0) / (counts - 1))
+        first = prices[np.argmax(~np.isnan(prices), axis=0), np.arange(prices.shape[1])]
+        total_return = prices[-1] / first - 1
+        annual_return = (1 + total_return) ** (periods_per_year / counts) - 1
+        sharpe = (means - risk_free_rate / periods_per_year) / std * np.sqrt(periods_per_year)
+    return {
+        "total_return": total_return,
+        "annual_return": annual_return,
+        "annual_volatility": std * np.sqrt(periods_per_year),
+        "sharpe_ratio": sharpe,
+        "max_drawdown": max_drawdowns(prices),
+    }
+
+
+def analyze_prices(
+    dates: np.ndarray,
+    tickers: List[str],
+    prices: np.ndarray,
+    window: int = 21,
+    risk_free_rate: float = 0.0,
+):
+    """Returns, volatility, drawdowns, Sharpe ratios and covariance of all tickers at once.
+
+    The portfolio is the equally weighted, daily rebalanced mix of the tickers trading each day.
+    Days a ticker has no bar are left out of its returns rather than counted as flat, and every
+    ticker is annualized with the periods per year of its own dates.
+    """
+    missing = np.isnan(prices)
+    periods_per_year = infer_periods_per_year(dates, ~missing)
+    prices = forward_fill_in_place(prices.copy())
+    returns = compute_returns(prices, missing)
+
+    summary = pd.DataFrame(
+        summarize(prices, returns, periods_per_year, risk_free_rate), index=tickers
+    )
+    rolling = rolling_volatility(returns, window, periods_per_year)
+    summary["rolling_volatility"] = rolling[-1] if len(rolling) else np.nan
+
+    valid = ~np.isnan(returns)
+    n_trading = valid.sum(axis=1, keepdims=True)
+    portfolio_returns = np.where(
+        n_trading > 0,
+        np.where(valid, returns, 0.0).sum(axis=1, keepdims=True) / np.maximum(n_trading, 1),
+        np.nan,
+    )
+    portfolio_value = np.concatenate(
+        [[[1.0]], np.cumprod(1 + np.nan_to_num(portfolio_returns), axis=0)]
+    )
+    portfolio_periods = infer_periods_per_year(dates, np.ones((len(dates), 1), dtype=bool))
+    portfolio = {
+        key: float(value[0])
+        for key, value in summarize(
+            portfolio_value, portfolio_returns, portfolio_periods, risk_free_rate
+        ).items()
+    }
+
+    cov = covariance(returns, periods_per_year)
+    return {
+        "summary": summary,
+        "portfolio": portfolio,
+        "covariance": pd.DataFrame(cov, index=tickers, columns=tickers),
+        "correlation": pd.DataFrame(correlation(cov), index=tickers, columns=tickers),
+        "rolling_volatility": pd.DataFrame(
+            rolling, index=pd.DatetimeIndex(dates[window:]), columns=tickers
+        ),
+    }
@@ -0,0 +1,234 @@
+import argparse
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import List, Literal
+
+import pandas as pd
+import uvicorn
+from async_manager import (
+    AsyncPortfolioManager,
+    AsyncTickerDataManager,
+    AsyncUserManager,
+    DuplicatePortfolioError,
+)
+from db import get_async_client
+from export import ArrowStreamEncoder, frame_to_json_records
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from ingest import OHLC_COLUMNS
+from manager import DuplicateUsernameError
+from migrations import ensure_indexes
+from models import (
+    PortfolioCreateModel,
+    PortfolioModel,
+    PortfolioPreviewModel,
+    UserBase,
+    UserCreateModel,
+    UserDetailsModel,
+)
+from settings import config, get_logger, get_password_hash
+from starlette.concurrency import run_in_threadpool
+
+logger = get_logger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(ensure_indexes)
+    # One connection pool shared by every request of the process
+    app.state.client = get_async_client()
+    app.state.db = app.state.client["yf_panels"]
+    logger.info(f"Connected to MongoDB with a pool of {config.API_MONGO_POOL_SIZE} connections")
+    yield
+    app.state.client.close()
+
+
+app = FastAPI(title="Stock Market Analysis", lifespan=lifespan)
+security = HTTPBasic()
+
+
+###################################################################################################
+# Dependencies
+###################################################################################################
+def get_db(request: Request):
+    return request.app.state.db
+
+
+async def get_username(
+    credentials: HTTPBasicCredentials = Depends(security), db=Depends(get_db)
+):
+    if not await AsyncUserManager(db).verify_user(credentials.username, credentials.password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid username or password",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    return credentials.username
+
+
+def get_portfolio_manager(username: str = Depends(get_username), db=Depends(get_db)):
+    return AsyncPortfolioManager(username, db)
+
+
+###################################################################################################
+# User Management
+###################################################################################################
+@app.post("/users", response_model=UserDetailsModel, status_code=status.HTTP_201_CREATED)
+async def create_user(user: UserCreateModel, db=Depends(get_db)):
+    try:
+        return await AsyncUserManager(db).create_user(
+            UserBase(
+                username=user.username,
+                name=user.name,
+                password=await run_in_threadpool(get_password_hash, user.password),
+                created_at=datetime.utcnow(),
+            )
+        )
+    except DuplicateUsernameError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@app.get("/users/me", response_model=UserDetailsModel)
+async def get_user_info(username: str = Depends(get_username), db=Depends(get_db)):
+    try:
+        return await AsyncUserManager(db).get_user_details(username)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+###################################################################################################
+# Portfolio Management
+###################################################################################################
+@app.get("/portfolios", response_model=List[PortfolioPreviewModel])
+async def list_all_portfolios(portfolio_manager=Depends(get_portfolio_manager)):
+    return await portfolio_manager.get_portfolios()
+
+
+@app.post(
+    "/portfolios", response_model=PortfolioPreviewModel, status_code=status.HTTP_201_CREATED
+)
+async def create_portfolio(
+    portfolio: PortfolioCreateModel, portfolio_manager=Depends(get_portfolio_manager)
+):
+    try:
+        return await portfolio_manager.create_portfolio(
+            PortfolioModel(
+                username=portfolio_manager.username,
+                portfolio_name=portfolio.portfolio_name,
+                created_at=datetime.utcnow(),
+            )
+        )
+    except DuplicatePortfolioError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@app.get("/portfolios/{portfolio_id}", response_model=PortfolioPreviewModel)
+async def get_portfolio(portfolio_id: str, portfolio_manager=Depends(get_portfolio_manager)):
+    try:
+        return await portfolio_manager.get_portfolio_by_id(portfolio_id)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@app.delete("/portfolios/{portfolio_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def remove_portfolio(portfolio_id: str, portfolio_manager=Depends(get_portfolio_manager)):
+    try:
+        await portfolio_manager.remove_portfolio(portfolio_id)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@app.put("/portfolios/{portfolio_id}/tickers/{ticker_code}", response_model=PortfolioPreviewModel)
+async def add_stock(
+    portfolio_id: str, ticker_code: str, portfolio_manager=Depends(get_portfolio_manager)
+):
+    try:
+        return await portfolio_manager.add_stock(ticker_code, portfolio_id)
+    except (LookupError, ValueError) as e:
+        # Unknown portfolios and invalid ticker codes
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@app.delete(
+    "/portfolios/{portfolio_id}/tickers/{ticker_code}", response_model=PortfolioPreviewModel
+)
+async def remove_stock(
+    portfolio_id: str, ticker_code: str, portfolio_manager=Depends(get_portfolio_manager)
+):
+    try:
+        return await portfolio_manager.remove_stock(ticker_code, portfolio_id)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+###################################################################################################
+# Market Data
+###################################################################################################
+async def stream_json(frames):
+    # A JSON array of rows written one batch at a time
+    yield b"["
+    first = True
+    async for frame in frames:
+        if not frame.empty:
+            yield (b"" if first else b",") + frame_to_json_records(frame)
+            first = False
+    yield b"]"
+
+
+async def stream_arrow(frames, columns: list):
+    encoder = ArrowStreamEncoder()
+    async for frame in frames:
+        yield encoder.write(frame)
+    if encoder.writer is None:
+        # Still a valid stream, with the requested columns and no rows
+        yield encoder.write(pd.DataFrame(columns=columns))
+    yield encoder.close()
+
+
+@app.get("/market-data/{ticker_code}")
+async def fetch_stock_data(
+    request: Request,
+    ticker_code: str,
+    start_date: date = None,
+    end_date: date = None,
+    columns: List[str] = Query(default=None),
+    format: Literal["json", "arrow"] = "json",
+    batch_size: int = Query(default=config.OHLC_STREAM_BATCH_SIZE, gt=0),
+    username: str = Depends(get_username),
+):
+    start_date = datetime.combine(start_date, datetime.min.time()) if start_date else None
+    end_date = datetime.combine(end_date, datetime.min.time()) if end_date else datetime.utcnow()
+    try:
+        ticker_store = await AsyncTickerDataManager.sync_store(ticker_code, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    frames = AsyncTickerDataManager(request.app.state.client).iter_stock_data(
+        ticker_store, start_date, end_date, columns=columns, batch_size=batch_size
+    )
+    if format == "arrow":
+        return StreamingResponse(
+            stream_arrow(frames, ["datetime", *columns] if columns else OHLC_COLUMNS),
+            media_type="application/vnd.apache.arrow.stream",
+        )
+    return StreamingResponse(stream_json(frames), media_type="application/json")
+
+
+###################################################################################################
+# Server
+###################################################################################################
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API of Stock Market Analysis Application")
+    parser.add_argument("--host", type=str, default=config.API_HOST, help="Address to bind")
+    parser.add_argument("--port", type=int, default=config.API_PORT, help="Port to bind")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes, each with its own pool"
+    )
+    args = parser.parse_args()
+
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
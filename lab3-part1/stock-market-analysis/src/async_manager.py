@@ -0,0 +1,226 @@
+import asyncio
+import secrets
+from datetime import datetime
+
+import pandas as pd
+import pymongo
+from auth import SessionStore
+from db import PyObjectId
+from manager import DuplicateUsernameError, TickerDataManager, TickerInfoManager
+from models import (
+    PortfolioModel,
+    PortfolioPreviewModel,
+    TickerSummaryModel,
+    UserBase,
+    UserDetailsModel,
+)
+from pymongo.errors import DuplicateKeyError
+from settings import config, get_logger, verify_password
+
+logger = get_logger(__name__)
+
+# Sessions of the API users, kept apart from the session file of the command line
+api_session_store = SessionStore(session_file=None, secret=secrets.token_bytes(32))
+
+
+class DuplicatePortfolioError(ValueError):
+    pass
+
+
+class PortfolioNotFoundError(LookupError):
+    pass
+
+
+class AsyncUserManager:
+    """`UserManager` on a motor database, bcrypt runs in a worker thread."""
+
+    def __init__(self, db, session_store=api_session_store):
+        self.users_collection = db["users"]
+        self.session_store = session_store
+
+    async def create_user(self, user_data: UserBase):
+        user_data = user_data.model_dump()
+        if await self.users_collection.find_one({"username": user_data["username"]}, {"_id": 1}):
+            raise DuplicateUsernameError("Username already exists")
+
+        try:
+            await self.users_collection.insert_one(user_data)
+        except DuplicateKeyError:
+            # Created concurrently since the check, the unique index rejected it
+            raise DuplicateUsernameError("Username already exists")
+        logger.info(f"Created user with username: {user_data['username']} successfully.")
+        return UserDetailsModel(**user_data)
+
+    async def get_user_details(self, username: str):
+        user = await self.users_collection.find_one({"username": username}, {"_id": 0})
+        if user:
+            return UserDetailsModel(**user)
+        else:
+            raise ValueError("User not found")
+
+    async def verify_user(self, username: str, password):
+        user = await self.users_collection.find_one({"username": username}, {"password": 1})
+        if not user:
+            return False
+
+        # HMAC checks are CPU bound too
+        if self.session_store is not None and await asyncio.to_thread(
+            self.session_store.is_valid, username, password, user["password"]
+        ):
+            return True
+
+        if await asyncio.to_thread(verify_password, password, user["password"]):
+            if self.session_store is not None:
+                await asyncio.to_thread(
+                    self.session_store.add, username, password, user["password"]
+                )
+            return True
+        else:
+            return False
+
+
+class AsyncPortfolioManager:
+    """`PortfolioManager` on a motor database, raising instead of logging on invalid requests."""
+
+    def __init__(self, username: str, db):
+        self.username = username
+        self.portfolios_collection = db["portfolios"]
+
+    def _query(self, portfolio_id: str):
+        try:
+            return {"username": self.username, "_id": PyObjectId.validate(portfolio_id)}
+        except ValueError:
+            raise PortfolioNotFoundError(f"Invalid portfolio id: '{portfolio_id}'")
+
+    async def create_portfolio(self, portfolio_data: PortfolioModel):
+        portfolio_data = portfolio_data.model_dump()
+        if await self.portfolios_collection.find_one(
+            {"username": self.username, "portfolio_name": portfolio_data["portfolio_name"]},
+            {"_id": 1},
+        ):
+            raise DuplicatePortfolioError(
+                f"Portfolio cannot have the same name: '{portfolio_data['portfolio_name']}'"
+            )
+
+        try:
+            new_portfolio = await self.portfolios_collection.insert_one(portfolio_data)
+        except DuplicateKeyError:
+            # Created concurrently since the check, the unique index rejected it
+            raise DuplicatePortfolioError(
+                f"Portfolio cannot have the same name: '{portfolio_data['portfolio_name']}'"
+            )
+        logger.info(
+            f"Created portfolio with name: '{portfolio_data['portfolio_name']}' and"
+            f" portfolio _id: '{new_portfolio.inserted_id}' successfully."
+        )
+        return PortfolioPreviewModel(**portfolio_data)
+
+    async def get_portfolios(self):
+        cursor = self.portfolios_collection.find({"username": self.username})
+        return [PortfolioPreviewModel(**portfolio) async for portfolio in cursor]
+
+    async def get_portfolio_by_id(self, portfolio_id: str):
+        portfolio = await self.portfolios_collection.find_one(self._query(portfolio_id))
+        if portfolio:
+            return PortfolioPreviewModel(**portfolio)
+        else:
+            raise PortfolioNotFoundError(f"Invalid portfolio id: '{portfolio_id}'")
+
+    async def add_stock(self, ticker_code: str, portfolio_id: str):
+        portfolio = await self.get_portfolio_by_id(portfolio_id)
+        if any(ticker.ticker_code == ticker_code for ticker in portfolio.tickers or []):
+            return portfolio
+
+        # Cached in-process, the database or Yahoo Finance are only queried on a miss
+        ticker_info = await asyncio.to_thread(TickerInfoManager.get_ticker_details, ticker_code)
+
+        # Portfolios created without tickers hold null, which `$push` cannot extend
+        await self.portfolios_collection.update_one(
+            {**self._query(portfolio_id), "tickers": None}, {"$set": {"tickers": []}}
+        )
+        # Atomic, concurrent requests cannot overwrite each other or add a ticker twice
+        updated = await self.portfolios_collection.find_one_and_update(
+            {
+                **self._query(portfolio_id),
+                "tickers.ticker_code": {"$ne": ticker_info["ticker_code"]},
+            },
+            {
+                "$push": {"tickers": TickerSummaryModel(**ticker_info).model_dump()},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if updated is None:
+            # Added by a concurrent request
+            return await self.get_portfolio_by_id(portfolio_id)
+        return PortfolioPreviewModel(**updated)
+
+    async def remove_stock(self, ticker_code: str, portfolio_id: str):
+        updated = await self.portfolios_collection.find_one_and_update(
+            {**self._query(portfolio_id), "tickers.ticker_code": ticker_code},
+            {
+                "$pull": {"tickers": {"ticker_code": ticker_code}},
+                "$set": {"updated_at": datetime.utcnow()},
+            },
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if updated is None:
+            # Raises if the portfolio itself does not exist
+            await self.get_portfolio_by_id(portfolio_id)
+            raise LookupError(f"Ticker '{ticker_code}' not found in the portfolio.")
+        return PortfolioPreviewModel(**updated)
+
+    async def remove_portfolio(self, portfolio_id: str):
+        result = await self.portfolios_collection.delete_one(self._query(portfolio_id))
+        if not result.deleted_count:
+            raise PortfolioNotFoundError(f"Invalid portfolio id: '{portfolio_id}'")
+        logger.info(f"Successfully removed portfolio '{portfolio_id}'.")
+
+
+class AsyncTickerDataManager:
+    """Reads ticker data through motor once `TickerDataManager` brought it up to date."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    async def sync_store(
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        # Downloads and inserts are blocking, they run in a worker thread
+        _, ticker_store = await asyncio.to_thread(
+            TickerDataManager._get_synced_store,
+            ticker_code,
+            start_date,
+            end_date or datetime.utcnow(),
+            strict,
+        )
+        return ticker_store
+
+    async def iter_stock_data(
+        self,
+        ticker_store,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        columns: list = None,
+        batch_size: int = config.OHLC_STREAM_BATCH_SIZE,
+    ):
+        """Stream the data of a synced ticker store as DataFrames of at most `batch_size` rows."""
+        projection = {"_id": 0}
+        if columns:
+            projection.update({column: 1 for column in ["datetime", *columns]})
+        query, projection = ticker_store.find_args(
+            TickerDataManager._date_query(start_date, end_date or datetime.utcnow()), projection
+        )
+        collection = ticker_store.collection
+        cursor = (
+            self.client[collection.database.name][collection.name]
+            .find(query, projection)
+            .sort("datetime", pymongo.ASCENDING)
+            .batch_size(batch_size)
+        )
+        while batch := await cursor.to_list(length=batch_size):
+            yield pd.DataFrame(batch)
@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+
+def get_session_secret(secret_file: str = config.SESSION_SECRET_FILE):
+    if config.SESSION_SECRET:
+        return config.SESSION_SECRET.encode()
+
+    # Generate a per-installation secret readable only by the current user
+    try:
+        with open(secret_file, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        secret = secrets.token_hex(32).encode()
+        fd = os.open(secret_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secret)
+        return secret
+
+
+class SessionStore:
+    """File-based store of recently verified credentials, so commands can skip bcrypt.
+
+    Entries only hold an HMAC of the credentials and an expiry time, and are signed with the
+    session secret so editing the file invalidates them. The HMAC covers the stored bcrypt hash
+    too: guessing passwords from the file also needs the users collection, and changing the
+    password invalidates the sessions. Without a `session_file`, sessions are only kept in the
+    memory of the process.
+    """
+
+    def __init__(
+        self,
+        session_file: Optional[str] = config.SESSION_FILE,
+        ttl: float = config.SESSION_TTL,
+        secret: bytes = None,
+    ):
+        self.session_file = session_file
+        self.ttl = ttl
+        self._secret = secret
+        self.lock = threading.Lock()
+        # Credentials verified by this process, e.g. during a batch run
+        self.verified = {}
+
+    @property
+    def secret(self):
+        if self._secret is None:
+            self._secret = get_session_secret()
+        return self._secret
+
+    def _sign(self, message: str):
+        return hmac.new(self.secret, message.encode(), hashlib.sha256).hexdigest()
+
+    def _credential(self, username: str, password: str, password_hash: str):
+        return self._sign(f"credential\0{username}\0{password_hash}\0{password}")
+
+    def _load(self):
+        if self.session_file is None:
+            return {}
+        try:
+            with open(self.session_file) as f:
+                sessions = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+        now = time.time()
+        return {
+            username: session
+            for username, session in sessions.items()
+            if session.get("expires_at", 0) > now
+            and hmac.compare_digest(
+                session.get("signature", ""),
+                self._sign(f"{username}\0{session['credential']}\0{session['expires_at']}"),
+            )
+        }
+
+    def _save(self, sessions: dict):
+        fd = os.open(self.session_file + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(sessions, f)
+        os.replace(self.session_file + ".tmp", self.session_file)
+
+    def is_valid(self, username: str, password: str, password_hash: str):
+        if self.ttl <= 0:
+            return False
+
+        credential = self._credential(username, password, password_hash)
+        expires_at = self.verified.get(username, {}).get(credential, 0)
+        if expires_at > time.time():
+            return True
+
+        session = self._load().get(username)
+        if session and hmac.compare_digest(session["credential"], credential):
+            self.verified[username] = {credential: session["expires_at"]}
+            return True
+        return False
+
+    def add(self, username: str, password: str, password_hash: str):
+        if self.ttl <= 0:
+            return
+
+        credential = self._credential(username, password, password_hash)
+        expires_at = time.time() + self.ttl
+        self.verified[username] = {credential: expires_at}
+        if self.session_file is None:
+            return
+        with self.lock:
+            sessions = self._load()
+            sessions[username] = {
+                "credential": credential,
+                "expires_at": expires_at,
+                "signature": self._sign(f"{username}\0{credential}\0{expires_at}"),
+            }
+            self._save(sessions)
+
+    def remove(self, username: str):
+        self.verified.pop(username, None)
+        if self.session_file is None:
+            return
+        with self.lock:
+            sessions = self._load()
+            if sessions.pop(username, None) is not None:
+                self._save(sessions)
+
+
+session_store = SessionStore()
@@ -0,0 +1,747 @@
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from analytics import align_prices, analyze_prices
+from auth import SessionStore
+from cache import ArrayCache, ForecastCache
+from export import iter_frames, write_frames
+from forecast import (
+    LSTMForecaster,
+    WindowDataset,
+    forecast_prices,
+    last_valid_dates,
+    normalize_returns,
+)
+from indicators import refresh_indicators, update_indicators
+from ingest import insert_ohlc_data
+from intraday import get_bars, ingest_intraday_data, read_bars, rollup_bars, select_tier
+from manager import UserManager
+from rich.pretty import pretty_repr
+from scheduler import fetch_stocks_data
+from settings import get_logger, get_password_hash
+from storage import CollectionTickerStore, TimeSeriesTickerStore, get_range_data
+from yf import TokenBucket, preprocess_ticker_data, preprocess_ticker_panel
+
+logger = get_logger(__name__)
+
+
+###################################################################################################
+# Helpers
+###################################################################################################
+def get_benchmark_client(backend: str, mongodb_uri: str = None):
+    if backend == "mongomock":
+        import mongomock
+
+        return mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+
+        return MongoClient(mongodb_uri or "mongodb://localhost:27017")
+
+
+def make_synthetic_ohlc(years: int = 50, seed: int = 0, end_date: str = "2024-01-31"):
+    # Daily calendar bars shaped like the output of `yf.preprocess_ticker_data`
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=end_date, periods=int(years * 365.25), freq="D")
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    spread = np.abs(rng.normal(0, 0.005, len(dates))) * close
+    return pd.DataFrame(
+        {
+            "datetime": dates,
+            "open": close + rng.uniform(-1, 1, len(dates)) * spread,
+            "high": close + spread,
+            "low": close - spread,
+            "close": close,
+            "adj_close": close * 0.98,
+            "volume": rng.integers(1_000, 10_000_000, len(dates)).astype("float64"),
+        }
+    )
+
+
+def make_synthetic_intraday(days: int = 20, seed: int = 0, end_date: str = "2024-01-31"):
+    # Minute bars of a regular US session (14:30-21:00 UTC) on weekdays
+    rng = np.random.default_rng(seed)
+    sessions = pd.bdate_range(end=end_date, periods=days)
+    minutes = pd.timedelta_range("14:30:00", periods=390, freq="1min")
+    index = (sessions.values[:, None] + minutes.values[None, :]).ravel()
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(index))))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, len(index))) * close
+    return pd.DataFrame(
+        {
+            "datetime": pd.DatetimeIndex(index),
+            "open": open_,
+            "high": np.maximum(open_, close) + spread,
+            "low": np.minimum(open_, close) - spread,
+            "close": close,
+            "adj_close": close,
+            "volume": rng.integers(100, 10_000, len(index)).astype("float64"),
+        }
+    )
+
+
+def make_synthetic_yahoo_frame(n_rows: int, seed: int = 0, missing: float = 0.01):
+    # Business day bars shaped like a Yahoo download, with a few missing values
+    df = make_synthetic_ohlc(years=n_rows / 261 + 1, seed=seed).set_index("datetime")
+    df = df[df.index.dayofweek < 5].tail(n_rows)
+    df.index.name = "Date"
+    df.columns = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    mask = np.random.default_rng(seed).random(df.shape) < missing
+    return df.mask(mask)
+
+
+def legacy_preprocess(df):
+    # The former `clean_ticker_data` -> `resample` -> `basic_preprocess` chain
+    df = df.reset_index()
+    df.columns = [col.lower().replace(" ", "_") for col in df.columns]
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.sort_values(by="date", ascending=True)
+    df.rename(columns={"date": "datetime"}, inplace=True)
+    df = df.set_index("datetime")
+    df = df.resample("D").asfreq()
+    df = df.astype("float64")
+    df = df.interpolate(method="time")
+    df = df.bfill()
+    return df.reset_index()
+
+
+def loop_windows(series: dict, window: int):
+    # Training windows built the notebook way, one copied slice per sample
+    windows, targets = [], []
+    for values in series.values():
+        for i in range(len(values) - window):
+            windows.append(values[i : i + window])
+            targets.append(values[i + window])
+    return np.array(windows)[:, :, None], np.array(targets)
+
+
+def measure(fn, *args, repeat: int = 5):
+    # Median wall time and peak traced allocations of a call
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(timings)), peak
+
+
+def make_fake_yahoo_backend(bucket: TokenBucket, latency: float, years: int):
+    # Stands in for `TickerDataManager.get_stock_data` with a rate limited, slow network call
+    def fetch(ticker_code: str, start_date=None, end_date=None):
+        bucket.acquire()
+        time.sleep(latency)
+        return make_synthetic_ohlc(years=years, seed=len(ticker_code)).to_dict("records")
+
+    return fetch
+
+
+def report(name: str, results: dict):
+    logger.info(f"Benchmark '{name}':\n{pretty_repr(results)}")
+
+
+# Imports the CLI in a fresh interpreter and runs one command, counting MongoDB commands sent
+STARTUP_SCRIPT = """
+import json, sys, time
+
+out_file, backend, argv = sys.argv[1], sys.argv[2], sys.argv[3:]
+commands = []
+if backend == "mongomock":
+    import mongomock, pymongo
+
+    pymongo.MongoClient = mongomock.MongoClient
+else:
+    from pymongo import monitoring
+
+    class CommandCounter(monitoring.CommandListener):
+        def started(self, event):
+            commands.append(event.command_name)
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    monitoring.register(CommandCounter())
+
+start = time.perf_counter()
+import main
+
+import_seconds, import_commands = time.perf_counter() - start, list(commands)
+start = time.perf_counter()
+sys.argv = ["main.py"] + argv
+try:
+    main.main()
+except (Exception, SystemExit):
+    pass
+command_seconds = time.perf_counter() - start
+
+with open(out_file, "w") as f:
+    json.dump(
+        {
+            "import_seconds": import_seconds,
+            "command_seconds": command_seconds,
+            "import_commands": import_commands,
+            "commands": commands[len(import_commands):],
+        },
+        f,
+    )
+"""
+
+
+###################################################################################################
+# Benchmarks
+###################################################################################################
+def bench_ingest(args):
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    results = {}
+    for strict in (True, False):
+        db = client[f"bench_ingest_{'strict' if strict else 'columnar'}"]
+        client.drop_database(db.name)
+
+        n_rows, elapsed = 0, 0.0
+        for i in range(args.tickers):
+            df = make_synthetic_ohlc(years=args.years, seed=i)
+            start = time.perf_counter()
+            n_rows += insert_ohlc_data(db[f"T{i:04d}"], df, strict=strict)
+            elapsed += time.perf_counter() - start
+
+        results["pydantic" if strict else "columnar"] = {
+            "rows": n_rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(n_rows / elapsed),
+        }
+        client.drop_database(db.name)
+
+    results["speedup"] = round(
+        results["columnar"]["rows_per_second"] / results["pydantic"]["rows_per_second"], 2
+    )
+    report("ingest", results)
+
+
+def bench_fetch(args):
+    # Portfolio with one repeated ticker, like `portfolio-sample/user1.yaml`
+    ticker_codes = [f"T{i:04d}" for i in range(args.tickers)] + ["T0000"]
+    results = {}
+    for max_workers in sorted({1, args.max_workers}):
+        bucket = TokenBucket(rate=args.rate, period=args.period)
+        _, fetch_report = fetch_stocks_data(
+            ticker_codes,
+            max_workers=max_workers,
+            fetch_fn=make_fake_yahoo_backend(bucket, args.latency, args.years),
+        )
+        latencies = [stats.seconds for stats in fetch_report.tickers]
+        results[f"workers_{max_workers}"] = {
+            "tickers": len(fetch_report.tickers),
+            "wall_seconds": round(fetch_report.total_seconds, 3),
+            "mean_ticker_seconds": round(float(np.mean(latencies)), 3),
+            "max_ticker_seconds": round(float(np.max(latencies)), 3),
+        }
+    report("fetch", results)
+
+
+def bench_storage(args):
+    if args.backend == "mongomock":
+        raise ValueError(
+            "The storage benchmark needs time-series collections, use '--backend mongod'"
+        )
+
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    db = client["bench_storage"]
+    client.drop_database(db.name)
+
+    ticker_codes = [f"T{i:04d}" for i in range(args.tickers)]
+    for i, ticker_code in enumerate(ticker_codes):
+        df = make_synthetic_ohlc(years=args.years, seed=i)
+        CollectionTickerStore(ticker_code, db=db).insert(df)
+        TimeSeriesTickerStore(ticker_code, db=db).insert(df)
+    for ticker_code in ticker_codes:
+        CollectionTickerStore(ticker_code, db=db).ensure_indexes()
+
+    def footprint(names):
+        stats = [db.command("collStats", name) for name in names]
+        return {
+            "storage_mb": round(sum(s["storageSize"] for s in stats) / 2**20, 2),
+            "index_mb": round(sum(s["totalIndexSize"] for s in stats) / 2**20, 2),
+        }
+
+    end_date = datetime(2024, 1, 31)
+    start_date = end_date - pd.Timedelta(days=365 * args.range_years)
+    results = {}
+    for backend, names in (
+        ("collections", ticker_codes),
+        ("timeseries", [TimeSeriesTickerStore(ticker_codes[0], db=db).collection.name]),
+    ):
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            get_range_data(ticker_codes, start_date, end_date, backend=backend, db=db)
+            latencies.append(time.perf_counter() - start)
+        results[backend] = {
+            **footprint(names),
+            "median_range_query_seconds": round(float(np.median(latencies)), 4),
+        }
+    client.drop_database(db.name)
+    report("storage", results)
+
+
+def bench_preprocess(args):
+    df = make_synthetic_yahoo_frame(args.rows)
+    input_bytes = df.memory_usage(index=True).sum()
+    per_10k = 10_000 / args.rows
+
+    results = {}
+    for name, fn, fn_args in (
+        ("legacy", legacy_preprocess, (df,)),
+        ("fused_calendar", preprocess_ticker_data, (df, "calendar")),
+        ("fused_trading", preprocess_ticker_data, (df, "trading")),
+    ):
+        seconds, peak = measure(fn, *fn_args, repeat=args.repeat)
+        results[name] = {
+            "ms_per_10k_rows": round(seconds * per_10k * 1000, 3),
+            # Peak allocations in multiples of the input frame, i.e. roughly the number of copies
+            "peak_memory_x_input": round(float(peak / input_bytes), 2),
+        }
+
+    # Multi-ticker panel processed in one pass vs one call per ticker
+    frames = {
+        f"T{i:04d}": make_synthetic_yahoo_frame(args.rows, seed=i) for i in range(args.tickers)
+    }
+    panel = pd.concat(frames, axis=1).swaplevel(axis=1)
+    seconds, _ = measure(preprocess_ticker_panel, panel, "trading", repeat=args.repeat)
+    per_ticker, _ = measure(
+        lambda: [preprocess_ticker_data(frame, "trading") for frame in frames.values()],
+        repeat=args.repeat,
+    )
+    results["panel"] = {
+        "tickers": args.tickers,
+        "ms_per_10k_rows_batched": round(seconds * per_10k / args.tickers * 1000, 3),
+        "ms_per_10k_rows_per_ticker": round(per_ticker * per_10k / args.tickers * 1000, 3),
+    }
+    report("preprocess", results)
+
+
+def bench_auth(args):
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    users = client["bench_auth"]["users"]
+    users.drop()
+    users.insert_one({"username": "bench_user", "password": get_password_hash("bench_password")})
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, session_store in (
+            ("bcrypt", None),
+            ("session_file", SessionStore(os.path.join(tmp_dir, "sessions"), secret=b"bench")),
+        ):
+            user_manager = UserManager(users_collection=users, session_store=session_store)
+            start = time.perf_counter()
+            for _ in range(args.commands):
+                assert user_manager.verify_user("bench_user", "bench_password")
+            elapsed = time.perf_counter() - start
+            results[name] = {"commands_per_second": round(args.commands / elapsed, 1)}
+
+            # Every CLI invocation is a new process that only shares the session file
+            if session_store is not None:
+                start = time.perf_counter()
+                for _ in range(args.commands):
+                    fresh_store = SessionStore(session_store.session_file, secret=b"bench")
+                    user_manager = UserManager(users_collection=users, session_store=fresh_store)
+                    assert user_manager.verify_user("bench_user", "bench_password")
+                elapsed = time.perf_counter() - start
+                results["session_file_new_process"] = {
+                    "commands_per_second": round(args.commands / elapsed, 1)
+                }
+    client.drop_database("bench_auth")
+    report("auth", results)
+
+
+def bench_stream(args):
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    db = client["bench_stream"]
+    client.drop_database(db.name)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for years in sorted({max(1, args.years // 4), args.years}):
+            ticker_store = CollectionTickerStore(f"Y{years:03d}", db=db)
+            ticker_store.insert(make_synthetic_ohlc(years=years))
+            path = os.path.join(tmp_dir, f"{years}.parquet")
+
+            def materialized():
+                pd.DataFrame(list(ticker_store.find({}, {"_id": 0}))).to_parquet(path)
+
+            def streamed():
+                cursor = ticker_store.find({}, {"_id": 0}).batch_size(args.batch_size)
+                write_frames(iter_frames(cursor, args.batch_size), path)
+
+            for name, fn in (("list", materialized), ("stream", streamed)):
+                seconds, peak = measure(fn, repeat=args.repeat)
+                results[f"{name}_{years}y"] = {
+                    "rows": ticker_store.count(),
+                    "seconds": round(seconds, 3),
+                    "peak_mb": round(peak / 2**20, 2),
+                }
+    client.drop_database(db.name)
+    report("stream", results)
+
+
+def bench_tiers(args):
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    db = client["bench_tiers"]
+    client.drop_database(db.name)
+
+    df = make_synthetic_intraday(days=args.days)
+    results = {"rows": ingest_intraday_data("BENCH", "1m", df, db=db)}
+
+    for interval in args.intervals:
+        tiered, _ = measure(lambda: get_bars("BENCH", interval, db=db), repeat=args.repeat)
+        raw, _ = measure(
+            lambda: rollup_bars(read_bars("BENCH", "1m", db=db), interval), repeat=args.repeat
+        )
+        results[interval] = {
+            "tier": select_tier(interval),
+            "tier_ms": round(tiered * 1000, 2),
+            "from_1m_ms": round(raw * 1000, 2),
+            "speedup": round(raw / tiered, 1),
+        }
+    client.drop_database(db.name)
+    report("tiers", results)
+
+
+def bench_analytics(args):
+    frames = {
+        f"T{i:04d}": make_synthetic_ohlc(years=args.years, seed=i)[["datetime", "adj_close"]]
+        for i in range(args.tickers)
+    }
+    # Listing dates and missing days differ between tickers
+    rng = np.random.default_rng(0)
+    frames = {
+        ticker: df.iloc[rng.integers(0, len(df) // 4) :].sample(frac=0.98).sort_index()
+        for ticker, df in frames.items()
+    }
+
+    align_seconds, align_peak = measure(align_prices, frames, repeat=args.repeat)
+    dates, tickers, prices = align_prices(frames)
+    analyze_seconds, analyze_peak = measure(
+        analyze_prices, dates, tickers, prices, repeat=args.repeat
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        array_cache = ArrayCache(tmp_dir)
+        array_cache.set("bench", dates=dates, tickers=np.array(tickers), prices=prices)
+        cached_seconds, _ = measure(array_cache.get, "bench", repeat=args.repeat)
+
+    report(
+        "analytics",
+        {
+            "tickers": len(tickers),
+            "days": len(dates),
+            "align_seconds": round(align_seconds, 3),
+            "align_peak_mb": round(align_peak / 2**20, 1),
+            "cached_align_seconds": round(cached_seconds, 3),
+            "analyze_seconds": round(analyze_seconds, 3),
+            "analyze_peak_mb": round(analyze_peak / 2**20, 1),
+        },
+    )
+
+
+def bench_indicators(args):
+    df = make_synthetic_ohlc(years=args.years)
+    closes = df["close"].to_numpy()
+    full_seconds, _ = measure(update_indicators, closes, repeat=args.repeat)
+    results = {"rows": len(df), "full_ms": round(full_seconds * 1000, 2)}
+
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    db = client["bench_indicators"]
+    for days in args.append_days:
+        _, state = update_indicators(closes[:-days])
+        incremental_seconds, _ = measure(
+            update_indicators, closes[-days:], state, repeat=args.repeat
+        )
+
+        # The ingest path, reading the stored rows and writing their indicators
+        client.drop_database(db.name)
+        ticker_store = CollectionTickerStore("BENCH", db=db)
+        ticker_store.insert(df.iloc[:-days])
+        refresh_indicators("BENCH", ticker_store, db=db)
+        ticker_store.insert(df.iloc[-days:])
+        start = time.perf_counter()
+        refresh_indicators("BENCH", ticker_store, db=db)
+        stored_incremental_seconds = time.perf_counter() - start
+        db["state"].drop()
+        start = time.perf_counter()
+        refresh_indicators("BENCH", ticker_store, db=db)
+        stored_full_seconds = time.perf_counter() - start
+
+        results[f"append_{days}_days"] = {
+            "incremental_ms": round(incremental_seconds * 1000, 3),
+            "speedup": round(full_seconds / incremental_seconds, 1),
+            "stored_full_ms": round(stored_full_seconds * 1000, 2),
+            "stored_incremental_ms": round(stored_incremental_seconds * 1000, 2),
+        }
+    client.drop_database(db.name)
+    report("indicators", results)
+
+
+def bench_startup(args):
+    env = dict(os.environ)
+    if args.backend == "mongod":
+        env["MONGODB_URI"] = args.mongodb_uri or "mongodb://localhost:27017"
+    else:
+        env.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_file = os.path.join(tmp_dir, "startup.json")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", STARTUP_SCRIPT, out_file, args.backend]
+                + shlex.split(args.cli_command),
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env,
+                check=True,
+                capture_output=True,
+            )
+            process_seconds = time.perf_counter() - start
+            with open(out_file) as f:
+                runs.append({"process_seconds": process_seconds, **json.load(f)})
+
+    def median(key: str):
+        return round(float(np.median([run[key] for run in runs])), 3)
+
+    # Commands are only observable on a real server
+    counted = args.backend == "mongod"
+    report(
+        "startup",
+        {
+            "command": args.cli_command,
+            "process_seconds": median("process_seconds"),
+            "import_seconds": median("import_seconds"),
+            "command_seconds": median("command_seconds"),
+            "import_round_trips": len(runs[-1]["import_commands"]) if counted else None,
+            "command_round_trips": len(runs[-1]["commands"]) if counted else None,
+            "mongodb_commands": runs[-1]["commands"] if counted else None,
+        },
+    )
+
+
+def bench_forecast(args):
+    frames = {
+        f"T{i:04d}": make_synthetic_ohlc(years=args.years, seed=i)[["datetime", "adj_close"]]
+        for i in range(args.tickers)
+    }
+    series = {
+        ticker: normalize_returns(df["adj_close"].to_numpy())[0] for ticker, df in frames.items()
+    }
+    loop_seconds, loop_peak = measure(loop_windows, series, args.window, repeat=args.repeat)
+    view_seconds, view_peak = measure(WindowDataset, series, args.window, repeat=args.repeat)
+
+    dataset = WindowDataset(series, args.window)
+    results = {
+        "tickers": args.tickers,
+        "windows": len(dataset),
+        "loop_windows_seconds": round(loop_seconds, 3),
+        "loop_windows_peak_mb": round(loop_peak / 2**20, 1),
+        "view_windows_seconds": round(view_seconds, 3),
+        "view_windows_peak_mb": round(view_peak / 2**20, 1),
+    }
+    for batch_size in args.batch_sizes:
+        model = LSTMForecaster(args.window, hidden=args.hidden)
+        history = model.fit(dataset, epochs=1, batch_size=batch_size)
+        results[f"train_samples_per_second_batch_{batch_size}"] = round(
+            history[0]["samples_per_second"]
+        )
+
+    # A repeated portfolio forecast, computed from the prices or read from the forecast cache
+    client = get_benchmark_client(args.backend, args.mongodb_uri)
+    forecast_cache = ForecastCache(client["bench_forecast"]["forecasts"])
+    forecast_cache.collection.drop()
+
+    def computed():
+        dates, tickers, prices = align_prices(frames)
+        return forecast_prices(model, dates, tickers, prices), last_valid_dates(
+            dates, tickers, prices
+        )
+
+    compute_seconds, _ = measure(computed, repeat=args.repeat)
+    forecasts, last_datetimes = computed()
+    forecast_cache.set_many(forecasts, model.version, last_datetimes)
+    cached_seconds, _ = measure(
+        forecast_cache.get_many, last_datetimes, model.version, 5, repeat=args.repeat
+    )
+    results["computed_forecast_ms"] = round(compute_seconds * 1000, 2)
+    results["cached_forecast_ms"] = round(cached_seconds * 1000, 2)
+    client.drop_database("bench_forecast")
+    report("forecast", results)
+
+
+###################################################################################################
+# Command Line Toolkit
+###################################################################################################
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for Stock Market Analysis Application")
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=["mongomock", "mongod"],
+        default="mongomock",
+        help="Database backend to benchmark against",
+    )
+    parser.add_argument(
+        "--mongodb_uri", type=str, default=None, help="MongoDB URI for the 'mongod' backend"
+    )
+    subparsers = parser.add_subparsers(dest="benchmark", help="Available benchmarks")
+
+    # Subparser for the "ingest" benchmark
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="Compare pydantic and columnar OHLC ingestion rows/second"
+    )
+    ingest_parser.add_argument("--tickers", type=int, default=500, help="Number of tickers")
+    ingest_parser.add_argument("--years", type=int, default=50, help="Years of daily bars")
+
+    # Subparser for the "fetch" benchmark
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="Compare serial and concurrent portfolio fetches on a fake Yahoo backend"
+    )
+    fetch_parser.add_argument("--tickers", type=int, default=14, help="Number of tickers")
+    fetch_parser.add_argument("--years", type=int, default=5, help="Years of daily bars")
+    fetch_parser.add_argument("--max_workers", type=int, default=4, help="Concurrent workers")
+    fetch_parser.add_argument("--latency", type=float, default=0.5, help="Fake request seconds")
+    fetch_parser.add_argument("--rate", type=int, default=2, help="Requests per rate period")
+    fetch_parser.add_argument("--period", type=float, default=5.0, help="Rate period seconds")
+
+    # Subparser for the "storage" benchmark
+    storage_parser = subparsers.add_parser(
+        "storage", help="Compare per-ticker and time-series collections footprint and latency"
+    )
+    storage_parser.add_argument("--tickers", type=int, default=100, help="Number of tickers")
+    storage_parser.add_argument("--years", type=int, default=20, help="Years of daily bars")
+    storage_parser.add_argument("--range_years", type=int, default=5, help="Years per range query")
+    storage_parser.add_argument("--repeat", type=int, default=5, help="Range query repetitions")
+
+    # Subparser for the "preprocess" benchmark
+    preprocess_parser = subparsers.add_parser(
+        "preprocess", help="Compare the legacy and fused preprocessing of Yahoo data"
+    )
+    preprocess_parser.add_argument("--rows", type=int, default=10_000, help="Rows per ticker")
+    preprocess_parser.add_argument("--tickers", type=int, default=50, help="Tickers in the panel")
+    preprocess_parser.add_argument("--repeat", type=int, default=5, help="Repetitions")
+
+    # Subparser for the "auth" benchmark
+    auth_parser = subparsers.add_parser(
+        "auth", help="Compare user verification with bcrypt and with the session cache"
+    )
+    auth_parser.add_argument("--commands", type=int, default=50, help="Verifications to run")
+
+    # Subparser for the "stream" benchmark
+    stream_parser = subparsers.add_parser(
+        "stream", help="Compare peak memory of materialized and streamed ticker data exports"
+    )
+    stream_parser.add_argument("--years", type=int, default=40, help="Years of daily bars")
+    stream_parser.add_argument("--batch_size", type=int, default=10_000, help="Rows per batch")
+    stream_parser.add_argument("--repeat", type=int, default=3, help="Repetitions")
+
+    # Subparser for the "tiers" benchmark
+    tiers_parser = subparsers.add_parser(
+        "tiers", help="Compare intraday queries read from rollup tiers and from 1m bars"
+    )
+    tiers_parser.add_argument("--days", type=int, default=20, help="Trading days of 1m bars")
+    tiers_parser.add_argument(
+        "--intervals",
+        type=str,
+        nargs="+",
+        default=["5m", "30m", "1h", "4h", "1d"],
+        help="Query intervals",
+    )
+    tiers_parser.add_argument("--repeat", type=int, default=3, help="Repetitions")
+
+    # Subparser for the "analytics" benchmark
+    analytics_parser = subparsers.add_parser(
+        "analytics", help="Time the price alignment and the portfolio analytics"
+    )
+    analytics_parser.add_argument("--tickers", type=int, default=1000, help="Number of tickers")
+    analytics_parser.add_argument("--years", type=int, default=20, help="Years of daily bars")
+    analytics_parser.add_argument("--repeat", type=int, default=3, help="Repetitions")
+
+    # Subparser for the "startup" benchmark
+    startup_parser = subparsers.add_parser(
+        "startup", help="Time the CLI cold start and count the MongoDB round trips of a command"
+    )
+    startup_parser.add_argument(
+        "--cli_command",
+        type=str,
+        default="portfolio list-all --username bench --password bench",
+        help="Command line of the application to run",
+    )
+    startup_parser.add_argument("--repeat", type=int, default=5, help="Repetitions")
+
+    # Subparser for the "forecast" benchmark
+    forecast_parser = subparsers.add_parser(
+        "forecast", help="Compare window construction and time the forecaster training"
+    )
+    forecast_parser.add_argument("--tickers", type=int, default=20, help="Number of tickers")
+    forecast_parser.add_argument("--years", type=int, default=20, help="Years of daily bars")
+    forecast_parser.add_argument("--window", type=int, default=30, help="Days per window")
+    forecast_parser.add_argument("--hidden", type=int, default=16, help="Size of the LSTM state")
+    forecast_parser.add_argument(
+        "--batch_sizes", type=int, nargs="+", default=[32, 256, 1024], help="Training batch sizes"
+    )
+    forecast_parser.add_argument("--repeat", type=int, default=3, help="Repetitions")
+
+    # Subparser for the "indicators" benchmark
+    indicators_parser = subparsers.add_parser(
+        "indicators", help="Compare full and incremental technical indicator updates"
+    )
+    indicators_parser.add_argument("--years", type=int, default=20, help="Years of daily bars")
+    indicators_parser.add_argument(
+        "--append_days", type=int, nargs="+", default=[1, 5, 20], help="Rows appended per update"
+    )
+    indicators_parser.add_argument("--repeat", type=int, default=5, help="Repetitions")
+
+    args = parser.parse_args()
+    logger.info(f"Started benchmarks at {datetime.utcnow()} using '{args.backend}'")
+
+    if args.benchmark == "ingest":
+        bench_ingest(args)
+    elif args.benchmark == "fetch":
+        bench_fetch(args)
+    elif args.benchmark == "storage":
+        bench_storage(args)
+    elif args.benchmark == "preprocess":
+        bench_preprocess(args)
+    elif args.benchmark == "auth":
+        bench_auth(args)
+    elif args.benchmark == "stream":
+        bench_stream(args)
+    elif args.benchmark == "tiers":
+        bench_tiers(args)
+    elif args.benchmark == "analytics":
+        bench_analytics(args)
+    elif args.benchmark == "forecast":
+        bench_forecast(args)
+    elif args.benchmark == "indicators":
+        bench_indicators(args)
+    elif args.benchmark == "startup":
+        bench_startup(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
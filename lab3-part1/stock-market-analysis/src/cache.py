@@ -0,0 +1,311 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pymongo
+from db import forecasts_collection
+from pyarrow.fs import LocalFileSystem
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+
+def temp_path(path: str):
+    # Unique per writer, so processes writing the same file never interleave before `os.replace`
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+class OHLCCache:
+    """Read-through Parquet cache of ticker data, partitioned by ticker and year.
+
+    Each ticker directory holds one `<year>.parquet` file per year and a `watermark.json` with the
+    earliest and latest `datetime` and the row count of the database it was built from.
+    """
+
+    def __init__(self, cache_dir: str = config.OHLC_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _ticker_dir(self, ticker_code: str):
+        return os.path.join(self.cache_dir, ticker_code)
+
+    def _partition_path(self, ticker_code: str, year: int):
+        return os.path.join(self._ticker_dir(ticker_code), f"{year}.parquet")
+
+    def _watermark_path(self, ticker_code: str):
+        return os.path.join(self._ticker_dir(ticker_code), "watermark.json")
+
+    def read_watermark(self, ticker_code: str):
+        try:
+            with open(self._watermark_path(ticker_code)) as f:
+                watermark = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        watermark["min"] = datetime.fromisoformat(watermark["min"])
+        watermark["max"] = datetime.fromisoformat(watermark["max"])
+        return watermark
+
+    def write_watermark(self, ticker_code: str, watermark: dict):
+        path = self._watermark_path(ticker_code)
+        tmp_path = temp_path(path)
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    **watermark,
+                    "min": watermark["min"].isoformat(),
+                    "max": watermark["max"].isoformat(),
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    def invalidate(self, ticker_code: str):
+        shutil.rmtree(self._ticker_dir(ticker_code), ignore_errors=True)
+
+    def _write_partitions(self, ticker_code: str, df: pd.DataFrame):
+        os.makedirs(self._ticker_dir(ticker_code), exist_ok=True)
+        for year, partition in df.groupby(df["datetime"].dt.year):
+            path = self._partition_path(ticker_code, year)
+            table = pa.Table.from_pandas(partition.reset_index(drop=True), preserve_index=False)
+            tmp_path = temp_path(path)
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+
+    def sync(self, ticker_code: str, ticker_store):
+        """Bring the cache of a ticker up to date with its ticker store."""
+        latest = ticker_store.find_one(
+            sort=[("datetime", pymongo.DESCENDING)], projection={"datetime": True}
+        )
+        earliest = ticker_store.find_one(
+            sort=[("datetime", pymongo.ASCENDING)], projection={"datetime": True}
+        )
+        if latest is None or earliest is None:
+            return
+
+        current = {
+            "min": earliest["datetime"],
+            "max": latest["datetime"],
+            "count": ticker_store.count(),
+        }
+        watermark = self.read_watermark(ticker_code)
+        if watermark == current:
+            return
+
+        date_query = {}
+        if watermark is not None and watermark["min"] <= current["min"]:
+            # Only the years from the latest cached one onwards have changed, unless rows were
+            # added in between which the row count catches
+            rows_after = ticker_store.count({"datetime": {"$gt": watermark["max"]}})
+            if watermark["count"] + rows_after == current["count"]:
+                date_query = {"datetime": {"$gte": datetime(watermark["max"].year, 1, 1)}}
+        if not date_query:
+            self.invalidate(ticker_code)
+
+        logger.debug(f"Refreshing OHLC cache of '{ticker_code}' for {date_query or 'all years'}")
+        df = pd.DataFrame(list(ticker_store.find(date_query, {"_id": 0})))
+        if not df.empty:
+            df["datetime"] = pd.to_datetime(df["datetime"]).astype("datetime64[ms]")
+            self._write_partitions(ticker_code, df.sort_values("datetime"))
+        self.write_watermark(ticker_code, current)
+
+    def read_table(
+        self,
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        columns: list = None,
+    ):
+        paths = []
+        if os.path.isdir(self._ticker_dir(ticker_code)):
+            for name in sorted(os.listdir(self._ticker_dir(ticker_code))):
+                if not name.endswith(".parquet"):
+                    continue
+                year = int(name.split(".")[0])
+                if (start_date is None or year >= start_date.year) and (
+                    end_date is None or year <= end_date.year
+                ):
+                    paths.append(os.path.join(self._ticker_dir(ticker_code), name))
+        if not paths:
+            return None
+
+        date_filter = None
+        if start_date is not None:
+            date_filter = ds.field("datetime") >= pa.scalar(start_date, pa.timestamp("ms"))
+        if end_date is not None:
+            end_filter = ds.field("datetime") <= pa.scalar(end_date, pa.timestamp("ms"))
+            date_filter = end_filter if date_filter is None else date_filter & end_filter
+
+        # Partitions are memory-mapped and only the requested columns and rows are materialized
+        dataset = ds.dataset(paths, format="parquet", filesystem=LocalFileSystem(use_mmap=True))
+        return dataset.to_table(columns=columns, filter=date_filter)
+
+    def read(
+        self,
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        columns: list = None,
+    ):
+        table = self.read_table(ticker_code, start_date, end_date, columns)
+        if table is None:
+            return pd.DataFrame(columns=columns)
+        return table.to_pandas()
+
+
+class ArrayCache:
+    """On-disk LRU cache of named NumPy arrays, shared by every process.
+
+    Keys can be any value with a stable `repr`, e.g. a tuple of tickers, dates and watermarks.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = config.ANALYTICS_CACHE_DIR,
+        max_entries: int = config.ANALYTICS_CACHE_SIZE,
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest() + ".npz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as arrays:
+                entry = {name: arrays[name] for name in arrays.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        # Marks the entry as recently used
+        os.utime(path)
+        return entry
+
+    def set(self, key, **arrays):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+        entries = sorted(
+            (entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".npz")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries[: max(0, len(entries) - self.max_entries)]:
+            os.remove(entry.path)
+
+
+class ForecastCache:
+    """Forecasts stored in MongoDB, keyed by ticker, model hash, horizon and last input day.
+
+    Lookups pass the last day currently stored for each ticker, so a forecast made before newer
+    rows were ingested is never returned. Ingesting new rows also removes the outdated forecasts.
+    """
+
+    def __init__(self, collection=forecasts_collection):
+        self.collection = collection
+
+    def get_many(self, last_datetimes: dict, model_hash: str, horizon: int):
+        """Forecasts made from data ending at the {ticker_code: last_datetime} watermarks."""
+        if not last_datetimes:
+            return {}
+        query = {
+            "$or": [
+                {"ticker_code": ticker_code, "last_datetime": last_datetime}
+                for ticker_code, last_datetime in last_datetimes.items()
+            ],
+            "model_hash": model_hash,
+            "horizon": horizon,
+        }
+        return {doc["ticker_code"]: doc for doc in self.collection.find(query, {"_id": 0})}
+
+    def set_many(self, forecasts: pd.DataFrame, model_hash: str, last_datetimes: dict):
+        """Store the (dates x tickers) forecasts made from data ending at `last_datetimes`."""
+        if forecasts.empty:
+            return
+        created_at = datetime.utcnow()
+        requests = []
+        for ticker_code in forecasts.columns:
+            # Tickers whose last price is older have their own, earlier horizon
+            forecast = forecasts[ticker_code].dropna()
+            requests.append(
+                pymongo.UpdateOne(
+                    {
+                        "ticker_code": ticker_code,
+                        "model_hash": model_hash,
+                        "horizon": len(forecast),
+                        "last_datetime": last_datetimes[ticker_code],
+                    },
+                    {
+                        "$set": {
+                            "dates": [date.to_pydatetime() for date in forecast.index],
+                            "prices": forecast.tolist(),
+                            "created_at": created_at,
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+        self.collection.bulk_write(requests, ordered=False)
+
+    def invalidate(self, ticker_codes: list):
+        if ticker_codes:
+            self.collection.delete_many({"ticker_code": {"$in": list(ticker_codes)}})
+
+
+ohlc_cache = OHLCCache()
+aligned_price_cache = ArrayCache()
+forecast_cache = ForecastCache()
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Any
 
 from bson import ObjectId
@@ -45,26 +46,76 @@ class PyObjectId(ObjectId):
         )
 
 
+@lru_cache
+def get_client():
+    # Created on first use, so commands that do not touch the database never connect
+    try:
+        return MongoClient(config.MONGODB_URI)
+    except Exception as e:
+        logger.error("Unable to connect to MongoDB client: %s" % e)
+        raise
+
+
+def get_async_client(max_pool_size: int = config.API_MONGO_POOL_SIZE):
+    # Imported here so the CLI does not load the async driver
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(config.MONGODB_URI, maxPoolSize=max_pool_size)
+
+
+class LazyDatabase:
+    """Stand-in for a `Database` that only creates the client when it is first used."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def database(self):
+        # Imported here as `migrations` imports the collections below. Applied on the first query
+        # rather than on startup, so commands that never query the database never connect
+        from migrations import ensure_indexes
+
+        ensure_indexes()
+        return get_client()[self.name]
+
+    def __getitem__(self, collection_name: str):
+        return self.database[collection_name]
+
+    def __getattr__(self, attr):
+        return getattr(self.database, attr)
+
+
+class LazyCollection:
+    """Stand-in for a `Collection` of a `LazyDatabase`."""
+
+    def __init__(self, db: LazyDatabase, name: str):
+        self.db = db
+        self.name = name
+
+    @property
+    def collection(self):
+        return self.db[self.name]
+
+    def __getattr__(self, attr):
+        return getattr(self.collection, attr)
+
+
 def get_collection(db, collection_name: str):
+    if isinstance(db, LazyDatabase):
+        return LazyCollection(db, collection_name)
     return db[collection_name]
 
 
-try:
-    client = MongoClient(config.MONGODB_URI)
-except Exception as e:
-    logger.error("Unable to connect to MongoDB client: %s" % e)
-
 # Create DB cursors
-main_db = client["yf_panels"]
-ticker_db = client["yf_stock_ticker_data"]
-
-# Get collections
+main_db = LazyDatabase("yf_panels")
+ticker_db = LazyDatabase("yf_stock_ticker_data")
+intraday_db = LazyDatabase("yf_stock_intraday_data")
+indicators_db = LazyDatabase("yf_stock_indicators")
 
+# Get collections, their indexes are created by `migrations.ensure_indexes`
 users_collection = get_collection(main_db, "users")
-users_collection.create_index([("username", 1)], unique=True)
-
 tickers_info_collection = get_collection(main_db, "tickers_info")
-tickers_info_collection.create_index([("ticker_code", 1)], unique=True)
-
 portfolios_collection = get_collection(main_db, "portfolios")
-portfolios_collection.create_index([("portfolio_name", 1)], unique=True)
+refresh_runs_collection = get_collection(main_db, "refresh_runs")
+migrations_collection = get_collection(main_db, "migrations")
+forecasts_collection = get_collection(main_db, "forecasts")
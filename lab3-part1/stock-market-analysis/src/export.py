@@ -0,0 +1,110 @@
+import io
+import os
+from itertools import islice
+from typing import Iterable, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from settings import get_logger
+
+logger = get_logger(__name__)
+
+
+def iter_frames(rows: Iterable[dict], batch_size: int) -> Iterator[pd.DataFrame]:
+    # Group a stream of rows, e.g. a database cursor, into DataFrames of at most `batch_size` rows
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield pd.DataFrame(batch)
+
+
+def with_empty_frame(frames: Iterable[pd.DataFrame], columns: list = None):
+    # Yields an empty frame of `columns` when `frames` is empty, so the file still has its columns
+    empty = True
+    for frame in frames:
+        empty = False
+        yield frame
+    if empty:
+        yield pd.DataFrame(columns=columns or [])
+
+
+def write_csv(frames: Iterable[pd.DataFrame], path: str, columns: list = None):
+    n_rows, header = 0, True
+    with open(path, "w", newline="") as f:
+        for frame in with_empty_frame(frames, columns):
+            frame.to_csv(f, header=header, index=False)
+            n_rows, header = n_rows + len(frame), False
+    return n_rows
+
+
+def write_parquet(frames: Iterable[pd.DataFrame], path: str, columns: list = None):
+    n_rows, writer = 0, None
+    try:
+        for frame in with_empty_frame(frames, columns):
+            if writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                # Later batches are cast to the schema of the first one
+                table = pa.Table.from_pandas(frame, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            n_rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def frame_to_json_records(frame: pd.DataFrame):
+    # Row objects of a batch without the enclosing brackets, so batches can be concatenated
+    return frame.to_json(orient="records", date_format="iso")[1:-1].encode()
+
+
+class ArrowStreamEncoder:
+    """Encode batches of rows as one Arrow IPC stream, returning the new bytes of every batch."""
+
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.writer = None
+        self.schema = None
+
+    def _drain(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def write(self, frame: pd.DataFrame):
+        if self.writer is None:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            self.schema = table.schema
+            self.writer = pa.ipc.new_stream(self.sink, self.schema)
+        else:
+            # Later batches are cast to the schema of the first one
+            table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+        return self._drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        return self._drain()
+
+
+def write_frames(frames: Iterable[pd.DataFrame], path: str, columns: list = None):
+    """Write batches of rows to a CSV or Parquet file one batch at a time.
+
+    Without any rows, the file is still written with the header or schema of `columns`.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        n_rows = write_csv(frames, path, columns)
+    elif extension in (".parquet", ".pq"):
+        n_rows = write_parquet(frames, path, columns)
+    else:
+        raise ValueError(f"Unsupported output format '{extension}', use '.csv' or '.parquet'")
+    logger.info(f"Wrote {n_rows} rows to '{path}'")
+    return n_rows
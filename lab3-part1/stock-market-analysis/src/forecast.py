@@ -0,0 +1,320 @@
+import hashlib
+import os
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+# Normalized returns beyond this many standard deviations are clipped
+RETURN_CLIP = 5.0
+
+
+def sliding_windows(values: np.ndarray, window: int):
+    """Zero-copy (n - window + 1, window, features) view over the rows of a (n, features) array."""
+    return sliding_window_view(values, window, axis=0).swapaxes(1, 2)
+
+
+def normalize_returns(prices: np.ndarray):
+    """Log returns of the valid prices of a ticker divided by their standard deviation.
+
+    Returns `(returns, scale)`, the model is trained and run on these unit-free returns so tickers
+    of any price level and volatility share one model.
+    """
+    prices = prices[~np.isnan(prices)]
+    returns = np.diff(np.log(prices))
+    scale = float(returns.std()) if len(returns) > 1 else 0.0
+    if not scale:
+        return np.zeros(len(returns), dtype="float32"), 1.0
+    return np.clip(returns / scale, -RETURN_CLIP, RETURN_CLIP).astype("float32"), scale
+
+
+class WindowDataset:
+    """Training windows of many tickers over one contiguous array of their normalized returns.
+
+    Every sample is a view of the array, only the batches drawn from it are copied. Windows never
+    cross from one ticker into the next.
+    """
+
+    def __init__(self, series: Dict[str, np.ndarray], window: int):
+        self.window = window
+        series = {ticker: values for ticker, values in series.items() if len(values) > window}
+        self.tickers = list(series)
+        lengths = np.array([len(values) for values in series.values()], dtype="int64")
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype("int64")
+
+        self.values = np.concatenate(list(series.values()) or [np.zeros(0, "float32")])[:, None]
+        self.windows = sliding_windows(self.values, window)
+        # The target of a window is the return right after it
+        self.starts = np.concatenate(
+            [np.arange(o, o + n - window) for o, n in zip(offsets, lengths)] or [np.zeros(0)]
+        ).astype("int64")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def batches(self, batch_size: int, rng: np.random.Generator = None):
+        starts = self.starts if rng is None else self.starts[rng.permutation(len(self.starts))]
+        for i in range(0, len(starts), batch_size):
+            batch = starts[i : i + batch_size]
+            yield self.windows[batch], self.values[batch + self.window, 0]
+
+
+def _sigmoid(x: np.ndarray):
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+class LSTMForecaster:
+    """Single layer LSTM with a linear head, trained with backpropagation through time and Adam.
+
+    Predicts the next normalized return from a window of them, the notebook's `LSTM` + `Dense(1)`
+    model written with NumPy so it runs on CPU without a deep learning framework.
+    """
+
+    def __init__(self, window: int, hidden: int = 16, n_features: int = 1, seed: int = 0):
+        self.window = window
+        self.hidden = hidden
+        self.n_features = n_features
+        rng = np.random.default_rng(seed)
+        limit = 1 / np.sqrt(hidden)
+        self.params = {
+            # Gates stacked as input, forget, output and candidate
+            "W": rng.uniform(-limit, limit, (n_features + hidden, 4 * hidden)).astype("float32"),
+            "b": np.zeros(4 * hidden, dtype="float32"),
+            "V": rng.uniform(-limit, limit, (hidden, 1)).astype("float32"),
+            "c": np.zeros(1, dtype="float32"),
+        }
+        # Remembering by default makes long windows easier to learn
+        self.params["b"][hidden : 2 * hidden] = 1.0
+        self._adam = None
+
+    def _forward(self, X: np.ndarray):
+        W, b, H = self.params["W"], self.params["b"], self.hidden
+        h = np.zeros((len(X), H), dtype="float32")
+        c = np.zeros((len(X), H), dtype="float32")
+        steps = []
+        for t in range(X.shape[1]):
+            xh = np.concatenate([X[:, t], h], axis=1)
+            z = xh @ W + b
+            gates = _sigmoid(z[:, : 3 * H])
+            i, f, o = gates[:, :H], gates[:, H : 2 * H], gates[:, 2 * H :]
+            g = np.tanh(z[:, 3 * H :])
+            c_prev, c = c, f * c + i * g
+            tanh_c = np.tanh(c)
+            h = o * tanh_c
+            steps.append((xh, i, f, o, g, c_prev, tanh_c))
+        return (h @ self.params["V"] + self.params["c"])[:, 0], h, steps
+
+    def _backward(self, error: np.ndarray, h: np.ndarray, steps: list):
+        W, F = self.params["W"], self.n_features
+        dy = (2 * error / len(error))[:, None].astype("float32")
+        grads = {"V": h.T @ dy, "c": dy.sum(axis=0)}
+        dW, db = np.zeros_like(W), np.zeros_like(self.params["b"])
+        dh, dc = dy @ self.params["V"].T, np.zeros_like(h)
+        for xh, i, f, o, g, c_prev, tanh_c in reversed(steps):
+            dc = dc + dh * o * (1 - tanh_c**2)
+            dz = np.concatenate(
+                [
+                    dc * g * i * (1 - i),
+                    dc * c_prev * f * (1 - f),
+                    dh * tanh_c * o * (1 - o),
+                    dc * i * (1 - g**2),
+                ],
+                axis=1,
+            )
+            dW += xh.T @ dz
+            db += dz.sum(axis=0)
+            dh, dc = dz @ W[F:].T, dc * f
+        grads.update(W=dW, b=db)
+        return grads
+
+    def _step(self, grads: dict, learning_rate: float, max_norm: float = 1.0):
+        if self._adam is None:
+            self._adam = {
+                "t": 0,
+                "m": {k: np.zeros_like(v) for k, v in self.params.items()},
+                "v": {k: np.zeros_like(v) for k, v in self.params.items()},
+            }
+        norm = np.sqrt(sum(float((grad**2).sum()) for grad in grads.values()))
+        scale = min(1.0, max_norm / (norm + 1e-12))
+
+        adam, beta1, beta2 = self._adam, 0.9, 0.999
+        adam["t"] += 1
+        for key, grad in grads.items():
+            grad = grad * scale
+            adam["m"][key] = beta1 * adam["m"][key] + (1 - beta1) * grad
+            adam["v"][key] = beta2 * adam["v"][key] + (1 - beta2) * grad**2
+            m_hat = adam["m"][key] / (1 - beta1 ** adam["t"])
+            v_hat = adam["v"][key] / (1 - beta2 ** adam["t"])
+            self.params[key] -= (learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8)).astype("float32")
+
+    def fit(
+        self,
+        dataset: WindowDataset,
+        epochs: int = 20,
+        batch_size: int = 256,
+        learning_rate: float = 1e-3,
+        seed: int = 0,
+    ):
+        """Train on shuffled batches mixing all tickers.
+
+        Returns the mean squared error and the samples/second of every epoch.
+        """
+        rng = np.random.default_rng(seed)
+        history = []
+        for epoch in range(1, epochs + 1):
+            start, total_loss = time.perf_counter(), 0.0
+            for X, y in dataset.batches(batch_size, rng):
+                y_pred, h, steps = self._forward(X)
+                error = y_pred - y
+                total_loss += float((error**2).sum())
+                self._step(self._backward(error, h, steps), learning_rate)
+            seconds = time.perf_counter() - start
+            history.append(
+                {
+                    "epoch": epoch,
+                    "loss": total_loss / max(len(dataset), 1),
+                    "samples_per_second": len(dataset) / seconds if seconds else None,
+                }
+            )
+            logger.debug(f"Epoch {epoch}/{epochs}: loss {history[-1]['loss']:.4f}")
+        return history
+
+    def predict(self, X: np.ndarray):
+        return self._forward(X.astype("float32", copy=False))[0]
+
+    def forecast(self, windows: np.ndarray, horizon: int):
+        """Roll a (batch, window) array of normalized returns forward `horizon` steps."""
+        windows = windows.astype("float32")[:, :, None]
+        predictions = np.empty((len(windows), horizon), dtype="float32")
+        for step in range(horizon):
+            predictions[:, step] = self.predict(windows)
+            windows = np.concatenate([windows[:, 1:], predictions[:, step, None, None]], axis=1)
+        return predictions
+
+    @property
+    def version(self):
+        """Hash of the architecture and the weights, changes whenever the model is retrained."""
+        digest = hashlib.sha256(f"{self.window}:{self.hidden}:{self.n_features}".encode())
+        for key in sorted(self.params):
+            digest.update(np.ascontiguousarray(self.params[key]).tobytes())
+        return digest.hexdigest()[:16]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                window=self.window,
+                hidden=self.hidden,
+                n_features=self.n_features,
+                **self.params,
+            )
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            model = cls(int(data["window"]), int(data["hidden"]), int(data["n_features"]))
+            model.params = {key: data[key] for key in model.params}
+        return model
+
+
+def get_model_path(model_name: str, model_dir: str = config.FORECAST_MODEL_DIR):
+    return os.path.join(model_dir, f"{model_name}.npz")
+
+
+@lru_cache(maxsize=8)
+def _load_model(path: str, mtime_ns: int):
+    return LSTMForecaster.load(path)
+
+
+def load_model(model_name: str, model_dir: str = config.FORECAST_MODEL_DIR):
+    # Loaded once per process until the file is replaced by a retrained model
+    path = get_model_path(model_name, model_dir)
+    return _load_model(path, os.stat(path).st_mtime_ns)
+
+
+def last_valid_dates(dates: np.ndarray, tickers: List[str], prices: np.ndarray):
+    # Day of the last price of every column of a (dates x tickers) matrix
+    valid = ~np.isnan(prices)
+    last = len(dates) - 1 - np.argmax(valid[::-1], axis=0)
+    return {
+        ticker: pd.Timestamp(dates[last[i]]).to_pydatetime()
+        for i, ticker in enumerate(tickers)
+        if valid[:, i].any()
+    }
+
+
+def train_forecaster(
+    tickers: List[str],
+    prices: np.ndarray,
+    window: int = 30,
+    hidden: int = 16,
+    epochs: int = 20,
+    batch_size: int = 256,
+    learning_rate: float = 1e-3,
+):
+    """Train one model on the windows of every ticker of a (dates x tickers) price matrix."""
+    dataset = WindowDataset(
+        {ticker: normalize_returns(prices[:, i])[0] for i, ticker in enumerate(tickers)}, window
+    )
+    if not len(dataset):
+        raise ValueError(f"Not enough data to train on windows of {window} days")
+
+    logger.info(f"Training on {len(dataset)} windows of {len(dataset.tickers)} tickers")
+    model = LSTMForecaster(window, hidden=hidden)
+    history = model.fit(dataset, epochs=epochs, batch_size=batch_size, learning_rate=learning_rate)
+    return model, history
+
+
+def forecast_prices(
+    model: LSTMForecaster,
+    dates: np.ndarray,
+    tickers: List[str],
+    prices: np.ndarray,
+    horizon: int = 5,
+    calendar: str = config.OHLC_CALENDAR,
+):
+    """Forecast the next `horizon` prices of every ticker of a (dates x tickers) price matrix.
+
+    All tickers are forecast in one batch. Every ticker's horizon starts after its own last price,
+    so a halted ticker is not labeled with the dates of the others, and the columns are aligned on
+    the union of the horizons. Tickers with fewer prices than the model window are left out.
+    """
+
+    def horizon_index(last_day: pd.Timestamp):
+        if calendar == "trading":
+            return pd.bdate_range(last_day + pd.offsets.BDay(), periods=horizon, name="datetime")
+        return pd.date_range(last_day + pd.Timedelta(days=1), periods=horizon, name="datetime")
+
+    windows, scales, last_prices, last_days, forecast_tickers = [], [], [], [], []
+    for i, ticker in enumerate(tickers):
+        returns, scale = normalize_returns(prices[:, i])
+        if len(returns) < model.window:
+            logger.warning(f"Not enough data to forecast '{ticker}'")
+            continue
+        last = np.flatnonzero(~np.isnan(prices[:, i]))[-1]
+        windows.append(returns[-model.window :])
+        scales.append(scale)
+        last_prices.append(prices[last, i])
+        last_days.append(pd.Timestamp(dates[last]))
+        forecast_tickers.append(ticker)
+
+    if not windows:
+        last_day = pd.Timestamp(dates[-1]) if len(dates) else pd.Timestamp.utcnow().normalize()
+        return pd.DataFrame(index=horizon_index(last_day))
+
+    returns = model.forecast(np.stack(windows), horizon) * np.array(scales)[:, None]
+    forecasts = np.array(last_prices)[:, None] * np.exp(np.cumsum(returns, axis=1))
+    df = pd.DataFrame(
+        {
+            ticker: pd.Series(forecasts[k], index=horizon_index(last_days[k]))
+            for k, ticker in enumerate(forecast_tickers)
+        }
+    )
+    return df.rename_axis("datetime")
@@ -0,0 +1,206 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pymongo
+from db import indicators_db
+from ingest import columns_to_documents
+from numpy.lib.stride_tricks import sliding_window_view
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+SMA_WINDOWS = (20, 50)
+RSI_PERIOD = 14
+MACD_PERIODS = (12, 26, 9)
+BOLLINGER_WINDOW = 20
+BOLLINGER_STDS = 2.0
+
+INDICATOR_COLUMNS = [
+    *(f"sma_{window}" for window in SMA_WINDOWS),
+    f"rsi_{RSI_PERIOD}",
+    "macd",
+    "macd_signal",
+    "macd_hist",
+    "bb_middle",
+    "bb_upper",
+    "bb_lower",
+]
+
+# Closes kept in the rolling state to complete the windows of the next rows
+TAIL_SIZE = max(*SMA_WINDOWS, BOLLINGER_WINDOW) - 1
+
+# Moving averages of at most this many values are computed with a Python loop
+SHORT_EWM_SIZE = 64
+
+
+def rolling_windows(values: np.ndarray, window: int):
+    # (len(values), window) view of the windows ending at every value, NaN before the first full one
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return sliding_window_view(padded, window)
+
+
+def ewm(values: np.ndarray, alpha: float, seed: float = None):
+    """Exponential moving average `y[t] = alpha * x[t] + (1 - alpha) * y[t - 1]`.
+
+    Continues from `seed`, the last average of the previous rows, or starts at the first value.
+    """
+    if len(values) <= SHORT_EWM_SIZE:
+        # Building a Series costs more than the recurrence over the few rows of an update
+        averages = np.empty(len(values))
+        for i, value in enumerate(values.tolist()):
+            seed = value if seed is None else (1 - alpha) * seed + alpha * value
+            averages[i] = seed
+        return averages
+
+    if seed is not None:
+        values = np.concatenate([[seed], values])
+    averages = pd.Series(values, dtype="float64").ewm(alpha=alpha, adjust=False).mean()
+    return averages.to_numpy()[0 if seed is None else 1 :]
+
+
+def _last(values: np.ndarray, default=None):
+    return float(values[-1]) if len(values) else default
+
+
+def update_indicators(closes: np.ndarray, state: dict = None):
+    """Indicators of `closes`, the rows following the ones summarized by `state`.
+
+    Without a state the closes are the whole history of the ticker. Returns a dict of indicator
+    name -> array with one value per close (NaN until enough rows were seen) and the state to
+    continue from, so appending rows gives the same values as recomputing the whole history.
+    """
+    state = state or {}
+    closes = np.asarray(closes, dtype="float64")
+    if not len(closes):
+        return {column: np.empty(0) for column in INDICATOR_COLUMNS}, state
+
+    # Rows seen since the first close of the ticker, used to mask the warm-up periods
+    position = state.get("count", 0) + np.arange(len(closes))
+    values = np.concatenate([state.get("tail", []), closes])
+    n_tail = len(values) - len(closes)
+    indicators = {}
+
+    for window in SMA_WINDOWS:
+        indicators[f"sma_{window}"] = rolling_windows(values, window)[n_tail:].mean(axis=1)
+
+    # Wilder's smoothing of the gains and losses, the first close of the history has no change
+    previous = state.get("last_close")
+    changes = np.diff(closes, prepend=previous) if previous is not None else np.diff(closes)
+    avg_gain = ewm(np.maximum(changes, 0), 1 / RSI_PERIOD, state.get("avg_gain"))
+    avg_loss = ewm(np.maximum(-changes, 0), 1 / RSI_PERIOD, state.get("avg_loss"))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss > 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+    rsi = np.concatenate([np.full(len(closes) - len(rsi), np.nan), rsi])
+    indicators[f"rsi_{RSI_PERIOD}"] = np.where(position >= RSI_PERIOD, rsi, np.nan)
+
+    fast, slow, signal = MACD_PERIODS
+    ema_fast = ewm(closes, 2 / (fast + 1), state.get("ema_fast"))
+    ema_slow = ewm(closes, 2 / (slow + 1), state.get("ema_slow"))
+    macd_signal = ewm(ema_fast - ema_slow, 2 / (signal + 1), state.get("macd_signal"))
+    indicators["macd"] = np.where(position >= slow - 1, ema_fast - ema_slow, np.nan)
+    indicators["macd_signal"] = np.where(position >= slow + signal - 2, macd_signal, np.nan)
+    indicators["macd_hist"] = indicators["macd"] - indicators["macd_signal"]
+
+    windows = rolling_windows(values, BOLLINGER_WINDOW)[n_tail:]
+    middle, std = windows.mean(axis=1), windows.std(axis=1)
+    indicators["bb_middle"] = middle
+    indicators["bb_upper"] = middle + BOLLINGER_STDS * std
+    indicators["bb_lower"] = middle - BOLLINGER_STDS * std
+
+    state = {
+        "count": int(position[-1]) + 1,
+        "tail": values[-TAIL_SIZE:].tolist(),
+        "last_close": float(closes[-1]),
+        "avg_gain": _last(avg_gain, state.get("avg_gain")),
+        "avg_loss": _last(avg_loss, state.get("avg_loss")),
+        "ema_fast": _last(ema_fast),
+        "ema_slow": _last(ema_slow),
+        "macd_signal": _last(macd_signal),
+    }
+    return indicators, state
+
+
+def compute_indicators(df: pd.DataFrame, column: str = "close"):
+    """Indicators of the whole history of a ticker sorted by `datetime`, as a DataFrame."""
+    indicators, _ = update_indicators(df[column].to_numpy(dtype="float64"))
+    return pd.DataFrame({"datetime": df["datetime"].to_numpy(), **indicators})
+
+
+def write_indicators(
+    ticker_code: str,
+    datetimes: np.ndarray,
+    indicators: dict,
+    batch_size: int = config.OHLC_INGEST_BATCH_SIZE,
+    db=indicators_db,
+):
+    columns = {"datetime": np.asarray(datetimes, dtype="datetime64[ms]"), **indicators}
+    for start in range(0, len(datetimes), batch_size):
+        db["daily"].insert_many(
+            columns_to_documents(columns, start, start + batch_size, {"ticker_code": ticker_code}),
+            ordered=False,
+        )
+
+
+def refresh_indicators(ticker_code: str, ticker_store, column: str = "close", db=indicators_db):
+    """Bring the stored indicators of a ticker up to date with its stored rows.
+
+    Rows appended after the last update are computed from the saved rolling state. Any other
+    change of the history, such as a backfilled hole, recomputes the whole history. Returns the
+    number of indicator rows written.
+    """
+    state = db["state"].find_one({"_id": ticker_code})
+    if state is not None and state["count"] == ticker_store.count(
+        {"datetime": {"$lte": state["last_datetime"]}}
+    ):
+        query = {"datetime": {"$gt": state["last_datetime"]}}
+        # Rows written by an update that failed before saving its state are written again
+        db["daily"].delete_many({"ticker_code": ticker_code, **query})
+    else:
+        state, query = None, {}
+        db["daily"].delete_many({"ticker_code": ticker_code})
+
+    df = pd.DataFrame(list(ticker_store.find(query, {"_id": 0, "datetime": 1, column: 1})))
+    if df.empty:
+        return 0
+
+    indicators, new_state = update_indicators(df[column].to_numpy(dtype="float64"), state)
+    write_indicators(ticker_code, df["datetime"].to_numpy(), indicators, db=db)
+    db["state"].replace_one(
+        {"_id": ticker_code},
+        {
+            **new_state,
+            "last_datetime": df["datetime"].iloc[-1].to_pydatetime(),
+            "updated_at": datetime.utcnow(),
+        },
+        upsert=True,
+    )
+    logger.debug(
+        f"Updated {len(df)} indicator rows of '{ticker_code}'"
+        f" {'incrementally' if state else 'from the whole history'}"
+    )
+    return len(df)
+
+
+def read_indicators(
+    ticker_code: str,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    db=indicators_db,
+):
+    query = {"ticker_code": ticker_code}
+    if start_date is not None or end_date is not None:
+        query["datetime"] = {}
+        if start_date is not None:
+            query["datetime"]["$gte"] = start_date
+        if end_date is not None:
+            query["datetime"]["$lte"] = end_date
+
+    cursor = (
+        db["daily"]
+        .find(query, {"_id": 0, "ticker_code": 0})
+        .sort("datetime", pymongo.ASCENDING)
+    )
+    df = pd.DataFrame(list(cursor), columns=["datetime", *INDICATOR_COLUMNS])
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
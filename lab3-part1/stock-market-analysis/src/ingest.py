@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from models import TickerDataModel
+from pymongo.errors import BulkWriteError
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+OHLC_PRICE_COLUMNS = ["open", "high", "low", "close", "adj_close"]
+OHLC_COLUMNS = ["datetime", *OHLC_PRICE_COLUMNS, "volume"]
+
+
+class InvalidOHLCDataError(ValueError):
+    pass
+
+
+def validate_ohlc_frame(df: pd.DataFrame):
+    """Vectorized validation of OHLC rows, stricter than `OHLCModel`.
+
+    Checks the same columns and types, and also rejects the missing, infinite and negative values
+    and duplicated datetimes the pydantic model lets through. Returns a dict of column name ->
+    NumPy array ready to be written to the database.
+    """
+    missing = [col for col in OHLC_COLUMNS if col not in df.columns]
+    if missing:
+        raise InvalidOHLCDataError(f"Missing OHLC columns: {missing}")
+
+    datetimes = pd.to_datetime(df["datetime"], errors="coerce")
+    if datetimes.isna().any():
+        raise InvalidOHLCDataError(
+            f"{int(datetimes.isna().sum())} rows have an invalid or missing 'datetime'"
+        )
+    if datetimes.duplicated().any():
+        raise InvalidOHLCDataError(
+            f"{int(datetimes.duplicated().sum())} rows have a duplicated 'datetime'"
+        )
+
+    if datetimes.dt.tz is not None:
+        datetimes = datetimes.dt.tz_convert(None)
+
+    columns = {"datetime": datetimes.to_numpy(dtype="datetime64[ms]")}
+    for col in OHLC_COLUMNS[1:]:
+        try:
+            values = pd.to_numeric(df[col], errors="raise").to_numpy(dtype="float64")
+        except (TypeError, ValueError) as e:
+            raise InvalidOHLCDataError(f"Column '{col}' is not numeric: {e}")
+
+        invalid = ~np.isfinite(values) | (values < 0)
+        if invalid.any():
+            raise InvalidOHLCDataError(
+                f"{int(invalid.sum())} rows have a missing, infinite or negative '{col}'"
+            )
+        columns[col] = values
+
+    return columns
+
+
+def columns_to_documents(
+    columns: dict, start: int = 0, stop: int = None, metadata: dict = None
+):
+    # Only this step creates per-row Python objects, and only for the current batch
+    keys = list(columns.keys())
+    values = [
+        columns[key][start:stop].astype("datetime64[ms]").astype(object)
+        if key == "datetime"
+        else columns[key][start:stop].tolist()
+        for key in keys
+    ]
+    if metadata:
+        return [{**metadata, **dict(zip(keys, row))} for row in zip(*values)]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def insert_documents(collection, documents: list):
+    """Insert documents, leaving out the ones a unique index already holds.
+
+    Rows are stored again when a concurrent sync or a crashed one stored them without recording
+    their coverage. Returns the number of documents inserted, other write errors are raised.
+    """
+    try:
+        collection.insert_many(documents, ordered=False)
+        return len(documents)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        logger.warning(
+            f"{len(e.details['writeErrors'])} rows are already stored in '{collection.name}'."
+            " Skipping."
+        )
+        return e.details["nInserted"]
+
+
+def insert_ohlc_data(
+    collection,
+    df: pd.DataFrame,
+    strict: bool = config.OHLC_STRICT_VALIDATION,
+    batch_size: int = config.OHLC_INGEST_BATCH_SIZE,
+    metadata: dict = None,
+):
+    if df.empty:
+        return 0
+
+    if strict:
+        # Opt-in row by row pydantic validation
+        documents = TickerDataModel(data=df.to_dict("records")).model_dump()["data"]
+        if metadata:
+            documents = [{**metadata, **document} for document in documents]
+        return insert_documents(collection, documents)
+
+    columns = validate_ohlc_frame(df)
+    n_rows, n_inserted = len(columns["datetime"]), 0
+    for start in range(0, n_rows, batch_size):
+        n_inserted += insert_documents(
+            collection, columns_to_documents(columns, start, start + batch_size, metadata)
+        )
+    logger.debug(f"Ingested {n_inserted} rows into '{collection.name}' in batches of {batch_size}")
+    return n_inserted
@@ -0,0 +1,225 @@
+from datetime import datetime
+
+import pandas as pd
+import pymongo
+from db import intraday_db
+from ingest import OHLC_COLUMNS, columns_to_documents, validate_ohlc_frame
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+# Stored tiers from the finest to the coarsest, each one rolled up from the previous one
+TIERS = {
+    "1m": pd.Timedelta(minutes=1),
+    "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15),
+    "1h": pd.Timedelta(hours=1),
+    "1d": pd.Timedelta(days=1),
+}
+
+# Yahoo aligns its 1h bars to the market open, e.g. 14:30 UTC. They are stored as downloaded in
+# their own tier, outside of the UTC tiers, and serve the 1h and daily ranges older than the history
+# Yahoo keeps of 5m bars
+OPEN_TIER = "1h_open"
+FINE_TIER_HISTORY = pd.Timedelta(days=60)
+
+# Intervals that can be downloaded from Yahoo Finance
+INGEST_INTERVALS = ["1m", "5m", "1h"]
+
+# (database, collection) pairs whose indexes were already created in this process
+_bar_collections = set()
+
+
+def parse_interval(interval: str):
+    # Yahoo style intervals such as 1m, 30m, 2h or 1d
+    try:
+        duration = pd.Timedelta(interval[:-1] + "min" if interval.endswith("m") else interval)
+    except ValueError:
+        raise ValueError(f"Invalid interval '{interval}'. Use e.g. 1m, 5m, 30m, 1h or 1d.")
+    if duration < TIERS["1m"] or duration % TIERS["1m"]:
+        raise ValueError(f"Invalid interval '{interval}'. It must be a multiple of one minute.")
+    return duration
+
+
+def select_tier(interval: str, start_date: datetime = None):
+    """Coarsest stored tier that an `interval` can be computed from, i.e. the fewest rows.
+
+    1h and daily ranges starting before the history of 5m bars are read from `OPEN_TIER`.
+    """
+    duration = parse_interval(interval)
+    if (
+        start_date is not None
+        and start_date < datetime.utcnow() - FINE_TIER_HISTORY
+        and (duration == TIERS["1h"] or not duration % TIERS["1d"])
+    ):
+        return OPEN_TIER
+    return [tier for tier, tier_duration in TIERS.items() if not duration % tier_duration][-1]
+
+
+def get_bar_collection(tier: str, db=intraday_db):
+    collection = db[f"bars_{tier}"]
+    if (db.name, collection.name) not in _bar_collections:
+        collection.create_index(
+            [("ticker_code", pymongo.ASCENDING), ("datetime", pymongo.ASCENDING)], unique=True
+        )
+        _bar_collections.add((db.name, collection.name))
+    return collection
+
+
+def preprocess_intraday_data(df: pd.DataFrame):
+    """Clean intraday bars downloaded from Yahoo Finance.
+
+    Bars are sorted, de-duplicated and converted to naive UTC datetimes. Unlike daily bars, gaps
+    are not interpolated and bars with a missing price are dropped.
+    """
+    df = df.rename(columns=lambda col: col.lower().replace(" ", "_"))
+    if "adj_close" not in df.columns:
+        df["adj_close"] = df["close"]
+
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    df = df.set_axis(index.rename("datetime")).reset_index()[OHLC_COLUMNS]
+    df = df.dropna(subset=OHLC_COLUMNS[1:-1]).fillna({"volume": 0})
+    return (
+        df.sort_values("datetime").drop_duplicates("datetime", keep="last").reset_index(drop=True)
+    )
+
+
+def rollup_bars(df: pd.DataFrame, interval: str):
+    """Aggregate bars sorted by `datetime` into `interval` bars starting at the bucket start.
+
+    Daily bars are UTC days.
+    """
+    if df.empty:
+        return df[OHLC_COLUMNS]
+
+    buckets = df["datetime"].dt.floor(parse_interval(interval))
+    rolled = df.groupby(buckets, sort=True).agg(
+        open=("open", "first"),
+        high=("high", "max"),
+        low=("low", "min"),
+        close=("close", "last"),
+        adj_close=("adj_close", "last"),
+        volume=("volume", "sum"),
+    )
+    return rolled.reset_index()[OHLC_COLUMNS]
+
+
+def replace_bars(
+    ticker_code: str,
+    tier: str,
+    df: pd.DataFrame,
+    start: datetime,
+    end: datetime,
+    batch_size: int = config.OHLC_INGEST_BATCH_SIZE,
+    db=intraday_db,
+):
+    """Replace the bars of a tier in [start, end) with the ones in `df`.
+
+    The latest bar of a download may still be forming and rolled up buckets change as finer bars
+    arrive, so whole ranges are rewritten rather than only appended to. New bars are written over
+    the stored ones before the stale ones are deleted, a failed write leaves the old bars stored.
+    """
+    collection = get_bar_collection(tier, db)
+    stored = {"ticker_code": ticker_code, "datetime": {"$gte": start, "$lt": end}}
+    if df.empty:
+        collection.delete_many(stored)
+        return 0
+
+    columns = validate_ohlc_frame(df)
+    n_rows = len(columns["datetime"])
+    for batch_start in range(0, n_rows, batch_size):
+        collection.bulk_write(
+            [
+                pymongo.UpdateOne(
+                    {"ticker_code": ticker_code, "datetime": document["datetime"]},
+                    {"$set": document},
+                    upsert=True,
+                )
+                for document in columns_to_documents(
+                    columns, batch_start, batch_start + batch_size, {"ticker_code": ticker_code}
+                )
+            ],
+            ordered=False,
+        )
+
+    stored["datetime"]["$nin"] = columns["datetime"].astype(object).tolist()
+    collection.delete_many(stored)
+    return n_rows
+
+
+def read_bars(
+    ticker_code: str,
+    tier: str,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    db=intraday_db,
+):
+    query = {"ticker_code": ticker_code}
+    if start_date is not None or end_date is not None:
+        query["datetime"] = {}
+        if start_date is not None:
+            query["datetime"]["$gte"] = start_date
+        if end_date is not None:
+            query["datetime"]["$lt"] = end_date
+
+    cursor = (
+        get_bar_collection(tier, db)
+        .find(query, {"_id": 0, "ticker_code": 0})
+        .sort("datetime", pymongo.ASCENDING)
+    )
+    df = pd.DataFrame(list(cursor), columns=OHLC_COLUMNS)
+    df["datetime"] = pd.to_datetime(df["datetime"])
+    return df
+
+
+def ingest_intraday_data(ticker_code: str, interval: str, df: pd.DataFrame, db=intraday_db):
+    """Store preprocessed bars of an ingestible `interval` and refresh every coarser tier.
+
+    Only the buckets of the coarser tiers touched by the new bars are recomputed, each from the
+    tier below it. 1h bars are only stored in `OPEN_TIER`. Returns the number of rows written per
+    tier.
+    """
+    if interval not in INGEST_INTERVALS:
+        raise ValueError(f"Invalid intraday interval '{interval}'. Use one of {INGEST_INTERVALS}.")
+
+    if df.empty:
+        return {interval: 0}
+
+    if interval == "1h":
+        # Never relabeled to UTC hours nor rolled up into the UTC tiers
+        first, last = df["datetime"].min(), df["datetime"].max()
+        return {
+            OPEN_TIER: replace_bars(ticker_code, OPEN_TIER, df, first, last + TIERS["1h"], db=db)
+        }
+
+    # Merges any bars not aligned to their UTC tier, 1m and 5m bars divide the market open
+    df = rollup_bars(df, interval)
+    first, last = df["datetime"].min(), df["datetime"].max()
+    written = {
+        interval: replace_bars(ticker_code, interval, df, first, last + TIERS[interval], db=db)
+    }
+    tiers = list(TIERS)[list(TIERS).index(interval) :]
+    for source, tier in zip(tiers, tiers[1:]):
+        start = first.floor(TIERS[tier])
+        end = last.floor(TIERS[tier]) + TIERS[tier]
+        rolled = rollup_bars(read_bars(ticker_code, source, start, end, db=db), tier)
+        written[tier] = replace_bars(ticker_code, tier, rolled, start, end, db=db)
+    logger.debug(f"Ingested {interval} bars of '{ticker_code}' into tiers: {written}")
+    return written
+
+
+def get_bars(
+    ticker_code: str,
+    interval: str,
+    start_date: datetime = None,
+    end_date: datetime = None,
+    db=intraday_db,
+):
+    """Bars of any whole-minute `interval`, read from the coarsest tier it can be computed from."""
+    tier = select_tier(interval, start_date)
+    df = read_bars(ticker_code, tier, start_date, end_date, db=db)
+    if parse_interval(interval) != TIERS.get(tier, TIERS["1h"]):
+        df = rollup_bars(df, interval)
+    return df
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+import numpy as np
+from rich.pretty import pretty_repr
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+# Requests cycled through by every worker, `{portfolio_id}` and `{ticker}` are filled in at setup
+SCENARIOS = {
+    "user": ["/users/me"],
+    "portfolios": ["/portfolios", "/portfolios/{portfolio_id}"],
+    "json": ["/market-data/{ticker}?start_date={start_date}"],
+    "arrow": ["/market-data/{ticker}?start_date={start_date}&format=arrow"],
+}
+
+
+async def setup(client: httpx.AsyncClient, args):
+    """Create the load test user and portfolio if needed and warm up the ticker data."""
+    if args.create_user:
+        response = await client.post(
+            "/users",
+            json={
+                "username": args.username,
+                "name": {"first_name": "Load", "last_name": "Test"},
+                "password": args.password,
+            },
+        )
+        if response.status_code not in (201, 409):
+            response.raise_for_status()
+
+    portfolios = (await client.get("/portfolios")).raise_for_status().json()
+    portfolio = next((p for p in portfolios if p["portfolio_name"] == "loadtest"), None)
+    if portfolio is None:
+        response = await client.post("/portfolios", json={"portfolio_name": "loadtest"})
+        portfolio = response.raise_for_status().json()
+    await client.put(f"/portfolios/{portfolio['_id']}/tickers/{args.ticker}")
+
+    # The first read of a ticker downloads it, which is not what is measured
+    response = await client.get(f"/market-data/{args.ticker}?start_date={args.start_date}")
+    response.raise_for_status()
+    return portfolio["_id"]
+
+
+async def run_worker(client: httpx.AsyncClient, paths, deadline: float, results: dict):
+    for path in paths:
+        if time.perf_counter() >= deadline:
+            return
+        start = time.perf_counter()
+        try:
+            # The latency includes reading the whole, possibly streamed, body
+            response = await client.get(path)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        results[path].append((time.perf_counter() - start, ok))
+
+
+def summarize(latencies: list, seconds: float):
+    timings = np.array([latency for latency, _ in latencies])
+    return {
+        "requests": len(latencies),
+        "errors": sum(not ok for _, ok in latencies),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(timings, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(timings, 99)) * 1000, 2),
+    }
+
+
+async def run_load_test(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url,
+        auth=(args.username, args.password),
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        portfolio_id = await setup(client, args)
+        paths = [
+            path.format(portfolio_id=portfolio_id, ticker=args.ticker, start_date=args.start_date)
+            for scenario in args.scenarios
+            for path in SCENARIOS[scenario]
+        ]
+
+        results = defaultdict(list)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(
+                # Workers start at different requests so every path is hit concurrently
+                run_worker(
+                    client,
+                    itertools.islice(itertools.cycle(paths), i % len(paths), None),
+                    deadline,
+                    results,
+                )
+                for i in range(args.concurrency)
+            )
+        )
+        seconds = time.perf_counter() - start
+
+    report = {path: summarize(latencies, seconds) for path, latencies in results.items()}
+    report["total"] = summarize(
+        [latency for latencies in results.values() for latency in latencies], seconds
+    )
+    logger.info(f"Load test of {args.url} with {args.concurrency} workers:\n{pretty_repr(report)}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the Stock Market Analysis HTTP API")
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=f"http://{config.API_HOST}:{config.API_PORT}",
+        help="Base URL of the running API",
+    )
+    parser.add_argument("--username", type=str, required=True, help="Username")
+    parser.add_argument("--password", type=str, required=True, help="User's password")
+    parser.add_argument(
+        "--create_user", action="store_true", help="Create the user if it does not exist"
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+        help="Requests to cycle through",
+    )
+    parser.add_argument("--ticker", type=str, default="AAPL", help="Ticker of the market data")
+    parser.add_argument(
+        "--start_date", type=str, default="2020-01-01", help="Start of the market data"
+    )
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent workers")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run for")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    args = parser.parse_args()
+
+    logger.info(f"Started the load test at {datetime.utcnow()}")
+    asyncio.run(run_load_test(args))
+
+
+if __name__ == "__main__":
+    main()
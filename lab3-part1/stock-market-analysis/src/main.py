@@ -1,12 +1,30 @@
 import argparse
+import os
+import shlex
+import sys
+import time
 from datetime import datetime
 
 import pandas as pd
-
-from manager import InvalidUserException, PortfolioManager, TickerDataManager, UserManager
+import yaml
+from export import write_frames
+from ingest import OHLC_COLUMNS
+from intraday import INGEST_INTERVALS
+from manager import (
+    ForecastManager,
+    InvalidUserException,
+    PortfolioManager,
+    TickerDataManager,
+    TickerInfoManager,
+    UserManager,
+)
+from migrations import ensure_indexes
 from models import PortfolioModel, UserBase
+from refresher import run_daemon
 from rich.pretty import pretty_repr
-from settings import get_logger, get_password_hash
+from scheduler import fetch_stocks_data
+from settings import config, get_logger, get_password_hash
+from storage import migrate_to_timeseries
 
 logger = get_logger(__name__)
 
@@ -110,19 +128,55 @@ def fetch_stocks_data_portfolio(args):
 
         if portfolio:
             portfolio = portfolio.model_dump()
-            for stocks in portfolio["tickers"]:
-                ticker_data = TickerDataManager.get_stock_data(
-                    ticker_code=stocks["ticker_code"],
-                    start_date=(
-                        datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None
-                    ),
-                    end_date=(
-                        datetime.strptime(args.end_date, "%Y-%m-%d")
-                        if args.end_date
-                        else datetime.utcnow()
-                    ),
-                )
-                logger.info(pd.DataFrame(ticker_data))
+            ticker_codes = [stocks["ticker_code"] for stocks in portfolio["tickers"] or []]
+
+            # Resolve every ticker in bulk so the workers are served from the cache
+            TickerInfoManager.get_many_ticker_details(ticker_codes)
+            tickers_data, report = fetch_stocks_data(
+                ticker_codes,
+                start_date=(
+                    datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None
+                ),
+                end_date=(
+                    datetime.strptime(args.end_date, "%Y-%m-%d")
+                    if args.end_date
+                    else datetime.utcnow()
+                ),
+                max_workers=args.max_workers,
+                fetch_fn=TickerDataManager.get_stock_data_frame,
+            )
+            for ticker_data in tickers_data.values():
+                if ticker_data is not None:
+                    logger.info(ticker_data)
+            logger.info(f"Fetch report:\n{pretty_repr(report.model_dump())}")
+            logger.debug(f"Ticker info cache:\n{pretty_repr(TickerInfoManager.cache_stats())}")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def analyze_portfolio(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        portfolio_manager = PortfolioManager(username=args.username)
+        analysis = portfolio_manager.analyze_portfolio(
+            portfolio_id=args.portfolio_id,
+            start_date=datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None,
+            end_date=(
+                datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else datetime.utcnow()
+            ),
+            window=args.window,
+            risk_free_rate=args.risk_free_rate,
+            max_workers=args.max_workers,
+        )
+        if analysis:
+            logger.info(f"Holdings:\n{analysis['summary']}")
+            logger.info(f"Equally weighted portfolio:\n{pretty_repr(analysis['portfolio'])}")
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+                for name in ("summary", "covariance", "correlation", "rolling_volatility"):
+                    analysis[name].to_parquet(os.path.join(args.output_dir, f"{name}.parquet"))
+                logger.info(f"Wrote the analysis to '{args.output_dir}'")
     else:
         raise InvalidUserException("Invalid username or password")
 
@@ -139,6 +193,33 @@ def fetch_portfolio_by_id(args):
         raise InvalidUserException("Invalid username or password")
 
 
+def read_portfolio_files(paths: list):
+    # A file holds either one portfolio, named after the file unless it has a `portfolio_name`,
+    # or a `portfolios` list of them
+    portfolios = {}
+    for path in paths:
+        with open(path) as f:
+            content = yaml.safe_load(f) or {}
+        default_name = os.path.splitext(os.path.basename(path))[0]
+        for portfolio in content.get("portfolios", [content]):
+            portfolio_name = portfolio.get("portfolio_name", default_name)
+            portfolios.setdefault(portfolio_name, []).extend(
+                ticker["ticker_code"] for ticker in portfolio.get("tickers") or []
+            )
+    return portfolios
+
+
+def import_portfolios(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        portfolio_manager = PortfolioManager(username=args.username)
+        summary = portfolio_manager.import_portfolios(read_portfolio_files(args.files))
+        logger.info(f"Import summary:\n{pretty_repr(summary)}")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
 ###################################################################################################
 # Ticker Data Management
 ###################################################################################################
@@ -146,22 +227,179 @@ def get_stock_market_data(args):
     user_manager = UserManager()
     is_verified = user_manager.verify_user(args.username, args.password)
     if is_verified:
-        ticker_data = TickerDataManager.get_stock_data(
+        start_date = datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None
+        end_date = (
+            datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else datetime.utcnow()
+        )
+        if args.output:
+            # Streamed to the file batch by batch, memory use does not grow with the date range
+            frames = TickerDataManager.iter_stock_data(
+                ticker_code=args.ticker_code,
+                start_date=start_date,
+                end_date=end_date,
+                columns=args.columns,
+                batch_size=args.batch_size,
+            )
+            columns = ["datetime", *args.columns] if args.columns else OHLC_COLUMNS
+            write_frames(frames, args.output, columns=columns)
+            return
+
+        ticker_data = TickerDataManager.get_stock_data_frame(
+            ticker_code=args.ticker_code, start_date=start_date, end_date=end_date
+        )
+        logger.info(ticker_data)
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def backfill_market_data(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        ticker_codes = list(args.ticker_codes or [])
+        if args.symbols_file:
+            ticker_codes += pd.read_csv(args.symbols_file)["ticker"].dropna().tolist()
+
+        ingested = TickerDataManager.backfill_stock_data(
+            ticker_codes,
+            start_date=datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None,
+            end_date=(
+                datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else datetime.utcnow()
+            ),
+        )
+        logger.info(f"Ingested rows per ticker:\n{pretty_repr(ingested)}")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def refresh_market_data(args):
+    # Same as `python refresher.py`, for every portfolio so it does not take credentials
+    logger.info(f"Started the refresh daemon at {datetime.utcnow()}")
+    try:
+        run_daemon(interval=args.interval, max_workers=args.max_workers, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Stopped the refresh daemon")
+
+
+def backfill_intraday_data(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        written = TickerDataManager.backfill_intraday_data(
+            ticker_code=args.ticker_code,
+            interval=args.interval,
+            start_date=datetime.fromisoformat(args.start_date) if args.start_date else None,
+            end_date=datetime.fromisoformat(args.end_date) if args.end_date else None,
+        )
+        logger.info(f"Rows written per tier:\n{pretty_repr(written)}")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def get_intraday_bars(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        bars = TickerDataManager.get_intraday_bars(
+            ticker_code=args.ticker_code,
+            interval=args.interval,
+            start_date=datetime.fromisoformat(args.start_date) if args.start_date else None,
+            end_date=datetime.fromisoformat(args.end_date) if args.end_date else None,
+        )
+        if args.output:
+            write_frames([bars], args.output)
+        else:
+            logger.info(bars)
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def get_technical_indicators(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        indicators = TickerDataManager.get_indicators(
             ticker_code=args.ticker_code,
             start_date=datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None,
             end_date=(
                 datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else datetime.utcnow()
             ),
         )
-        logger.info(pd.DataFrame(ticker_data))
+        if args.output:
+            write_frames([indicators], args.output)
+        else:
+            logger.info(indicators)
     else:
         raise InvalidUserException("Invalid username or password")
 
 
+###################################################################################################
+# Forecasting
+###################################################################################################
+def train_forecast_model(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        history = ForecastManager.train(
+            ticker_codes=args.ticker_codes,
+            model_name=args.model,
+            start_date=datetime.strptime(args.start_date, "%Y-%m-%d") if args.start_date else None,
+            end_date=(
+                datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else datetime.utcnow()
+            ),
+            window=args.window,
+            hidden=args.hidden,
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            learning_rate=args.learning_rate,
+        )
+        logger.info(f"Training history:\n{pretty_repr(history)}")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+def predict_prices(args):
+    user_manager = UserManager()
+    is_verified = user_manager.verify_user(args.username, args.password)
+    if is_verified:
+        ticker_codes = args.ticker_codes
+        if args.portfolio_id:
+            portfolio_manager = PortfolioManager(username=args.username)
+            portfolio = portfolio_manager.get_portfolio_by_id(portfolio_id=args.portfolio_id)
+            if not portfolio:
+                return
+            ticker_codes = [ticker.ticker_code for ticker in portfolio.tickers or []]
+
+        start = time.perf_counter()
+        forecasts = ForecastManager.forecast(
+            ticker_codes=ticker_codes, model_name=args.model, horizon=args.horizon
+        )
+        logger.info(f"Forecast adjusted closes:\n{forecasts}")
+        logger.debug(f"Forecast in {(time.perf_counter() - start) * 1000:.1f} ms")
+    else:
+        raise InvalidUserException("Invalid username or password")
+
+
+###################################################################################################
+# Storage Management
+###################################################################################################
+def migrate_storage(args):
+    migrated = migrate_to_timeseries(drop=args.drop)
+    logger.info(f"Migrated tickers to the time-series collection:\n{pretty_repr(migrated)}")
+
+
+def ensure_storage_indexes(args):
+    versions = ensure_indexes()
+    if versions:
+        logger.info(f"Applied index migrations: {versions}")
+    else:
+        logger.info("Indexes are up to date")
+
+
 ###################################################################################################
 # Command Line Toolkit
 ###################################################################################################
-def main():
+def build_parser():
     # Create the main parser
     parser = argparse.ArgumentParser(
         description="Command-line interface for Stock Market Analysis Application"
@@ -278,6 +516,63 @@ def main():
         help="End date",
         default=datetime.utcnow().strftime("%Y-%m-%d"),
     )
+    fetch_portfolio_data_parser.add_argument(
+        "--max_workers",
+        type=int,
+        required=False,
+        help="Number of tickers fetched concurrently",
+        default=config.FETCH_MAX_WORKERS,
+    )
+
+    # Subparser for the "analyze_portfolio" command
+    analyze_portfolio_parser = portfolio_subparsers.add_parser(
+        "analyze", help="Returns, volatility, drawdowns, Sharpe ratios and correlations"
+    )
+    analyze_portfolio_parser.add_argument("--username", type=str, required=True, help="Username")
+    analyze_portfolio_parser.add_argument(
+        "--password", type=str, required=True, help="User's password"
+    )
+    analyze_portfolio_parser.add_argument(
+        "--portfolio_id", type=str, required=True, help="Portfolio ID"
+    )
+    analyze_portfolio_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date", default=None
+    )
+    analyze_portfolio_parser.add_argument(
+        "--end_date", type=str, required=False, help="End date", default=None
+    )
+    analyze_portfolio_parser.add_argument(
+        "--window", type=int, required=False, help="Rolling volatility window", default=21
+    )
+    analyze_portfolio_parser.add_argument(
+        "--risk_free_rate",
+        type=float,
+        required=False,
+        help="Annual risk free rate of the Sharpe ratios",
+        default=0.0,
+    )
+    analyze_portfolio_parser.add_argument(
+        "--max_workers",
+        type=int,
+        required=False,
+        help="Number of tickers refreshed concurrently",
+        default=config.FETCH_MAX_WORKERS,
+    )
+    analyze_portfolio_parser.add_argument(
+        "--output_dir", type=str, required=False, help="Write the analysis as Parquet files"
+    )
+
+    # Subparser for the "import_portfolios" command
+    import_portfolios_parser = portfolio_subparsers.add_parser(
+        "import", help="Create or extend portfolios from YAML files"
+    )
+    import_portfolios_parser.add_argument("--username", type=str, required=True, help="Username")
+    import_portfolios_parser.add_argument(
+        "--password", type=str, required=True, help="User's password"
+    )
+    import_portfolios_parser.add_argument(
+        "--files", type=str, nargs="+", required=True, help="Portfolio YAML files"
+    )
 
     ###############################################################################################
     # Create parser for the "market-data" command
@@ -308,12 +603,236 @@ def main():
         help="End date",
         default=datetime.utcnow().strftime("%Y-%m-%d"),
     )
+    fetch_stock_data_parser.add_argument(
+        "--output", type=str, required=False, help="Write the data to a .csv or .parquet file"
+    )
+    fetch_stock_data_parser.add_argument(
+        "--columns",
+        type=str,
+        nargs="+",
+        required=False,
+        help="Columns to write besides datetime, e.g. close volume",
+    )
+    fetch_stock_data_parser.add_argument(
+        "--batch_size",
+        type=int,
+        required=False,
+        help="Rows read and written at a time with --output",
+        default=config.OHLC_STREAM_BATCH_SIZE,
+    )
+
+    # Subparser for the "backfill" command
+    backfill_parser = market_subparsers.add_parser(
+        "backfill", help="Download data for many tickers in batches"
+    )
+    backfill_parser.add_argument("--username", type=str, required=True, help="Username")
+    backfill_parser.add_argument("--password", type=str, required=True, help="User's password")
+    backfill_parser.add_argument(
+        "--ticker_codes", type=str, nargs="+", required=False, help="Ticker codes", default=None
+    )
+    backfill_parser.add_argument(
+        "--symbols_file",
+        type=str,
+        required=False,
+        help="CSV file with a 'ticker' column, e.g. notebooks/us_symbols.csv",
+        default=None,
+    )
+    backfill_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date", default=None
+    )
+    backfill_parser.add_argument(
+        "--end_date",
+        type=str,
+        required=False,
+        help="End date",
+        default=datetime.utcnow().strftime("%Y-%m-%d"),
+    )
+
+    # Subparser for the "refresh" command
+    refresh_parser = market_subparsers.add_parser(
+        "refresh", help="Keep the tickers of every portfolio up to date in the background"
+    )
+    refresh_parser.add_argument(
+        "--interval",
+        type=float,
+        default=config.REFRESH_INTERVAL,
+        help="Seconds between the start of two refresh cycles",
+    )
+    refresh_parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=config.REFRESH_MAX_WORKERS,
+        help="Batches refreshed concurrently, capped to the Yahoo Finance rate limit",
+    )
+    refresh_parser.add_argument(
+        "--once", action="store_true", help="Run a single refresh cycle and exit"
+    )
+
+    # Subparser for the "backfill_intraday_data" command
+    fetch_intraday_parser = market_subparsers.add_parser(
+        "fetch-intraday", help="Download intraday bars and roll them up into coarser tiers"
+    )
+    fetch_intraday_parser.add_argument("--username", type=str, required=True, help="Username")
+    fetch_intraday_parser.add_argument(
+        "--password", type=str, required=True, help="User's password"
+    )
+    fetch_intraday_parser.add_argument("--ticker_code", type=str, required=True, help="Ticker code")
+    fetch_intraday_parser.add_argument(
+        "--interval", type=str, choices=INGEST_INTERVALS, required=True, help="Bar interval"
+    )
+    fetch_intraday_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date or datetime", default=None
+    )
+    fetch_intraday_parser.add_argument(
+        "--end_date", type=str, required=False, help="End date or datetime", default=None
+    )
+
+    # Subparser for the "get_intraday_bars" command
+    fetch_bars_parser = market_subparsers.add_parser(
+        "fetch-bars",
+        help="Read stored intraday bars of any interval, e.g. 1m, 30m, 4h or 1d. 1h and daily"
+        " bars older than 60 days are read from the downloaded 1h bars, aligned to the market open",
+    )
+    fetch_bars_parser.add_argument("--username", type=str, required=True, help="Username")
+    fetch_bars_parser.add_argument("--password", type=str, required=True, help="User's password")
+    fetch_bars_parser.add_argument("--ticker_code", type=str, required=True, help="Ticker code")
+    fetch_bars_parser.add_argument("--interval", type=str, required=True, help="Bar interval")
+    fetch_bars_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date or datetime", default=None
+    )
+    fetch_bars_parser.add_argument(
+        "--end_date", type=str, required=False, help="End date or datetime, excluded", default=None
+    )
+    fetch_bars_parser.add_argument(
+        "--output", type=str, required=False, help="Write the bars to a .csv or .parquet file"
+    )
+
+    # Subparser for the "get_technical_indicators" command
+    indicators_parser = market_subparsers.add_parser(
+        "indicators", help="Moving averages, RSI, MACD and Bollinger bands of a ticker"
+    )
+    indicators_parser.add_argument("--username", type=str, required=True, help="Username")
+    indicators_parser.add_argument("--password", type=str, required=True, help="User's password")
+    indicators_parser.add_argument("--ticker_code", type=str, required=True, help="Ticker code")
+    indicators_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date", default=None
+    )
+    indicators_parser.add_argument(
+        "--end_date", type=str, required=False, help="End date", default=None
+    )
+    indicators_parser.add_argument(
+        "--output", type=str, required=False, help="Write the indicators to a .csv or .parquet file"
+    )
 
     ###############################################################################################
-    # Parse the command-line arguments
+    # Create parser for the "forecast" command
     ###############################################################################################
-    args = parser.parse_args()
+    forecast_parser = subparsers.add_parser("forecast", help="Price forecasting commands")
+    forecast_subparsers = forecast_parser.add_subparsers(
+        dest="subcommand", help="Available subcommands"
+    )
+
+    # Subparser for the "train" command
+    train_parser = forecast_subparsers.add_parser(
+        "train", help="Train one LSTM model on the daily data of many tickers"
+    )
+    train_parser.add_argument("--username", type=str, required=True, help="Username")
+    train_parser.add_argument("--password", type=str, required=True, help="User's password")
+    train_parser.add_argument(
+        "--ticker_codes", type=str, nargs="+", required=True, help="Ticker codes"
+    )
+    train_parser.add_argument(
+        "--model", type=str, required=False, help="Name of the model", default="default"
+    )
+    train_parser.add_argument(
+        "--start_date", type=str, required=False, help="Start date", default=None
+    )
+    train_parser.add_argument("--end_date", type=str, required=False, help="End date")
+    train_parser.add_argument(
+        "--window", type=int, required=False, help="Days of returns per sample", default=30
+    )
+    train_parser.add_argument(
+        "--hidden", type=int, required=False, help="Size of the LSTM state", default=16
+    )
+    train_parser.add_argument(
+        "--epochs", type=int, required=False, help="Passes over the data", default=20
+    )
+    train_parser.add_argument(
+        "--batch_size",
+        type=int,
+        required=False,
+        help="Windows per training step, drawn from all tickers",
+        default=256,
+    )
+    train_parser.add_argument(
+        "--learning_rate", type=float, required=False, help="Adam learning rate", default=1e-3
+    )
+
+    # Subparser for the "predict" command
+    predict_parser = forecast_subparsers.add_parser(
+        "predict", help="Forecast the next adjusted closes of many tickers"
+    )
+    predict_parser.add_argument("--username", type=str, required=True, help="Username")
+    predict_parser.add_argument("--password", type=str, required=True, help="User's password")
+    predict_tickers = predict_parser.add_mutually_exclusive_group(required=True)
+    predict_tickers.add_argument("--ticker_codes", type=str, nargs="+", help="Ticker codes")
+    predict_tickers.add_argument(
+        "--portfolio_id", type=str, help="Forecast the tickers of a portfolio"
+    )
+    predict_parser.add_argument(
+        "--model", type=str, required=False, help="Name of the model", default="default"
+    )
+    predict_parser.add_argument(
+        "--horizon", type=int, required=False, help="Days to forecast", default=5
+    )
+
+    ###############################################################################################
+    # Create parser for the "storage" command
+    ###############################################################################################
+    storage_parser = subparsers.add_parser("storage", help="Ticker data storage commands")
+    storage_subparsers = storage_parser.add_subparsers(
+        dest="subcommand", help="Available subcommands"
+    )
+
+    # Subparser for the "migrate-timeseries" command
+    migrate_parser = storage_subparsers.add_parser(
+        "migrate-timeseries",
+        help="Move per-ticker collections into the shared time-series collection",
+    )
+    migrate_parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop the per-ticker collections after they are migrated",
+    )
 
+    # Subparser for the "ensure-indexes" command
+    storage_subparsers.add_parser(
+        "ensure-indexes", help="Create the indexes of the application, once per version"
+    )
+
+    ###############################################################################################
+    # Create parser for the "batch" command
+    ###############################################################################################
+    batch_parser = subparsers.add_parser(
+        "batch", help="Run a script of commands in one process with one authentication"
+    )
+    batch_parser.add_argument(
+        "--script", type=str, required=True, help="File with one command per line, '-' for stdin"
+    )
+    batch_parser.add_argument(
+        "--username", type=str, required=False, help="Username used by every command"
+    )
+    batch_parser.add_argument(
+        "--password", type=str, required=False, help="User's password used by every command"
+    )
+    batch_parser.add_argument(
+        "--stop_on_error", action="store_true", help="Stop at the first failing command"
+    )
+
+    return parser
+
+
+def dispatch(args, parser):
     # Dispatch to the appropriate function based on the subcommand
     if args.command == "user":
         if args.subcommand == "create":
@@ -338,17 +857,101 @@ def main():
             fetch_portfolio_by_id(args)
         elif args.subcommand == "fetch-portfolio-data":
             fetch_stocks_data_portfolio(args)
+        elif args.subcommand == "import":
+            import_portfolios(args)
+        elif args.subcommand == "analyze":
+            analyze_portfolio(args)
         else:
             logger.error(
                 "Invalid portfolio subcommand. Use 'create', 'remove', 'add-stock', 'remove-stock',"
-                " 'fetch-one' or 'list-all'."
+                " 'fetch-one', 'list-all', 'import' or 'analyze'."
             )
 
     if args.command == "market-data":
         if args.subcommand == "fetch-stock-data":
             get_stock_market_data(args)
+        elif args.subcommand == "backfill":
+            backfill_market_data(args)
+        elif args.subcommand == "refresh":
+            refresh_market_data(args)
+        elif args.subcommand == "fetch-intraday":
+            backfill_intraday_data(args)
+        elif args.subcommand == "fetch-bars":
+            get_intraday_bars(args)
+        elif args.subcommand == "indicators":
+            get_technical_indicators(args)
+        else:
+            logger.error(
+                "Invalid subcommand. Use 'fetch-stock-data', 'backfill', 'refresh',"
+                " 'fetch-intraday', 'fetch-bars' or 'indicators'."
+            )
+
+    if args.command == "forecast":
+        if args.subcommand == "train":
+            train_forecast_model(args)
+        elif args.subcommand == "predict":
+            predict_prices(args)
+        else:
+            logger.error("Invalid subcommand. Use 'train' or 'predict'.")
+
+    if args.command == "storage":
+        if args.subcommand == "migrate-timeseries":
+            migrate_storage(args)
+        elif args.subcommand == "ensure-indexes":
+            ensure_storage_indexes(args)
         else:
-            logger.error("Invalid subcommand. Use 'fetch-stock-data'.")
+            logger.error("Invalid subcommand. Use 'migrate-timeseries' or 'ensure-indexes'.")
+
+    if args.command == "batch":
+        run_batch(args, parser)
+
+
+###################################################################################################
+# Batch Mode
+###################################################################################################
+def run_batch(args, parser):
+    script = sys.stdin if args.script == "-" else open(args.script)
+    with script:
+        lines = [line.strip() for line in script]
+
+    n_commands, n_failed, start = 0, 0, time.perf_counter()
+    for line_no, line in enumerate(lines, start=1):
+        if not line or line.startswith("#"):
+            continue
+
+        argv = shlex.split(line)
+        if argv and argv[0] in ("python", "python3"):
+            argv = argv[2:]  # Lines copied from the examples, e.g. "python main.py ..."
+        credentials = []
+        if args.username and "--username" not in argv:
+            credentials = ["--username", args.username, "--password", args.password or ""]
+
+        n_commands += 1
+        try:
+            # Commands that do not take credentials leave the batch ones unparsed
+            command_args, unknown = parser.parse_known_args(argv + credentials)
+            if unknown and unknown != credentials:
+                parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+            if command_args.command == "batch":
+                raise ValueError("Batch scripts cannot run other batch scripts")
+            dispatch(command_args, parser)
+        except (Exception, SystemExit) as e:
+            n_failed += 1
+            logger.error(f"Command on line {line_no} failed: {e!r}")
+            if args.stop_on_error:
+                break
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Ran {n_commands} commands ({n_failed} failed) in {elapsed:.2f}s,"
+        f" {n_commands / elapsed if elapsed else 0:.1f} commands/second"
+    )
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    dispatch(args, parser)
 
 
 if __name__ == "__main__":
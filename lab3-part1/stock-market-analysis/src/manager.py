@@ -1,25 +1,57 @@
-from datetime import datetime, timedelta
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
+import numpy as np
+import pandas as pd
 import pymongo
+from analytics import align_prices, analyze_prices
+from auth import session_store
+from cache import TTLCache, aligned_price_cache, forecast_cache, ohlc_cache
 from db import (
     PyObjectId,
     portfolios_collection,
-    ticker_db,
     tickers_info_collection,
     users_collection,
 )
+from export import iter_frames
+from forecast import (
+    forecast_prices,
+    get_model_path,
+    last_valid_dates,
+    load_model,
+    train_forecaster,
+)
+from indicators import read_indicators, refresh_indicators
+from intraday import get_bars, ingest_intraday_data, preprocess_intraday_data, select_tier
 from models import (
     PortfolioListModel,
     PortfolioModel,
     PortfolioPreviewModel,
-    TickerDataModel,
     TickerInfoUpdateModel,
     TickerSummaryModel,
     UserBase,
     UserDetailsModel,
 )
-from settings import get_logger, verify_password
-from yf import basic_preprocess, clean_ticker_data, get_ticker_data, get_ticker_info, resample
+from planner import (
+    HISTORY_START,
+    ONE_DAY,
+    drop_covered_rows,
+    fetched_range,
+    merge_ranges,
+    plan_backfill,
+    to_day,
+)
+from pymongo.errors import BulkWriteError
+from settings import config, get_logger, verify_password
+from storage import get_ticker_store
+from yf import (
+    get_intraday_data,
+    get_ticker_data,
+    get_ticker_info,
+    get_tickers_data,
+    preprocess_ticker_data,
+)
 
 logger = get_logger(__name__)
 
@@ -33,8 +65,9 @@ class InvalidUserException(ValueError):
 
 
 class UserManager:
-    def __init__(self, users_collection=users_collection):
+    def __init__(self, users_collection=users_collection, session_store=session_store):
         self.users_collection = users_collection
+        self.session_store = session_store
 
     def create_user(self, user_data: UserBase):
         user_data = user_data.model_dump()
@@ -61,8 +94,20 @@ class UserManager:
 
     def verify_user(self, username: str, password):
         user = self.users_collection.find_one({"username": username}, {"_id": 0})
-        if user and verify_password(password, user["password"]):
+        if not user:
+            return False
+
+        # Credentials verified recently skip bcrypt, until the password changes
+        if self.session_store is not None and self.session_store.is_valid(
+            username, password, user["password"]
+        ):
+            logger.debug("User verification successful using the session cache")
+            return True
+
+        if verify_password(password, user["password"]):
             logger.info("User verification successful")
+            if self.session_store is not None:
+                self.session_store.add(username, password, user["password"])
             return True
         else:
             return False
@@ -76,7 +121,8 @@ class PortfolioManager:
     def create_portfolio(self, portfolio_data: PortfolioModel):
         portfolio_data = portfolio_data.model_dump()
         curr = self.portfolios_collection.find_one(
-            {"portfolio_name": portfolio_data["portfolio_name"]}, {"_id": 0}
+            {"username": self.username, "portfolio_name": portfolio_data["portfolio_name"]},
+            {"_id": 1},
         )
         if curr:
             logger.exception(
@@ -124,7 +170,7 @@ class PortfolioManager:
                 return
 
             ticker_info = TickerInfoManager.get_ticker_details(ticker_code)
-            tickers.append(ticker_info)
+            tickers.append(TickerSummaryModel(**ticker_info).model_dump())
 
             # Update the portfolio with the new tickers list
             self.portfolios_collection.update_one(
@@ -178,21 +224,261 @@ class PortfolioManager:
         else:
             logger.error(f"Invalid portfolio id: '{portfolio_id}'")
 
+    def analyze_portfolio(
+        self,
+        portfolio_id: str,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        window: int = 21,
+        risk_free_rate: float = 0.0,
+        max_workers: int = config.FETCH_MAX_WORKERS,
+    ):
+        portfolio = self.get_portfolio_by_id(portfolio_id)
+        if not portfolio:
+            return None
+
+        ticker_codes = [ticker.ticker_code for ticker in portfolio.tickers or []]
+        if not ticker_codes:
+            logger.error(f"Portfolio '{portfolio.portfolio_name}' has no tickers to analyze")
+            return None
+
+        dates, tickers, prices = TickerDataManager.get_aligned_prices(
+            ticker_codes, start_date=start_date, end_date=end_date, max_workers=max_workers
+        )
+        if not len(dates) or not tickers:
+            logger.error(f"No prices of '{portfolio.portfolio_name}' stored in the date range")
+            return None
+        logger.info(
+            f"Analyzing {len(tickers)} tickers over {len(dates)} days of"
+            f" '{portfolio.portfolio_name}'"
+        )
+        return analyze_prices(dates, tickers, prices, window=window, risk_free_rate=risk_free_rate)
+
+    def _import_requests(self, tickers: dict):
+        # One write per portfolio of a {portfolio_name: {ticker_code: ticker}} dict, in its order.
+        # Portfolios created without tickers hold null, which `$push` cannot extend
+        self.portfolios_collection.update_many(
+            {"username": self.username, "portfolio_name": {"$in": list(tickers)}, "tickers": None},
+            {"$set": {"tickers": []}},
+        )
+        stored_codes = {
+            portfolio["portfolio_name"]: {ticker["ticker_code"] for ticker in portfolio["tickers"]}
+            for portfolio in self.portfolios_collection.find(
+                {"username": self.username, "portfolio_name": {"$in": list(tickers)}},
+                {"_id": 0, "portfolio_name": 1, "tickers.ticker_code": 1},
+            )
+        }
+
+        now = datetime.utcnow()
+        requests = []
+        for portfolio_name, portfolio_tickers in tickers.items():
+            update = {"$setOnInsert": {"created_at": now}, "$set": {"updated_at": now}}
+            if portfolio_name not in stored_codes:
+                requests.append(
+                    pymongo.UpdateOne(
+                        # Does not match a portfolio created concurrently since it was read, whose
+                        # name then fails the unique index instead of getting the tickers again
+                        {
+                            "username": self.username,
+                            "portfolio_name": portfolio_name,
+                            "tickers": {"$exists": False},
+                        },
+                        {
+                            **update,
+                            "$push": {"tickers": {"$each": list(portfolio_tickers.values())}},
+                        },
+                        upsert=True,
+                    )
+                )
+                continue
+
+            new_codes = [
+                code for code in portfolio_tickers if code not in stored_codes[portfolio_name]
+            ]
+            requests.append(
+                pymongo.UpdateOne(
+                    # Not pushed if a ticker was added concurrently since it was read
+                    {
+                        "username": self.username,
+                        "portfolio_name": portfolio_name,
+                        "tickers.ticker_code": {"$nin": new_codes},
+                    },
+                    {
+                        **update,
+                        "$push": {
+                            "tickers": {"$each": [portfolio_tickers[code] for code in new_codes]}
+                        },
+                    },
+                )
+            )
+        return requests
+
+    def import_portfolios(self, portfolios: dict):
+        """Create or extend many portfolios at once from a {portfolio_name: [ticker_code]} dict.
+
+        Tickers are resolved in bulk and all portfolios are written with a single unordered bulk
+        write. Tickers whose code is already in a portfolio are not added again, and a portfolio
+        that cannot be written does not stop the others.
+        """
+        portfolios = {
+            portfolio_name: list(dict.fromkeys(ticker_codes))
+            for portfolio_name, ticker_codes in portfolios.items()
+        }
+        details = TickerInfoManager.get_many_ticker_details(
+            [ticker_code for ticker_codes in portfolios.values() for ticker_code in ticker_codes]
+        )
+
+        # Different spellings of a code resolve to the same ticker
+        tickers = {
+            portfolio_name: {
+                details[ticker_code]["ticker_code"]: TickerSummaryModel(
+                    **details[ticker_code]
+                ).model_dump()
+                for ticker_code in ticker_codes
+                if ticker_code in details
+            }
+            for portfolio_name, ticker_codes in portfolios.items()
+        }
+
+        created, failed, pending = 0, [], list(portfolios)
+        for _ in range(2):
+            if not pending:
+                break
+            requests = self._import_requests({name: tickers[name] for name in pending})
+            try:
+                result = self.portfolios_collection.bulk_write(requests, ordered=False)
+                created += result.upserted_count
+                pending = []
+            except BulkWriteError as e:
+                created += e.details["nUpserted"]
+                errors = e.details["writeErrors"]
+                # Names are unique per user, a portfolio created concurrently by the same user is
+                # imported again as an update
+                retry = [pending[error["index"]] for error in errors if error["code"] == 11000]
+                errors = [error for error in errors if error["code"] != 11000]
+                if errors:
+                    failed += [pending[error["index"]] for error in errors]
+                    logger.error(f"Could not import portfolios: {errors}")
+                pending = retry
+        failed = sorted(failed + pending)
+        updated = len(portfolios) - created - len(failed)
+        logger.info(
+            f"Imported {len(portfolios)} portfolios: {created} created, {updated} updated and"
+            f" {len(failed)} failed."
+        )
+        return {
+            "created": created,
+            "updated": updated,
+            "failed": failed,
+            "invalid_tickers": sorted(
+                {
+                    ticker_code
+                    for ticker_codes in portfolios.values()
+                    for ticker_code in ticker_codes
+                    if ticker_code not in details
+                }
+            ),
+        }
+
 
 class TickerInfoManager:
+    # Details without the coverage, which other processes update and is always read from the
+    # database
+    info_cache = TTLCache(maxsize=config.TICKER_INFO_CACHE_SIZE, ttl=config.TICKER_INFO_CACHE_TTL)
+    # Codes Yahoo Finance does not know, so they are not looked up again on every call
+    invalid_cache = TTLCache(
+        maxsize=config.TICKER_INFO_CACHE_SIZE, ttl=config.TICKER_INFO_NEGATIVE_CACHE_TTL
+    )
+
     @staticmethod
     def get_ticker_details(ticker_code: str):
+        t_info = TickerInfoManager.info_cache.get(ticker_code)
+        if t_info is not None:
+            return dict(t_info)
+        if TickerInfoManager.invalid_cache.get(ticker_code):
+            raise ValueError(f"Invalid Ticker code '{ticker_code}'")
+
         t_info = tickers_info_collection.find_one(
-            {"ticker_code": ticker_code}, {"_id": 0, "created_at": 0}
+            {"ticker_code": ticker_code}, {"_id": 0, "created_at": 0, "coverage": 0}
         )
         if not t_info:
             logger.info(
                 "Ticker code not found in the info collection. Querying the Yahoo Finance service."
             )
-            t_info = get_ticker_info(ticker_code)
-            t_info["created_at"] = datetime.utcnow()
-            tickers_info_collection.insert_one(t_info)
-        return t_info
+            t_info = TickerInfoManager._fetch_ticker_info(ticker_code)
+            tickers_info_collection.insert_one({**t_info, "created_at": datetime.utcnow()})
+        TickerInfoManager.info_cache.set(ticker_code, t_info)
+        return dict(t_info)
+
+    @staticmethod
+    def get_many_ticker_details(ticker_codes: list):
+        """Resolve many tickers at once, invalid codes are logged and left out of the result."""
+        details, misses = {}, []
+        for ticker_code in dict.fromkeys(ticker_codes):
+            t_info = TickerInfoManager.info_cache.get(ticker_code)
+            if t_info is not None:
+                details[ticker_code] = dict(t_info)
+            elif not TickerInfoManager.invalid_cache.get(ticker_code):
+                misses.append(ticker_code)
+
+        # Everything already known to the database in a single query
+        if misses:
+            for t_info in tickers_info_collection.find(
+                {"ticker_code": {"$in": misses}}, {"_id": 0, "created_at": 0, "coverage": 0}
+            ):
+                TickerInfoManager.info_cache.set(t_info["ticker_code"], t_info)
+                details[t_info["ticker_code"]] = dict(t_info)
+        misses = [ticker_code for ticker_code in misses if ticker_code not in details]
+
+        # The rest from Yahoo Finance concurrently
+        if misses:
+            logger.info(f"Querying the Yahoo Finance service for {len(misses)} tickers.")
+            with ThreadPoolExecutor(max_workers=config.FETCH_MAX_WORKERS) as pool:
+                fetched = pool.map(TickerInfoManager._try_fetch_ticker_info, misses)
+                fetched = dict(zip(misses, fetched))
+            fetched = {code: t_info for code, t_info in fetched.items() if t_info is not None}
+            if fetched:
+                created_at = datetime.utcnow()
+                try:
+                    tickers_info_collection.insert_many(
+                        [{**t_info, "created_at": created_at} for t_info in fetched.values()],
+                        ordered=False,
+                    )
+                except BulkWriteError as e:
+                    # Codes that resolved to a symbol already stored under a different spelling
+                    logger.warning(
+                        f"{len(e.details['writeErrors'])} ticker details were already stored."
+                    )
+            for ticker_code, t_info in fetched.items():
+                TickerInfoManager.info_cache.set(ticker_code, t_info)
+                details[ticker_code] = dict(t_info)
+
+        invalid = [ticker_code for ticker_code in ticker_codes if ticker_code not in details]
+        if invalid:
+            logger.error(f"Invalid ticker codes: {sorted(set(invalid))}")
+        return details
+
+    @staticmethod
+    def _fetch_ticker_info(ticker_code: str):
+        try:
+            return get_ticker_info(ticker_code)
+        except ValueError:
+            TickerInfoManager.invalid_cache.set(ticker_code, True)
+            raise
+
+    @staticmethod
+    def _try_fetch_ticker_info(ticker_code: str):
+        try:
+            return TickerInfoManager._fetch_ticker_info(ticker_code)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def cache_stats():
+        return {
+            "info": TickerInfoManager.info_cache.stats(),
+            "invalid": TickerInfoManager.invalid_cache.stats(),
+        }
 
     @staticmethod
     def update_ticker_details(ticker_code: str):
@@ -208,134 +494,490 @@ class TickerInfoManager:
                 f"Updated ticker details for '{ticker_code}': {updated_ticker.model_dump()}"
             )
 
+    @staticmethod
+    def get_coverage(ticker_code: str, ticker_store):
+        # Read on every call, a stale coverage would download and insert stored rows again
+        ticker_info = tickers_info_collection.find_one(
+            {"ticker_code": ticker_code}, {"_id": 0, "coverage": 1}
+        )
+        if ticker_info and "coverage" in ticker_info:
+            # Concurrent syncs append overlapping ranges, they are merged on read
+            return merge_ranges(
+                [(day_range["start"], day_range["end"]) for day_range in ticker_info["coverage"]]
+            )
+
+        # Tickers stored before coverage was tracked are assumed to have no holes
+        earliest = ticker_store.find_one(
+            sort=[("datetime", pymongo.ASCENDING)], projection={"datetime": True}
+        )
+        latest = ticker_store.find_one(
+            sort=[("datetime", pymongo.DESCENDING)], projection={"datetime": True}
+        )
+        if earliest is None or latest is None:
+            return []
+        return [(to_day(earliest["datetime"]), to_day(latest["datetime"]))]
+
+    @staticmethod
+    def update_coverage(ticker_code: str, coverage: list):
+        """Add day ranges to the stored coverage of a ticker.
+
+        Ranges are appended on the server, so syncs running at the same time never drop the
+        ranges of each other. The stored list is compacted afterwards, unless another sync changed
+        it in between.
+        """
+        ranges = [{"start": start, "end": end} for start, end in merge_ranges(coverage)]
+        ticker_info = tickers_info_collection.find_one_and_update(
+            {"ticker_code": ticker_code},
+            {"$push": {"coverage": {"$each": ranges}}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"coverage": 1},
+            return_document=pymongo.ReturnDocument.AFTER,
+        )
+        if ticker_info is None:
+            return
+
+        stored = ticker_info["coverage"]
+        merged = merge_ranges([(day_range["start"], day_range["end"]) for day_range in stored])
+        if len(merged) < len(stored):
+            # Compare and set, the filter misses if a concurrent sync appended ranges since
+            tickers_info_collection.update_one(
+                {"ticker_code": ticker_code, "coverage": stored},
+                {"$set": {"coverage": [{"start": start, "end": end} for start, end in merged]}},
+            )
+
 
 class TickerDataManager:
+    @staticmethod
+    def _get_synced_store(
+        ticker_code: str, start_date: datetime, end_date: datetime, strict: bool
+    ):
+        ticker_info = TickerInfoManager.get_ticker_details(ticker_code)
+        ticker_store = get_ticker_store(ticker_info["ticker_code"])
+
+        logger.info(
+            f"Fetching data for stock '{ticker_info['name']} ({ticker_info['ticker_code']})'"
+        )
+
+        TickerDataManager.sync_stock_data(
+            ticker_info, ticker_store, start_date=start_date, end_date=end_date, strict=strict
+        )
+        return ticker_info, ticker_store
+
+    @staticmethod
+    def _date_query(start_date: datetime, end_date: datetime):
+        date_query = {"datetime": {"$lte": end_date}}
+        if start_date is not None:
+            date_query["datetime"]["$gte"] = start_date
+        return date_query
+
     @staticmethod
     def get_stock_data(
         ticker_code: str,
         start_date: datetime = None,
         end_date: datetime = datetime.utcnow(),
+        strict: bool = config.OHLC_STRICT_VALIDATION,
     ):
-        ticker_info = TickerInfoManager.get_ticker_details(ticker_code)
-        ticker_data_collection = ticker_db[ticker_info["ticker_code"]]
+        try:
+            _, ticker_store = TickerDataManager._get_synced_store(
+                ticker_code, start_date, end_date, strict
+            )
+            ticker_data = ticker_store.find(
+                TickerDataManager._date_query(start_date, end_date), {"_id": 0}
+            )
 
-        logger.info(
-            f"Fetching data for stock '{ticker_info['name']} ({ticker_info['ticker_code']})'"
+            return list(ticker_data)
+
+        except Exception as e:
+            logger.exception(f"Error processing ticker data: '{ticker_code}'. {e}")
+
+    @staticmethod
+    def iter_stock_data(
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        columns: list = None,
+        batch_size: int = config.OHLC_STREAM_BATCH_SIZE,
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        """Stream the data of a ticker as DataFrames of at most `batch_size` rows.
+
+        Only `columns` (and `datetime`) are read when given, all of them otherwise. The ticker is
+        synced before the frames are returned and sync errors are raised, so nothing is written
+        for a ticker that could not be brought up to date.
+        """
+        _, ticker_store = TickerDataManager._get_synced_store(
+            ticker_code, start_date, end_date, strict
         )
 
-        ticker_data_collection.create_index([("datetime", pymongo.ASCENDING)], unique=True)
+        projection = {"_id": 0}
+        if columns:
+            projection.update({column: 1 for column in ["datetime", *columns]})
+        cursor = ticker_store.find(TickerDataManager._date_query(start_date, end_date), projection)
+        return iter_frames(cursor.batch_size(batch_size), batch_size)
+
+    @staticmethod
+    def get_stock_data_frame(
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        # Same as `get_stock_data` but served from the local columnar cache as a DataFrame
         try:
-            # Check if ticker_data_collection has data
-            if ticker_data_collection.count_documents({}) > 0:
-                # Get the most recent date in the data
-                most_recent_date = ticker_data_collection.find_one(
-                    {},
-                    sort=[("datetime", pymongo.DESCENDING)],
-                    projection={"datetime": True},
+            ticker_info, ticker_store = TickerDataManager._get_synced_store(
+                ticker_code, start_date, end_date, strict
+            )
+            ohlc_cache.sync(ticker_info["ticker_code"], ticker_store)
+            return ohlc_cache.read(ticker_info["ticker_code"], start_date, end_date)
+
+        except Exception as e:
+            logger.exception(f"Error processing ticker data: '{ticker_code}'. {e}")
+
+    @staticmethod
+    def get_aligned_prices(
+        ticker_codes: list,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        column: str = "adj_close",
+        max_workers: int = config.FETCH_MAX_WORKERS,
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        """Bring many tickers up to date and align their prices into one (dates x tickers) matrix.
+
+        Aligned matrices are cached on disk, keyed by the tickers, the date range and the
+        watermarks of their local OHLC caches, so they are rebuilt only when the data changes.
+        """
+        details = TickerInfoManager.get_many_ticker_details(ticker_codes)
+        ticker_codes = list(dict.fromkeys(t_info["ticker_code"] for t_info in details.values()))
+
+        def refresh(ticker_code: str):
+            try:
+                _, ticker_store = TickerDataManager._get_synced_store(
+                    ticker_code, start_date, end_date, strict
                 )
+                ohlc_cache.sync(ticker_code, ticker_store)
+            except Exception as e:
+                logger.exception(f"Error processing ticker data: '{ticker_code}'. {e}")
+            return ohlc_cache.read_watermark(ticker_code)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            watermarks = dict(zip(ticker_codes, pool.map(refresh, ticker_codes)))
+
+        key = (
+            tuple(ticker_codes),
+            start_date,
+            to_day(end_date),
+            column,
+            tuple(
+                (watermark["max"], watermark["count"]) if watermark else None
+                for watermark in watermarks.values()
+            ),
+        )
+        aligned = aligned_price_cache.get(key)
+        if aligned is not None:
+            logger.debug(f"Aligned prices of {len(ticker_codes)} tickers served from the cache")
+            return aligned["dates"], aligned["tickers"].tolist(), aligned["prices"]
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            frames = pool.map(
+                lambda ticker_code: ohlc_cache.read(
+                    ticker_code, start_date, end_date, columns=["datetime", column]
+                ),
+                ticker_codes,
+            )
+            frames = dict(zip(ticker_codes, frames))
+        dates, tickers, prices = align_prices(frames, column)
+        aligned_price_cache.set(
+            key, dates=dates, tickers=np.array(tickers, dtype=str), prices=prices
+        )
+        return dates, tickers, prices
 
-                most_historical_date = ticker_data_collection.find_one(
-                    {},
-                    sort=[("datetime", pymongo.ASCENDING)],
-                    projection={"datetime": True},
+    @staticmethod
+    def backfill_stock_data(
+        ticker_codes: list,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        """Bring many tickers up to date, downloading the tickers missing the same range together.
+
+        A universe that was last refreshed at the same time is planned, downloaded and split in
+        one `get_tickers_data` call per batch of symbols. yfinance still sends one Yahoo request
+        per symbol and each of them is charged to the rate limiter, so this does not reduce the
+        number of Yahoo requests.
+        """
+        last_final_day = to_day(datetime.utcnow()) - ONE_DAY
+        settled_day = last_final_day - config.COVERAGE_SETTLEMENT_DAYS * ONE_DAY
+        stores, coverages, plans = {}, {}, defaultdict(list)
+        for ticker_info in TickerInfoManager.get_many_ticker_details(ticker_codes).values():
+            ticker_code = ticker_info["ticker_code"]
+            stores[ticker_code] = get_ticker_store(ticker_code)
+            coverages[ticker_code] = TickerInfoManager.get_coverage(
+                ticker_code, stores[ticker_code]
+            )
+            for request in plan_backfill(
+                coverages[ticker_code],
+                start_date=start_date,
+                end_date=min(end_date, last_final_day),
+                max_gap_days=config.BACKFILL_COALESCE_DAYS,
+            ):
+                plans[request].append(ticker_code)
+
+        ingested = defaultdict(int)
+        for (request_start, request_end), request_tickers in plans.items():
+            logger.info(
+                f"Fetching data for {len(request_tickers)} tickers from {request_start} to"
+                f" {request_end}."
+            )
+            tickers_data = get_tickers_data(
+                request_tickers,
+                start_date=None if request_start == HISTORY_START else request_start,
+                end_date=request_end + ONE_DAY,  # Yahoo treats the end date as exclusive
+            )
+            for ticker_code in request_tickers:
+                # Tickers missing from the download are fetched again next time, unless the
+                # requested days are settled and a later bar is stored
+                df = tickers_data.get(ticker_code)
+                covered = fetched_range(
+                    (request_start, request_end),
+                    df,
+                    settled_day=settled_day,
+                    latest_day=max((end for _, end in coverages[ticker_code]), default=None),
                 )
+                if covered is None:
+                    continue
+
+                if df is not None and not df.empty:
+                    df = drop_covered_rows(
+                        df[df["datetime"] <= last_final_day], coverages[ticker_code]
+                    )
+
+                    # Ingest data into the database
+                    ingested[ticker_code] += stores[ticker_code].insert(df, strict=strict)
+                coverages[ticker_code].append(covered)
+
+        for ticker_code in {code for codes in plans.values() for code in codes}:
+            TickerInfoManager.update_coverage(ticker_code, coverages[ticker_code])
+        # Forecasts made before the backfilled rows are outdated
+        forecast_cache.invalidate([code for code, n_rows in ingested.items() if n_rows])
+        if config.INDICATORS_ON_INGEST:
+            for ticker_code, n_rows in ingested.items():
+                if n_rows:
+                    TickerDataManager._refresh_ingested_indicators(
+                        ticker_code, stores[ticker_code]
+                    )
+        return dict(ingested)
 
-                if most_recent_date:
-                    most_recent_date = most_recent_date["datetime"]
-
-                    if (end_date.date() - most_recent_date.date()).days > 0:
-                        logger.info(
-                            f"Fetching additional data for '{ticker_code}' from"
-                            f" {most_recent_date + timedelta(days=1)} to {end_date}."
-                        )
-                        additional_data = get_ticker_data(
-                            ticker_info["ticker_code"],
-                            start_date=most_recent_date + timedelta(days=1),
-                            end_date=end_date,
-                        )
-
-                        if not additional_data.empty:
-                            additional_data = clean_ticker_data(additional_data)
-                            additional_data = resample(additional_data)
-                            additional_data = basic_preprocess(additional_data)
-                            additional_data = TickerDataModel(
-                                data=additional_data.to_dict("records")
-                            )
-
-                            # Ingest data into the database
-                            ticker_data_collection.insert_many(additional_data.model_dump()["data"])
-                    else:
-                        logger.debug(
-                            f"No additional data needed for '{ticker_code}'. Most recent data is up"
-                            " to date. Fetching data from the database."
-                        )
-
-                if most_historical_date:
-                    most_historical_date = most_historical_date["datetime"]
-
-                    if start_date is None:
-                        comparator = datetime.strptime("1600-01-01", "%Y-%m-%d")
-                        diff = most_historical_date.date() - comparator.date()
-                    else:
-                        diff = most_historical_date.date() - start_date.date()
-
-                    if diff.days > 0:
-                        logger.info(
-                            f"Fetching old historical data for '{ticker_code}' from"
-                            f" {start_date} to {most_historical_date - timedelta(days=1)}."
-                        )
-                        additional_data = get_ticker_data(
-                            ticker_info["ticker_code"],
-                            start_date=start_date,
-                            end_date=most_historical_date - timedelta(days=1),
-                        )
-
-                        if not additional_data.empty:
-                            additional_data = clean_ticker_data(additional_data)
-                            additional_data = resample(additional_data)
-                            additional_data = basic_preprocess(additional_data)
-                            additional_data = TickerDataModel(
-                                data=additional_data.to_dict("records")
-                            )
-
-                            # Ingest data into the database
-                            ticker_data_collection.insert_many(additional_data.model_dump()["data"])
-                    else:
-                        logger.debug(
-                            f"No old historical data needed for '{ticker_code}'. Most recent data"
-                            " is up to date. Fetching data from the database."
-                        )
+    @staticmethod
+    def _refresh_ingested_indicators(ticker_code: str, ticker_store):
+        # Best effort, the rows and their coverage are stored already and the indicators are
+        # refreshed again when they are read
+        try:
+            refresh_indicators(ticker_code, ticker_store)
+        except Exception as e:
+            logger.exception(f"Failed to update the indicators of '{ticker_code}'. {e}")
 
-            else:
-                logger.warning(
-                    f"Most recent date not found in '{ticker_code}' data collection. Fetching"
-                    " full data."
-                )
-                # Fetch data based on the user's request
-                df = get_ticker_data(
-                    ticker_info["ticker_code"], start_date=start_date, end_date=end_date
-                )
-                df = clean_ticker_data(df)
-                df = resample(df)
-                df = basic_preprocess(df)
+    @staticmethod
+    def backfill_intraday_data(
+        ticker_code: str,
+        interval: str,
+        start_date: datetime = None,
+        end_date: datetime = None,
+    ):
+        """Download intraday bars of a ticker and roll them up into every coarser tier."""
+        ticker_info = TickerInfoManager.get_ticker_details(ticker_code)
+        logger.info(
+            f"Fetching {interval} bars for stock '{ticker_info['name']}"
+            f" ({ticker_info['ticker_code']})'"
+        )
+        df = preprocess_intraday_data(
+            get_intraday_data(ticker_info["ticker_code"], interval, start_date, end_date)
+        )
+        return ingest_intraday_data(ticker_info["ticker_code"], interval, df)
+
+    @staticmethod
+    def get_intraday_bars(
+        ticker_code: str,
+        interval: str,
+        start_date: datetime = None,
+        end_date: datetime = None,
+    ):
+        ticker_info = TickerInfoManager.get_ticker_details(ticker_code)
+        logger.info(
+            f"Reading {interval} bars of '{ticker_info['ticker_code']}' from the"
+            f" '{select_tier(interval, start_date)}' tier"
+        )
+        return get_bars(ticker_info["ticker_code"], interval, start_date, end_date)
+
+    @staticmethod
+    def get_indicators(
+        ticker_code: str,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        """Moving averages, RSI, MACD and Bollinger bands of a ticker, read from the database.
 
-                df = TickerDataModel(data=df.to_dict("records"))
+        Indicators are updated when rows are ingested, tickers stored before that are computed
+        once on their first request.
+        """
+        ticker_info, ticker_store = TickerDataManager._get_synced_store(
+            ticker_code, start_date, end_date, strict
+        )
+        refresh_indicators(ticker_info["ticker_code"], ticker_store)
+        return read_indicators(ticker_info["ticker_code"], start_date, end_date)
+
+    @staticmethod
+    def sync_stock_data(
+        ticker_info: dict,
+        ticker_store,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        strict: bool = config.OHLC_STRICT_VALIDATION,
+    ):
+        ticker_code = ticker_info["ticker_code"]
+        coverage = TickerInfoManager.get_coverage(ticker_code, ticker_store)
+
+        # Bars of the current day are not final yet, so they are only stored the day after
+        last_final_day = to_day(datetime.utcnow()) - ONE_DAY
+        requests = plan_backfill(
+            coverage,
+            start_date=start_date,
+            end_date=min(end_date, last_final_day),
+            max_gap_days=config.BACKFILL_COALESCE_DAYS,
+        )
+        if not requests:
+            logger.debug(
+                f"No additional data needed for '{ticker_code}'. Fetching data from the database."
+            )
+            return
+
+        def fetch(request):
+            request_start, request_end = request
+            logger.info(f"Fetching data for '{ticker_code}' from {request_start} to {request_end}.")
+            df = get_ticker_data(
+                ticker_code,
+                start_date=None if request_start == HISTORY_START else request_start,
+                end_date=request_end + ONE_DAY,  # Yahoo treats the end date as exclusive
+            )
+            return preprocess_ticker_data(df)
+
+        with ThreadPoolExecutor(max_workers=min(config.FETCH_MAX_WORKERS, len(requests))) as pool:
+            frames = list(pool.map(fetch, requests))
+
+        ingested = 0
+        settled_day = last_final_day - config.COVERAGE_SETTLEMENT_DAYS * ONE_DAY
+        latest_day = max((end for _, end in coverage), default=None)
+        for request, df in zip(requests, frames):
+            # Recent days after the last bar are fetched again next time, they may have failed to
+            # download
+            covered = fetched_range(request, df, settled_day=settled_day, latest_day=latest_day)
+            if covered is None:
+                logger.warning(f"No data for '{ticker_code}' from {request[0]} to {request[1]}.")
+                continue
+
+            if not df.empty:
+                # Coalesced requests may overlap with days that are already stored
+                df = drop_covered_rows(df[df["datetime"] <= last_final_day], coverage)
 
                 # Ingest data into the database
-                ticker_data_collection.insert_many(df.model_dump()["data"])
+                ingested += ticker_store.insert(df, strict=strict)
+            coverage.append(covered)
 
-                logger.info(f"Fetched data for '{ticker_code}'. Most recent data is updated.")
+        # Update ticker_info with the new coverage and the latest update time, first so that the
+        # stored rows are not downloaded again if anything below fails
+        TickerInfoManager.update_coverage(ticker_code, coverage)
 
-                # Update ticker_info with the latest update time
-                TickerInfoManager.update_ticker_details(ticker_info["ticker_code"])
+        if ingested:
+            # Forecasts made before these rows are outdated
+            forecast_cache.invalidate([ticker_code])
+            if config.INDICATORS_ON_INGEST:
+                TickerDataManager._refresh_ingested_indicators(ticker_code, ticker_store)
+        logger.info(f"Fetched data for '{ticker_code}'. Most recent data is updated.")
 
-            date_query = {"datetime": {"$lte": end_date}}
-            if start_date is not None:
-                date_query["datetime"]["$gte"] = start_date
 
-            ticker_data = ticker_data_collection.find(date_query, {"_id": 0})
+class ForecastManager:
+    @staticmethod
+    def train(
+        ticker_codes: list,
+        model_name: str,
+        start_date: datetime = None,
+        end_date: datetime = datetime.utcnow(),
+        window: int = 30,
+        hidden: int = 16,
+        epochs: int = 20,
+        batch_size: int = 256,
+        learning_rate: float = 1e-3,
+    ):
+        """Train one forecasting model on the adjusted closes of many tickers and save it."""
+        dates, tickers, prices = TickerDataManager.get_aligned_prices(
+            ticker_codes, start_date=start_date, end_date=end_date
+        )
+        model, history = train_forecaster(
+            tickers,
+            prices,
+            window=window,
+            hidden=hidden,
+            epochs=epochs,
+            batch_size=batch_size,
+            learning_rate=learning_rate,
+        )
+        model.save(get_model_path(model_name))
+        logger.info(f"Saved the forecasting model '{model_name}' to '{get_model_path(model_name)}'")
+        return history
 
-            return list(ticker_data)
+    @staticmethod
+    def _sync_last_datetimes(ticker_codes: list, max_workers: int = config.FETCH_MAX_WORKERS):
+        # Bring the tickers up to date and read the day of their last stored bar
+        def sync(ticker_code: str):
+            try:
+                _, ticker_store = TickerDataManager._get_synced_store(
+                    ticker_code, None, datetime.utcnow(), config.OHLC_STRICT_VALIDATION
+                )
+                last = ticker_store.find_one(
+                    sort=[("datetime", pymongo.DESCENDING)], projection={"datetime": True}
+                )
+            except Exception as e:
+                logger.exception(f"Error processing ticker data: '{ticker_code}'. {e}")
+                return None
+            return to_day(last["datetime"]) if last else None
 
-        except Exception as e:
-            logger.exception(f"Error processing ticker data: '{ticker_code}'. {e}")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            last_datetimes = dict(zip(ticker_codes, pool.map(sync, ticker_codes)))
+        return {code: last for code, last in last_datetimes.items() if last is not None}
+
+    @staticmethod
+    def forecast(ticker_codes: list, model_name: str, horizon: int = 5):
+        """Forecast the next `horizon` adjusted closes of many tickers in one batch.
+
+        Every ticker is brought up to date first. Forecasts already made by the same model from
+        its last stored day are read from the forecast cache, only the other tickers are forecast.
+        """
+        model = load_model(model_name)
+        ticker_codes = list(
+            dict.fromkeys(
+                t_info["ticker_code"]
+                for t_info in TickerInfoManager.get_many_ticker_details(ticker_codes).values()
+            )
+        )
+        last_datetimes = ForecastManager._sync_last_datetimes(ticker_codes)
+        cached = forecast_cache.get_many(last_datetimes, model.version, horizon)
+        missing = [ticker_code for ticker_code in ticker_codes if ticker_code not in cached]
+        logger.info(f"Forecasts of {len(cached)} tickers cached, computing {len(missing)}")
+
+        forecasts = {
+            ticker_code: pd.Series(doc["prices"], index=pd.DatetimeIndex(doc["dates"]))
+            for ticker_code, doc in cached.items()
+        }
+        if missing:
+            dates, tickers, prices = TickerDataManager.get_aligned_prices(
+                missing, end_date=datetime.utcnow()
+            )
+            computed = forecast_prices(model, dates, tickers, prices, horizon=horizon)
+            # Keyed by the days read above, which the next lookups of unchanged tickers pass
+            last_datetimes = {**last_valid_dates(dates, tickers, prices), **last_datetimes}
+            forecast_cache.set_many(computed, model.version, last_datetimes)
+            forecasts.update(computed.items())
+
+        # Tickers without enough data to forecast are left out
+        df = pd.DataFrame({code: forecasts[code] for code in ticker_codes if code in forecasts})
+        return df.rename_axis("datetime")
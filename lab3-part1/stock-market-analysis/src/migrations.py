@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime
+
+import pymongo
+from db import (
+    forecasts_collection,
+    indicators_db,
+    migrations_collection,
+    portfolios_collection,
+    ticker_db,
+    tickers_info_collection,
+    users_collection,
+)
+from pymongo.errors import DuplicateKeyError
+from settings import config, get_logger
+from storage import CollectionTickerStore
+
+logger = get_logger(__name__)
+
+
+def create_unique_keys():
+    users_collection.create_index([("username", pymongo.ASCENDING)], unique=True)
+    tickers_info_collection.create_index([("ticker_code", pymongo.ASCENDING)], unique=True)
+
+
+def create_portfolio_indexes():
+    # Portfolio names are unique per user, every lookup is scoped to a username
+    if "portfolio_name_1" in portfolios_collection.index_information():
+        portfolios_collection.drop_index("portfolio_name_1")
+    portfolios_collection.create_index(
+        [("username", pymongo.ASCENDING), ("portfolio_name", pymongo.ASCENDING)], unique=True
+    )
+    portfolios_collection.create_index(
+        [("username", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+    )
+
+
+def create_ticker_indexes(db=ticker_db):
+    # Collections created later get their index on their first insert
+    for name in db.list_collection_names():
+        if name != config.TICKER_TIMESERIES_COLLECTION and not name.startswith("system."):
+            CollectionTickerStore(name, db=db).ensure_indexes()
+
+
+def create_forecast_indexes():
+    forecasts_collection.create_index(
+        [
+            ("ticker_code", pymongo.ASCENDING),
+            ("model_hash", pymongo.ASCENDING),
+            ("horizon", pymongo.ASCENDING),
+            ("last_datetime", pymongo.ASCENDING),
+        ],
+        unique=True,
+    )
+
+
+def create_indicator_indexes():
+    indicators_db["daily"].create_index(
+        [("ticker_code", pymongo.ASCENDING), ("datetime", pymongo.ASCENDING)], unique=True
+    )
+
+
+# Applied in order, a version is never changed once released
+INDEX_MIGRATIONS = [
+    (1, "Unique usernames and ticker codes", create_unique_keys),
+    (2, "Portfolio names unique per user, username scoped lookups", create_portfolio_indexes),
+    (3, "Unique datetime of the per-ticker collections", create_ticker_indexes),
+    (4, "Forecasts keyed by ticker, model, horizon and data watermark", create_forecast_indexes),
+    (5, "Unique datetime of the daily indicators of every ticker", create_indicator_indexes),
+]
+
+
+# Whether this process applied the migrations, and whether it is applying them. Other threads wait
+# for the lock, the queries applying them re-enter it
+_applied = False
+_applying = False
+_lock = threading.RLock()
+
+
+def get_applied_versions():
+    return {doc["_id"] for doc in migrations_collection.find({}, {"_id": 1})}
+
+
+def ensure_indexes():
+    """Apply the index migrations not recorded yet, once per process. Returns the versions applied.
+
+    Called by the first query of the CLI and the refresh daemon and when the API starts, so a fresh
+    install has its unique indexes before its first write. Up to date databases only pay for one
+    query.
+    """
+    global _applied, _applying
+    if _applied:
+        return []
+    with _lock:
+        if _applied or _applying:
+            return []
+        _applying = True
+        try:
+            versions = apply_migrations()
+        finally:
+            _applying = False
+        _applied = True
+        return versions
+
+
+def apply_migrations():
+    applied = get_applied_versions()
+    versions = []
+    for version, description, migrate in INDEX_MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Applying index migration {version}: {description}")
+        migrate()
+        try:
+            migrations_collection.insert_one(
+                {"_id": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+        except DuplicateKeyError:
+            # Applied concurrently by another process, creating an index twice is a no-op
+            continue
+        versions.append(version)
+    return versions
@@ -19,6 +19,12 @@ class UserBase(BaseModel):
     created_at: datetime
 
 
+class UserCreateModel(BaseModel):
+    username: str
+    name: Name
+    password: str
+
+
 class UserDetailsModel(BaseModel):
     username: str
     name: Name
@@ -70,6 +76,10 @@ class PortfolioModel(BaseModel):
     updated_at: Optional[datetime | None] = None
 
 
+class PortfolioCreateModel(BaseModel):
+    portfolio_name: str
+
+
 class PortfolioPreviewModel(BaseModel):
     id: PyObjectId = Field(..., alias="_id")
     portfolio_name: str
@@ -79,3 +89,35 @@ class PortfolioPreviewModel(BaseModel):
 
 
 PortfolioListModel = RootModel[List[PortfolioPreviewModel]]
+
+
+class TickerFetchStatsModel(BaseModel):
+    ticker_code: str
+    seconds: float
+    rows: int = 0
+    error: Optional[str] | None = None
+
+
+class FetchReportModel(BaseModel):
+    total_seconds: float
+    max_workers: int
+    tickers: List[TickerFetchStatsModel]
+
+
+class RefreshLagModel(BaseModel):
+    # Days between the last stored bar and the last final day, over the tickers with data
+    max_days: Optional[int] | None = None
+    mean_days: Optional[float] | None = None
+    stale_tickers: int = 0
+    tickers_without_data: int = 0
+
+
+class RefreshReportModel(BaseModel):
+    started_at: datetime
+    seconds: float
+    tracked_tickers: int
+    refreshed_tickers: int
+    ingested_rows: int
+    failed_tickers: List[str]
+    lag_before: RefreshLagModel
+    lag_after: RefreshLagModel
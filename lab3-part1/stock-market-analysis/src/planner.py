@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Stands in for an open start date, i.e. the full history of a ticker
+HISTORY_START = datetime(1900, 1, 1)
+
+ONE_DAY = timedelta(days=1)
+
+DateRange = Tuple[datetime, datetime]
+
+
+def to_day(value: datetime):
+    return datetime(value.year, value.month, value.day)
+
+
+def merge_ranges(ranges: List[DateRange]):
+    # Merge overlapping and adjacent inclusive day ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(coverage: List[DateRange], start: datetime, end: datetime):
+    # Inclusive day ranges of [start, end] that are not covered yet
+    gaps, cursor = [], start
+    for covered_start, covered_end in merge_ranges(coverage):
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - ONE_DAY))
+        cursor = max(cursor, covered_end + ONE_DAY)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def coalesce_ranges(gaps: List[DateRange], max_gap_days: int):
+    # Join gaps that are close to each other into a single request. Re-downloading a few covered
+    # days is cheaper than one more rate limited request to Yahoo
+    requests = []
+    for start, end in sorted(gaps):
+        if requests and (start - requests[-1][1]).days <= max_gap_days:
+            requests[-1] = (requests[-1][0], max(requests[-1][1], end))
+        else:
+            requests.append((start, end))
+    return requests
+
+
+def drop_covered_rows(df: pd.DataFrame, coverage: List[DateRange]):
+    # Vectorized removal of rows whose `datetime` falls in an already covered range
+    coverage = merge_ranges(coverage)
+    if df.empty or not coverage:
+        return df
+
+    days = df["datetime"].to_numpy(dtype="datetime64[D]")
+    starts = np.array([start for start, _ in coverage], dtype="datetime64[D]")
+    ends = np.array([end for _, end in coverage], dtype="datetime64[D]")
+    idx = np.searchsorted(starts, days, side="right") - 1
+    covered = (idx >= 0) & (days <= ends[np.clip(idx, 0, None)])
+    return df[~covered]
+
+
+def last_bar_day(df: pd.DataFrame):
+    if df is None or df.empty:
+        return None
+    return to_day(pd.Timestamp(df["datetime"].max()).to_pydatetime())
+
+
+def fetched_range(
+    request: DateRange,
+    df: pd.DataFrame,
+    settled_day: datetime = None,
+    latest_day: datetime = None,
+):
+    """Part of a requested day range a download is known to cover, None when it covers nothing.
+
+    Yahoo answers a failed download (rate limit, network error) with an empty frame just like a
+    range without trading days. The days up to the last returned bar are covered. The days after
+    it, e.g. weekends and holidays at the end of the request, are covered too once they are
+    settled (on or before `settled_day`) and the download returned bars or a later bar is known
+    (`latest_day`). Recent days after the last bar are requested again on the next sync.
+    """
+    request_start, request_end = request
+    last_day = last_bar_day(df)
+    covered_end = request_start - ONE_DAY
+    if last_day is not None:
+        covered_end = min(request_end, last_day)
+
+    # An empty download of settled days is only trusted between two known bars
+    trusted = last_day is not None or (latest_day is not None and latest_day > request_end)
+    if settled_day is not None and trusted:
+        covered_end = max(covered_end, min(request_end, settled_day))
+
+    if covered_end < request_start:
+        return None
+    return request_start, covered_end
+
+
+def plan_backfill(
+    coverage: List[DateRange],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    max_gap_days: int = 0,
+):
+    """Minimal list of inclusive day ranges to download to cover [start_date, end_date]."""
+    start = to_day(start_date) if start_date is not None else HISTORY_START
+    end = to_day(end_date or datetime.utcnow())
+    return coalesce_ranges(missing_ranges(coverage, start, end), max_gap_days)
@@ -0,0 +1,175 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+from cache import ohlc_cache
+from db import portfolios_collection, refresh_runs_collection
+from manager import TickerDataManager, TickerInfoManager
+from migrations import ensure_indexes
+from models import RefreshLagModel, RefreshReportModel
+from planner import ONE_DAY, to_day
+from rich.pretty import pretty_repr
+from settings import config, get_logger
+from storage import get_ticker_store
+from yf import rate_limiter
+
+logger = get_logger(__name__)
+
+
+def get_tracked_tickers(portfolios_collection=portfolios_collection):
+    # Distinct tickers of every portfolio in a single aggregation
+    cursor = portfolios_collection.aggregate(
+        [
+            {"$unwind": "$tickers"},
+            {"$group": {"_id": "$tickers.ticker_code"}},
+            {"$sort": {"_id": 1}},
+        ]
+    )
+    return [row["_id"] for row in cursor]
+
+
+def get_refresh_lags(ticker_codes: list):
+    """Weekdays every ticker lags behind the last final day, None for tickers without any data.
+
+    Weekends are not counted, their days are only covered once a later bar is downloaded. Codes
+    that cannot be resolved are left out.
+    """
+    last_final_day = to_day(datetime.utcnow()) - ONE_DAY
+    lags = {}
+    for ticker_code, t_info in TickerInfoManager.get_many_ticker_details(ticker_codes).items():
+        ticker_store = get_ticker_store(t_info["ticker_code"])
+        coverage = TickerInfoManager.get_coverage(t_info["ticker_code"], ticker_store)
+        if not coverage:
+            lags[ticker_code] = None
+            continue
+        first_missing_day = max(end for _, end in coverage) + ONE_DAY
+        lags[ticker_code] = max(
+            0, int(np.busday_count(first_missing_day.date(), (last_final_day + ONE_DAY).date()))
+        )
+    return lags
+
+
+def summarize_lags(lags: dict):
+    known = [lag for lag in lags.values() if lag is not None]
+    return RefreshLagModel(
+        max_days=max(known) if known else None,
+        mean_days=round(sum(known) / len(known), 2) if known else None,
+        stale_tickers=sum(lag > 0 for lag in known),
+        tickers_without_data=len(lags) - len(known),
+    )
+
+
+def refresh_tickers(ticker_codes: list, max_workers: int = config.REFRESH_MAX_WORKERS):
+    """Refresh tickers in the given order with batched downloads.
+
+    Batches are submitted in order, so the first tickers are refreshed first. Workers beyond the
+    request budget of the shared rate limiter would only wait on it, so they are capped to it.
+    """
+    batches = [
+        ticker_codes[i : i + config.YF_BATCH_SIZE]
+        for i in range(0, len(ticker_codes), config.YF_BATCH_SIZE)
+    ]
+
+    def refresh_batch(batch: list):
+        # The backfill leaves out the codes it cannot resolve, they are reported as failed
+        details = TickerInfoManager.get_many_ticker_details(batch)
+        ingested = TickerDataManager.backfill_stock_data(
+            list(details), end_date=datetime.utcnow()
+        )
+        # Also rebuild the local OHLC cache so interactive reads do not have to
+        for t_info in details.values():
+            ohlc_cache.sync(t_info["ticker_code"], get_ticker_store(t_info["ticker_code"]))
+        return ingested, [ticker_code for ticker_code in batch if ticker_code not in details]
+
+    ingested, failed = {}, []
+    workers = max(1, min(max_workers, rate_limiter.capacity, len(batches) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(refresh_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                batch_ingested, unresolved = future.result()
+                ingested.update(batch_ingested)
+                failed.extend(unresolved)
+            except Exception as e:
+                logger.exception(f"Failed to refresh {len(futures[future])} tickers. {e}")
+                failed.extend(futures[future])
+    return ingested, failed
+
+
+def run_refresh_cycle(max_workers: int = config.REFRESH_MAX_WORKERS):
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+
+    tracked = get_tracked_tickers()
+    lags = get_refresh_lags(tracked)
+    unresolved = [ticker_code for ticker_code in tracked if ticker_code not in lags]
+    # Tickers without any data first, then the stalest ones
+    stale = sorted(
+        (ticker_code for ticker_code, lag in lags.items() if lag is None or lag > 0),
+        key=lambda ticker_code: (lags[ticker_code] is not None, -(lags[ticker_code] or 0)),
+    )
+    logger.info(f"Refreshing {len(stale)} of {len(tracked)} tracked tickers")
+    ingested, failed = refresh_tickers(stale, max_workers=max_workers)
+
+    report = RefreshReportModel(
+        started_at=started_at,
+        seconds=time.perf_counter() - start,
+        tracked_tickers=len(tracked),
+        refreshed_tickers=len(stale) - len(failed),
+        ingested_rows=sum(ingested.values()),
+        failed_tickers=sorted({*failed, *unresolved}),
+        lag_before=summarize_lags(lags),
+        lag_after=summarize_lags(get_refresh_lags(tracked)),
+    )
+    refresh_runs_collection.insert_one(report.model_dump())
+    logger.info(f"Refresh report:\n{pretty_repr(report.model_dump())}")
+    return report
+
+
+def run_daemon(
+    interval: float = config.REFRESH_INTERVAL,
+    max_workers: int = config.REFRESH_MAX_WORKERS,
+    once: bool = False,
+):
+    while True:
+        cycle_start = time.monotonic()
+        try:
+            run_refresh_cycle(max_workers=max_workers)
+        except Exception as e:
+            logger.exception(f"Refresh cycle failed. {e}")
+        if once:
+            return
+        time.sleep(max(0.0, interval - (time.monotonic() - cycle_start)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Background refresh of every ticker referenced by a portfolio"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=config.REFRESH_INTERVAL,
+        help="Seconds between the start of two refresh cycles",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=config.REFRESH_MAX_WORKERS,
+        help="Batches refreshed concurrently, capped to the Yahoo Finance rate limit",
+    )
+    parser.add_argument("--once", action="store_true", help="Run a single refresh cycle and exit")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    logger.info(f"Started the refresh daemon at {datetime.utcnow()}")
+    try:
+        run_daemon(interval=args.interval, max_workers=args.max_workers, once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Stopped the refresh daemon")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests_cache import SQLiteCache
+from settings import get_logger
+from urllib3 import HTTPResponse
+
+logger = get_logger(__name__)
+
+# Query parameters that change between sessions and must not be part of a fixture key
+VOLATILE_PARAMS = {"crumb"}
+
+
+def fixture_key(path: str, query: str):
+    params = sorted((k, v) for k, v in parse_qsl(query) if k not in VOLATILE_PARAMS)
+    return hashlib.sha1(f"{path}?{urlencode(params)}".encode()).hexdigest()
+
+
+def find_fixture(fixtures, url):
+    # Fixtures saved without a query answer every query of their path, e.g. synthetic responses
+    # for requests whose dates are only known when they are sent
+    fixture = fixtures.get(fixture_key(url.path, url.query))
+    return fixture if fixture is not None else fixtures.get(fixture_key(url.path, ""))
+
+
+class ResponseRecorder:
+    """Session response hook saving every Yahoo Finance response as a replayable fixture."""
+
+    def __init__(self, fixtures_dir: str):
+        self.fixtures_dir = fixtures_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def __call__(self, response, *args, **kwargs):
+        url = urlsplit(response.url)
+        key = fixture_key(url.path, url.query)
+        with open(os.path.join(self.fixtures_dir, f"{key}.body"), "wb") as f:
+            f.write(response.content)
+        with open(os.path.join(self.fixtures_dir, f"{key}.json"), "w") as f:
+            json.dump(
+                {
+                    "url": response.url,
+                    "status": response.status_code,
+                    "content_type": response.headers.get("Content-Type", "application/json"),
+                },
+                f,
+            )
+        return response
+
+
+def make_response(request, meta: dict, body: bytes):
+    response = Response()
+    response.url, response.request, response.status_code = request.url, request, meta["status"]
+    response.headers = CaseInsensitiveDict(
+        {"Content-Type": meta["content_type"], "Content-Length": str(len(body))}
+    )
+    # Sessions caching their responses read them from the underlying urllib3 response
+    response.raw = HTTPResponse(
+        headers=response.headers, status=meta["status"], request_url=request.url
+    )
+    response._content = body
+    return response
+
+
+class DirectoryFixtures:
+    """Fixtures saved by `ResponseRecorder`, one `.json` and one `.body` file per response."""
+
+    def __init__(self, fixtures_dir: str):
+        self.fixtures_dir = fixtures_dir
+
+    def get(self, key: str):
+        try:
+            with open(os.path.join(self.fixtures_dir, f"{key}.json")) as f:
+                meta = json.load(f)
+            with open(os.path.join(self.fixtures_dir, f"{key}.body"), "rb") as f:
+                return meta, f.read()
+        except FileNotFoundError:
+            return None
+
+
+class CacheFixtures:
+    """Fixtures read from a `requests_cache` SQLite file, the format `yf.session` caches in.
+
+    Any cache filled while running commands against Yahoo Finance can be replayed, expired
+    responses included. Responses are indexed once and kept in memory.
+    """
+
+    def __init__(self, cache_file: str):
+        self.cache = SQLiteCache(cache_file)
+        self.fixtures = {}
+        for response in self.cache.responses.values():
+            self._index(response.url, response.status_code, response.headers, response.content)
+
+    def _index(self, url: str, status: int, headers, body: bytes):
+        url = urlsplit(url)
+        meta = {
+            "url": urlunsplit(url),
+            "status": status,
+            "content_type": headers.get("Content-Type", "application/json"),
+        }
+        self.fixtures[fixture_key(url.path, url.query)] = (meta, body)
+
+    def add(self, url: str, body: bytes, status: int = 200, content_type="application/json"):
+        # Saved as a regular cached response, e.g. to build fixtures without a network
+        request = PreparedRequest()
+        request.prepare(method="GET", url=url)
+        response = make_response(request, {"status": status, "content_type": content_type}, body)
+        self.cache.save_response(response)
+        self._index(url, status, response.headers, body)
+
+    def get(self, key: str):
+        return self.fixtures.get(key)
+
+
+def open_fixtures(path: str):
+    # A directory of recorded fixtures or a requests_cache SQLite file
+    return DirectoryFixtures(path) if os.path.isdir(path) else CacheFixtures(path)
+
+
+def is_yahoo_url(url):
+    return bool(url.hostname) and url.hostname.endswith("yahoo.com")
+
+
+class FixtureAdapter(HTTPAdapter):
+    """Transport adapter answering Yahoo Finance requests from fixtures in process.
+
+    Unrecorded requests get a 404, the network is never reached for Yahoo Finance.
+    """
+
+    def __init__(self, fixtures, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        if not is_yahoo_url(url):
+            return super().send(request, **kwargs)
+
+        fixture = find_fixture(self.fixtures, url)
+        meta, body = fixture or ({"status": 404, "content_type": "text/plain"}, b"")
+        response = make_response(request, meta, body)
+        response.reason = "OK" if fixture else "Not Found"
+        response.connection = self
+        return response
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport adapter sending Yahoo Finance requests to a local stand-in server instead."""
+
+    def __init__(self, base_url: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.base_url = urlsplit(base_url)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        if is_yahoo_url(url):
+            request.url = urlunsplit(
+                (self.base_url.scheme, self.base_url.netloc, url.path, url.query, "")
+            )
+        return super().send(request, **kwargs)
+
+
+def use_replay(session, target: str):
+    # A replay server URL, or a fixtures directory or cache file replayed in process
+    if urlsplit(target).scheme in ("http", "https"):
+        session.mount("https://", ReplayAdapter(target))
+    else:
+        session.mount("https://", FixtureAdapter(open_fixtures(target)))
+    logger.warning(f"Yahoo Finance requests are replayed from '{target}'")
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    fixtures = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        fixture = find_fixture(self.fixtures, url)
+        if fixture is None:
+            self.send_error(404, f"No recorded response for '{self.path}'")
+            return
+        meta, body = fixture
+
+        self.send_response(meta["status"])
+        self.send_header("Content-Type", meta["content_type"])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class ReplayServer:
+    """Local HTTP stand-in for Yahoo Finance serving recorded fixtures.
+
+    Fixtures are a directory of recorded fixtures or a cache file. Usable as a context manager,
+    `url` is the value to use for `YF_REPLAY_URL`.
+    """
+
+    def __init__(self, fixtures: str, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (ReplayRequestHandler,), {"fixtures": open_fixtures(fixtures)})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Yahoo Finance stand-in replaying fixtures")
+    fixtures = parser.add_mutually_exclusive_group(required=True)
+    fixtures.add_argument("--fixtures_dir", type=str, help="Recorded fixtures")
+    fixtures.add_argument("--cache_file", type=str, help="Yahoo Finance requests cache to replay")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    args = parser.parse_args()
+
+    fixtures = args.fixtures_dir or args.cache_file
+    server = ReplayServer(fixtures, args.host, args.port)
+    logger.info(f"Replaying fixtures from '{fixtures}' at {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
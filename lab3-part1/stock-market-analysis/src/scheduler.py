@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Iterable
+
+from models import FetchReportModel, TickerFetchStatsModel
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+
+def dedupe_tickers(ticker_codes: Iterable[str]):
+    # Keep the first occurrence of every ticker, preserving the portfolio order
+    return list(dict.fromkeys(code.strip().upper() for code in ticker_codes))
+
+
+def fetch_stocks_data(
+    ticker_codes: Iterable[str],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    max_workers: int = config.FETCH_MAX_WORKERS,
+    fetch_fn: Callable = None,
+):
+    """Fetch data for many tickers over a bounded thread pool.
+
+    Yahoo requests made by the workers share the global token bucket of the `yf` session, so the
+    rate limit holds across threads. `fetch_fn` defaults to `TickerDataManager.get_stock_data` and
+    can be replaced with a fake backend taking `(ticker_code, start_date, end_date)`.
+    """
+    if fetch_fn is None:
+        # Imported here so a fake backend does not load the application modules
+        from manager import TickerDataManager
+
+        fetch_fn = TickerDataManager.get_stock_data
+
+    end_date = end_date or datetime.utcnow()
+    ticker_codes = dedupe_tickers(ticker_codes)
+
+    def timed_fetch(ticker_code: str):
+        start = time.perf_counter()
+        try:
+            data = fetch_fn(ticker_code, start_date=start_date, end_date=end_date)
+            error = None if data is not None else "No data returned"
+        except Exception as e:
+            data, error = None, str(e)
+        stats = TickerFetchStatsModel(
+            ticker_code=ticker_code,
+            seconds=time.perf_counter() - start,
+            rows=len(data) if data is not None else 0,
+            error=error,
+        )
+        return ticker_code, data, stats
+
+    results, stats = {}, {}
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ticker_codes) or 1))) as pool:
+        futures = [pool.submit(timed_fetch, ticker_code) for ticker_code in ticker_codes]
+        for future in as_completed(futures):
+            ticker_code, data, ticker_stats = future.result()
+            results[ticker_code] = data
+            stats[ticker_code] = ticker_stats
+            if ticker_stats.error:
+                logger.error(f"Failed to fetch data for '{ticker_code}': {ticker_stats.error}")
+
+    report = FetchReportModel(
+        total_seconds=time.perf_counter() - wall_start,
+        max_workers=max_workers,
+        tickers=[stats[ticker_code] for ticker_code in ticker_codes],
+    )
+    return {ticker_code: results[ticker_code] for ticker_code in ticker_codes}, report
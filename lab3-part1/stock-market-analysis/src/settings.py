@@ -23,6 +23,45 @@ class Settings(BaseSettings):
     YFINANCE_CACHE_FILE: str = Field(
         default=os.path.relpath(os.path.join(Path.root_dir, "yfinance.cache"))
     )
+    SESSION_FILE: str = Field(default=os.path.relpath(os.path.join(Path.root_dir, ".sessions")))
+    SESSION_SECRET: str | None = Field(default=None)
+    SESSION_SECRET_FILE: str = Field(
+        default=os.path.relpath(os.path.join(Path.root_dir, ".session_secret"))
+    )
+    SESSION_TTL: float = Field(default=900.0)
+    OHLC_CACHE_DIR: str = Field(
+        default=os.path.relpath(os.path.join(Path.root_dir, "ohlc_cache"))
+    )
+    ANALYTICS_CACHE_DIR: str = Field(
+        default=os.path.relpath(os.path.join(Path.root_dir, "analytics_cache"))
+    )
+    ANALYTICS_CACHE_SIZE: int = Field(default=32)
+    FORECAST_MODEL_DIR: str = Field(
+        default=os.path.relpath(os.path.join(Path.root_dir, "models"))
+    )
+    YF_BATCH_SIZE: int = Field(default=100)
+    YF_REPLAY_URL: str | None = Field(default=None)
+    YF_RECORD_DIR: str | None = Field(default=None)
+    YF_RATE_LIMIT_REQUESTS: int = Field(default=2)
+    YF_RATE_LIMIT_PERIOD: float = Field(default=5.0)
+    FETCH_MAX_WORKERS: int = Field(default=4)
+    TICKER_INFO_CACHE_SIZE: int = Field(default=4096)
+    TICKER_INFO_CACHE_TTL: float = Field(default=300.0)
+    TICKER_INFO_NEGATIVE_CACHE_TTL: float = Field(default=3600.0)
+    BACKFILL_COALESCE_DAYS: int = Field(default=30)
+    COVERAGE_SETTLEMENT_DAYS: int = Field(default=5)
+    REFRESH_INTERVAL: float = Field(default=3600.0)
+    REFRESH_MAX_WORKERS: int = Field(default=2)
+    API_HOST: str = Field(default="127.0.0.1")
+    API_PORT: int = Field(default=8000)
+    API_MONGO_POOL_SIZE: int = Field(default=100)
+    TICKER_STORAGE_BACKEND: str = Field(default="collections")
+    TICKER_TIMESERIES_COLLECTION: str = Field(default="ohlc")
+    OHLC_CALENDAR: str = Field(default="trading")
+    OHLC_INGEST_BATCH_SIZE: int = Field(default=10_000)
+    OHLC_STRICT_VALIDATION: bool = Field(default=False)
+    OHLC_STREAM_BATCH_SIZE: int = Field(default=10_000)
+    INDICATORS_ON_INGEST: bool = Field(default=True)
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
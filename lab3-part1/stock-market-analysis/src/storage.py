@@ -0,0 +1,239 @@
+from datetime import datetime
+from typing import List
+
+import pandas as pd
+import pymongo
+from db import ticker_db
+from ingest import insert_ohlc_data
+from pymongo.errors import CollectionInvalid
+from settings import config, get_logger
+
+logger = get_logger(__name__)
+
+# (database, collection) pairs already known to exist in this process
+_timeseries_collections = set()
+
+# (database, collection) pairs whose indexes were already ensured in this process
+_indexed_collections = set()
+
+
+class CollectionTickerStore:
+    """One plain collection per ticker with a unique `datetime` index."""
+
+    def __init__(self, ticker_code: str, db=ticker_db):
+        self.ticker_code = ticker_code
+        self.collection = db[ticker_code]
+
+    def ensure_indexes(self):
+        key = (self.collection.database.name, self.collection.name)
+        if key not in _indexed_collections:
+            self.collection.create_index([("datetime", pymongo.ASCENDING)], unique=True)
+            _indexed_collections.add(key)
+
+    def count(self, query: dict = None):
+        return self.collection.count_documents(query or {})
+
+    def find_one(self, sort=None, projection=None):
+        return self.collection.find_one({}, sort=sort, projection=projection)
+
+    def insert(self, df: pd.DataFrame, strict: bool = config.OHLC_STRICT_VALIDATION):
+        # Only writes need the unique index, reads do not pay for it
+        self.ensure_indexes()
+        return insert_ohlc_data(self.collection, df, strict=strict)
+
+    def find_args(self, query: dict, projection: dict = None):
+        return query, projection
+
+    def find(self, query: dict, projection: dict = None):
+        # Backfilled ranges are not inserted in date order
+        return self.collection.find(*self.find_args(query, projection)).sort(
+            "datetime", pymongo.ASCENDING
+        )
+
+
+class TimeSeriesTickerStore:
+    """All tickers in a single time-series collection keyed by `ticker_code`."""
+
+    def __init__(self, ticker_code: str, db=ticker_db):
+        self.ticker_code = ticker_code
+        self.collection = get_timeseries_collection(db)
+
+    def ensure_indexes(self):
+        # Created along with the collection. Time-series collections cannot have unique indexes,
+        # `insert` leaves out the rows already stored instead
+        pass
+
+    def count(self, query: dict = None):
+        return self.collection.count_documents({"ticker_code": self.ticker_code, **(query or {})})
+
+    def find_one(self, sort=None, projection=None):
+        return self.collection.find_one(
+            {"ticker_code": self.ticker_code}, sort=sort, projection=projection
+        )
+
+    def drop_stored_rows(self, df: pd.DataFrame):
+        if df.empty:
+            return df
+
+        datetimes = pd.to_datetime(df["datetime"], errors="coerce")
+        if datetimes.dt.tz is not None:
+            datetimes = datetimes.dt.tz_convert(None)
+        if datetimes.isna().all():
+            # Left to the validation to reject
+            return df
+
+        stored = self.collection.find(
+            {
+                "ticker_code": self.ticker_code,
+                "datetime": {
+                    "$gte": datetimes.min().to_pydatetime(),
+                    "$lte": datetimes.max().to_pydatetime(),
+                },
+            },
+            {"_id": 0, "datetime": 1},
+        )
+        is_stored = datetimes.isin(pd.to_datetime([row["datetime"] for row in stored]))
+        if is_stored.any():
+            logger.warning(
+                f"{int(is_stored.sum())} rows of '{self.ticker_code}' are already stored. Skipping."
+            )
+        return df[~is_stored.to_numpy()]
+
+    def insert(self, df: pd.DataFrame, strict: bool = config.OHLC_STRICT_VALIDATION):
+        return insert_ohlc_data(
+            self.collection,
+            self.drop_stored_rows(df),
+            strict=strict,
+            metadata={"ticker_code": self.ticker_code},
+        )
+
+    def find_args(self, query: dict, projection: dict = None):
+        projection = {"_id": 0, **(projection or {})}
+        if not any(value for key, value in projection.items() if key != "_id"):
+            # Exclusion projections cannot be mixed with included fields
+            projection["ticker_code"] = 0
+        return {"ticker_code": self.ticker_code, **query}, projection
+
+    def find(self, query: dict, projection: dict = None):
+        return self.collection.find(*self.find_args(query, projection)).sort(
+            "datetime", pymongo.ASCENDING
+        )
+
+
+def get_timeseries_collection(db=ticker_db, name: str = config.TICKER_TIMESERIES_COLLECTION):
+    if (db.name, name) in _timeseries_collections:
+        return db[name]
+
+    if name not in db.list_collection_names(filter={"name": name}):
+        try:
+            db.create_collection(
+                name,
+                timeseries={
+                    "timeField": "datetime",
+                    "metaField": "ticker_code",
+                    "granularity": "hours",
+                },
+            )
+            db[name].create_index(
+                [("ticker_code", pymongo.ASCENDING), ("datetime", pymongo.ASCENDING)]
+            )
+            logger.info(f"Created time-series collection '{name}'")
+        except CollectionInvalid:
+            # Created concurrently by another process
+            pass
+    _timeseries_collections.add((db.name, name))
+    return db[name]
+
+
+def get_ticker_store(ticker_code: str, backend: str = config.TICKER_STORAGE_BACKEND, db=ticker_db):
+    if backend == "timeseries":
+        return TimeSeriesTickerStore(ticker_code, db=db)
+    elif backend == "collections":
+        return CollectionTickerStore(ticker_code, db=db)
+    else:
+        raise ValueError(f"Invalid ticker storage backend '{backend}'")
+
+
+def get_range_data(
+    ticker_codes: List[str],
+    start_date: datetime = None,
+    end_date: datetime = None,
+    backend: str = config.TICKER_STORAGE_BACKEND,
+    db=ticker_db,
+):
+    date_query = {"datetime": {"$lte": end_date or datetime.utcnow()}}
+    if start_date is not None:
+        date_query["datetime"]["$gte"] = start_date
+
+    if backend != "timeseries":
+        # One collection scan per ticker
+        return {
+            ticker_code: list(
+                get_ticker_store(ticker_code, backend, db).find(date_query, {"_id": 0})
+            )
+            for ticker_code in ticker_codes
+        }
+
+    # One aggregation over the shared time-series collection for the whole portfolio
+    data = {ticker_code: [] for ticker_code in ticker_codes}
+    cursor = get_timeseries_collection(db).aggregate(
+        [
+            {"$match": {"ticker_code": {"$in": list(ticker_codes)}, **date_query}},
+            {"$sort": {"ticker_code": 1, "datetime": 1}},
+            {"$project": {"_id": 0}},
+        ]
+    )
+    for row in cursor:
+        data[row.pop("ticker_code")].append(row)
+    return data
+
+
+def migrate_to_timeseries(
+    drop: bool = False, batch_size: int = config.OHLC_INGEST_BATCH_SIZE, db=ticker_db
+):
+    timeseries_collection = get_timeseries_collection(db)
+    ticker_codes = [
+        name
+        for name in db.list_collection_names()
+        if name != timeseries_collection.name and not name.startswith("system.")
+    ]
+
+    migrated = {}
+    for ticker_code in ticker_codes:
+        # The whole history is copied every time. Rows already in the time-series collection, from
+        # an interrupted migration or synced there after switching the backend, are left out
+        store = TimeSeriesTickerStore(ticker_code, db=db)
+        n_rows, n_stored, batch = 0, 0, []
+
+        def flush(rows):
+            new_rows = [rows[i] for i in store.drop_stored_rows(pd.DataFrame(rows)).index]
+            if new_rows:
+                timeseries_collection.insert_many(new_rows)
+            return len(new_rows), len(rows) - len(new_rows)
+
+        cursor = db[ticker_code].find({}, {"_id": 0}).sort("datetime", pymongo.ASCENDING)
+        for row in cursor.batch_size(batch_size):
+            row["ticker_code"] = ticker_code
+            batch.append(row)
+            if len(batch) == batch_size:
+                copied, stored = flush(batch)
+                n_rows, n_stored, batch = n_rows + copied, n_stored + stored, []
+        if batch:
+            copied, stored = flush(batch)
+            n_rows, n_stored = n_rows + copied, n_stored + stored
+
+        migrated[ticker_code] = n_rows
+        logger.info(
+            f"Migrated {n_rows} rows of '{ticker_code}' to the time-series collection, "
+            f"{n_stored} were already there"
+        )
+        if drop:
+            n_source = db[ticker_code].count_documents({})
+            if n_rows + n_stored == n_source and store.count() >= n_source:
+                db.drop_collection(ticker_code)
+            else:
+                logger.warning(
+                    f"Kept the collection of '{ticker_code}', {n_source} rows were not all copied"
+                )
+
+    return migrated
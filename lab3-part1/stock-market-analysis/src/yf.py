@@ -1,21 +1,66 @@
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 from models import TickerSummaryModel
 from pandas_datareader import data as pdr
-from pyrate_limiter import Duration, Limiter, RequestRate
+from replay import ResponseRecorder, use_replay
 from requests import Session
 from requests_cache import CacheMixin, SQLiteCache
-from requests_ratelimiter import LimiterMixin, MemoryQueueBucket
 from settings import config, get_logger
 
 yf.pdr_override()
 
 logger = get_logger(__name__)
 
+# History Yahoo Finance serves for intraday intervals
+INTRADAY_HISTORY = {
+    "1m": timedelta(days=7),
+    "5m": timedelta(days=60),
+    "1h": timedelta(days=730),
+}
 
-class CachedLimiterSession(CacheMixin, LimiterMixin, Session):
+
+class TokenBucket:
+    def __init__(self, rate: int, period: float):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.refill_rate = rate / period
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def acquire(self, tokens: int = 1):
+        # Reserve the tokens under the lock and sleep outside of it, so concurrent callers queue up
+        # on one shared budget without holding each other up while waiting
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            wait = max(0.0, -self.tokens / self.refill_rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class TokenBucketMixin:
+    def __init__(self, bucket: TokenBucket, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bucket = bucket
+
+    def send(self, request, **kwargs):
+        # Placed after CacheMixin so only requests that reach the network consume tokens
+        self.bucket.acquire()
+        return super().send(request, **kwargs)
+
+
+class CachedLimiterSession(CacheMixin, TokenBucketMixin, Session):
     def __init__(self, timeout=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.timeout = timeout
@@ -26,13 +71,20 @@ class CachedLimiterSession(CacheMixin, LimiterMixin, Session):
         return super().request(*args, **kwargs)
 
 
+# Global token bucket shared by every thread using the session
+rate_limiter = TokenBucket(rate=config.YF_RATE_LIMIT_REQUESTS, period=config.YF_RATE_LIMIT_PERIOD)
+
 session = CachedLimiterSession(
-    limiter=Limiter(RequestRate(2, Duration.SECOND * 5)),  # max 2 requests per 5 seconds
-    bucket_class=MemoryQueueBucket,
+    bucket=rate_limiter,  # max 2 requests per 5 seconds by default
     backend=SQLiteCache(config.YFINANCE_CACHE_FILE),
     timeout=15,
 )
 
+if config.YF_REPLAY_URL:
+    use_replay(session, config.YF_REPLAY_URL)
+if config.YF_RECORD_DIR:
+    session.hooks["response"].append(ResponseRecorder(config.YF_RECORD_DIR))
+
 
 def get_ticker_info(ticker_code: str):
     # Create a Ticker object using yfinance with the provided ticker code and session
@@ -60,23 +112,181 @@ def get_ticker_data(ticker_code: str, start_date=None, end_date=datetime.today()
     return data
 
 
-def clean_ticker_data(df):
-    df = df.reset_index()
-    df.columns = [col.lower().replace(" ", "_") for col in df.columns]
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.sort_values(by="date", ascending=True)
-    df.rename(columns={"date": "datetime"}, inplace=True)
-    return df
+def get_intraday_data(ticker_code: str, interval: str, start_date=None, end_date=None):
+    kwargs = {"interval": interval, "session": session}
+    if start_date is None and interval in INTRADAY_HISTORY:
+        # Yahoo rejects the full history of intraday intervals
+        start_date = (end_date or datetime.utcnow()) - INTRADAY_HISTORY[interval]
+    if start_date is not None:
+        kwargs["start"] = start_date
+    if end_date is not None:
+        kwargs["end"] = end_date
+    return pdr.get_data_yahoo(ticker_code, **kwargs)
+
+
+def get_tickers_data(
+    ticker_codes: list,
+    start_date=None,
+    end_date=None,
+    batch_size: int = config.YF_BATCH_SIZE,
+    calendar: str = config.OHLC_CALENDAR,
+):
+    """Download many tickers with one yfinance call per batch.
+
+    yfinance still sends one Yahoo request per symbol, Yahoo has no multi-symbol OHLC endpoint.
+    Returns a dict of ticker -> frame preprocessed like `preprocess_ticker_data`. Tickers Yahoo
+    returned nothing for are left out.
+    """
+    end_date = end_date or datetime.today()
+    tickers_data = {}
+    for i in range(0, len(ticker_codes), batch_size):
+        batch = list(ticker_codes[i : i + batch_size])
+        if start_date is not None:
+            df = pdr.get_data_yahoo(batch, start=start_date, end=end_date, session=session)
+        else:
+            df = pdr.get_data_yahoo(batch, end=end_date, session=session)
+
+        if df is None or df.empty:
+            continue
+        if not isinstance(df.columns, pd.MultiIndex):
+            # Single symbol downloads come back without the ticker level
+            df.columns = pd.MultiIndex.from_product([df.columns, batch])
+
+        for ticker_code, ticker_data in preprocess_ticker_panel(df, calendar).items():
+            if not ticker_data.empty:
+                tickers_data[ticker_code] = ticker_data
+    return tickers_data
+
+
+def _column_name(name: str):
+    return name.lower().replace(" ", "_")
+
+
+def _empty_ohlc_frame(columns):
+    return pd.DataFrame(columns=["datetime", *columns])
+
+
+def _sorted_unique_days(index: pd.Index):
+    # Valid, sorted and de-duplicated dates along with the rows they come from
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.DatetimeIndex(pd.to_datetime(index, errors="coerce"))
+    if index.tz is not None:
+        index = index.tz_convert(None)
+    days = index.to_numpy(dtype="datetime64[D]")
+    rows = np.flatnonzero(~np.isnat(days))
+    days, first = np.unique(days[rows], return_index=True)
+    return days, rows[first]
+
+
+def _to_calendar(days: np.ndarray, values: np.ndarray, calendar: str):
+    if calendar == "trading":
+        return days, values
+    elif calendar == "calendar":
+        # Add a NaN row for every day without a bar, to be interpolated
+        full_days = np.arange(days[0], days[-1] + 1, dtype="datetime64[D]")
+        full_values = np.full((len(full_days), values.shape[1]), np.nan)
+        full_values[(days - days[0]).astype("int64")] = values
+        return full_days, full_values
+    else:
+        raise ValueError(f"Invalid calendar mode '{calendar}'. Use 'trading' or 'calendar'.")
+
+
+def interpolate_in_place(days: np.ndarray, values: np.ndarray):
+    """Time weighted linear interpolation of the NaNs of every column of a 2-D array at once.
+
+    Leading and trailing NaNs take the nearest valid value. Columns without any valid value are
+    left untouched.
+    """
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+
+    n_rows = len(days)
+    positions = np.arange(n_rows, dtype="int32")[:, None]
+    prev_valid = np.where(missing, np.int32(-1), positions)
+    np.maximum.accumulate(prev_valid, axis=0, out=prev_valid)
+    next_valid = np.where(missing, np.int32(n_rows), positions)[::-1]
+    np.minimum.accumulate(next_valid, axis=0, out=next_valid)
+    next_valid = next_valid[::-1]
+    np.copyto(prev_valid, next_valid, where=prev_valid < 0)
+    np.copyto(next_valid, prev_valid, where=next_valid >= n_rows)
+
+    rows, cols = np.nonzero(missing & (prev_valid < n_rows))
+    prev_rows, next_rows = prev_valid[rows, cols], next_valid[rows, cols]
+    t = days.astype("int64").astype("float64")
+    span = t[next_rows] - t[prev_rows]
+    weight = np.divide(t[rows] - t[prev_rows], span, out=np.zeros_like(span), where=span > 0)
+    values[rows, cols] = values[prev_rows, cols] + weight * (
+        values[next_rows, cols] - values[prev_rows, cols]
+    )
+    return values
+
+
+def preprocess_ticker_data(df: pd.DataFrame, calendar: str = config.OHLC_CALENDAR):
+    """Clean, align to the calendar and interpolate the data of one ticker in a single pass.
+
+    Replaces the `clean_ticker_data` -> `resample` -> `basic_preprocess` chain. In the `trading`
+    calendar only the days with a bar are kept, the `calendar` mode adds every day in between.
+    """
+    columns = [_column_name(col) for col in df.columns]
+    if df.empty:
+        return _empty_ohlc_frame(columns)
+
+    days, rows = _sorted_unique_days(df.index)
+    if len(days) == 0:
+        return _empty_ohlc_frame(columns)
+    if len(rows) == len(df) and (np.diff(rows) > 0).all():
+        values = df.to_numpy(dtype="float64", copy=True)
+    else:
+        # Fancy indexing sorts, de-duplicates and copies in one go
+        values = df.to_numpy(dtype="float64")[rows]
+
+    days, values = _to_calendar(days, values, calendar)
+    interpolate_in_place(days, values)
+
+    result = pd.DataFrame(values, columns=columns, copy=False)
+    result.insert(0, "datetime", days.astype("datetime64[ns]"))
+    return result
+
+
+def preprocess_ticker_panel(df: pd.DataFrame, calendar: str = config.OHLC_CALENDAR):
+    """Batch version of `preprocess_ticker_data` for a multi-ticker frame.
 
+    `df` has (field, ticker) MultiIndex columns, as returned by a multi-symbol yfinance download.
+    All tickers are aligned and interpolated together as one 2-D array and split afterwards, each
+    ticker trimmed to the days between its first and last bar. Returns a dict of ticker -> frame.
+    """
+    fields = list(dict.fromkeys(df.columns.get_level_values(0)))
+    tickers = list(dict.fromkeys(df.columns.get_level_values(1)))
+    columns = [_column_name(field) for field in fields]
+    if df.empty:
+        return {ticker: _empty_ohlc_frame(columns) for ticker in tickers}
 
-def resample(df):
-    df = df.set_index("datetime")
-    df = df.resample("D").asfreq()
-    return df
+    df = df.reindex(columns=pd.MultiIndex.from_product([fields, tickers]))
+    days, rows = _sorted_unique_days(df.index)
+    if len(days) == 0:
+        return {ticker: _empty_ohlc_frame(columns) for ticker in tickers}
+    values = df.to_numpy(dtype="float64")[rows]
 
+    days, values = _to_calendar(days, values, calendar)
+    has_bar = ~np.isnan(values).reshape(len(days), len(fields), len(tickers)).all(axis=1)
+    interpolate_in_place(days, values)
+    values = values.reshape(len(days), len(fields), len(tickers))
 
-def basic_preprocess(df):
-    df = df.astype("float64")
-    df = df.interpolate(method="time")
-    df = df.fillna("bfill")
-    return df.reset_index()
+    panel = {}
+    for i, ticker in enumerate(tickers):
+        bar_rows = np.flatnonzero(has_bar[:, i])
+        if len(bar_rows) == 0:
+            panel[ticker] = _empty_ohlc_frame(columns)
+            continue
+        first, last = bar_rows[0], bar_rows[-1] + 1
+        ticker_days = days[first:last]
+        ticker_values = values[first:last, :, i]
+        if calendar == "trading":
+            # Drop the days on which only other tickers traded
+            keep = has_bar[first:last, i]
+            ticker_days, ticker_values = ticker_days[keep], ticker_values[keep]
+        result = pd.DataFrame(ticker_values, columns=columns)
+        result.insert(0, "datetime", ticker_days.astype("datetime64[ns]"))
+        panel[ticker] = result
+    return panel
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The application modules are imported by their bare names, like `main.py` does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import mongomock
+import numpy as np
+import pytest
+from manager import PortfolioManager, TickerDataManager
+
+
+@pytest.fixture
+def portfolios_collection():
+    return mongomock.MongoClient()["stocks"]["portfolios"]
+
+
+def test_portfolio_without_tickers_is_not_analyzed(portfolios_collection, monkeypatch):
+    def get_aligned_prices(*args, **kwargs):
+        raise AssertionError("Read prices of an empty portfolio")
+
+    monkeypatch.setattr(TickerDataManager, "get_aligned_prices", get_aligned_prices)
+    portfolio_id = portfolios_collection.insert_one(
+        {
+            "username": "john",
+            "portfolio_name": "empty",
+            "tickers": None,
+            "created_at": datetime(2024, 1, 1),
+        }
+    ).inserted_id
+
+    manager = PortfolioManager("john", portfolios_collection)
+    assert manager.analyze_portfolio(str(portfolio_id)) is None
+
+
+def test_portfolio_without_prices_is_not_analyzed(portfolios_collection, monkeypatch):
+    monkeypatch.setattr(
+        TickerDataManager,
+        "get_aligned_prices",
+        lambda *args, **kwargs: (np.array([], dtype="datetime64[D]"), [], np.empty((0, 0))),
+    )
+    portfolio_id = portfolios_collection.insert_one(
+        {
+            "username": "john",
+            "portfolio_name": "tech",
+            "tickers": [{"ticker_code": "AAPL", "name": "Apple Inc."}],
+            "created_at": datetime(2024, 1, 1),
+        }
+    ).inserted_id
+
+    manager = PortfolioManager("john", portfolios_collection)
+    assert manager.analyze_portfolio(str(portfolio_id)) is None
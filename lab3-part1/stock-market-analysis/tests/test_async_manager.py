@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from async_manager import AsyncPortfolioManager, AsyncUserManager, DuplicatePortfolioError
+from manager import DuplicateUsernameError
+from models import PortfolioModel, UserBase
+from pymongo.errors import DuplicateKeyError
+
+
+class RacingCollection:
+    """Collection whose document is inserted concurrently between the check and the insert."""
+
+    async def find_one(self, *args, **kwargs):
+        return None
+
+    async def insert_one(self, document):
+        raise DuplicateKeyError("E11000 duplicate key error")
+
+
+@pytest.fixture
+def db():
+    return {"users": RacingCollection(), "portfolios": RacingCollection()}
+
+
+def test_concurrent_user_creation_raises_duplicate_username(db):
+    user = UserBase(
+        username="john",
+        name={"first_name": "John", "last_name": "Doe"},
+        password="hash",
+        created_at=datetime(2024, 1, 1),
+    )
+    with pytest.raises(DuplicateUsernameError):
+        asyncio.run(AsyncUserManager(db, session_store=None).create_user(user))
+
+
+def test_concurrent_portfolio_creation_raises_duplicate_portfolio(db):
+    portfolio = PortfolioModel(
+        username="john", portfolio_name="tech", created_at=datetime(2024, 1, 1)
+    )
+    with pytest.raises(DuplicatePortfolioError):
+        asyncio.run(AsyncPortfolioManager("john", db).create_portfolio(portfolio))
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import manager
+import pandas as pd
+import pytest
+from manager import TickerDataManager, TickerInfoManager
+
+
+class FakeStore:
+    def __init__(self):
+        self.rows = []
+
+    def insert(self, df, strict=False):
+        self.rows.extend(df["datetime"])
+        return len(df)
+
+
+def make_frame(start: str, periods: int):
+    df = pd.DataFrame(
+        1.0, index=range(periods), columns=["open", "high", "low", "close", "adj_close", "volume"]
+    )
+    df.insert(0, "datetime", pd.date_range(start, periods=periods))
+    return df
+
+
+@pytest.fixture
+def backfill(monkeypatch):
+    stores, coverages, downloads = {}, {}, []
+
+    def get_many_ticker_details(ticker_codes):
+        return {code: {"ticker_code": code} for code in ticker_codes}
+
+    def get_tickers_data(ticker_codes, start_date=None, end_date=None):
+        downloads.append(list(ticker_codes))
+        # MSFT failed to download
+        return {"AAPL": make_frame("2024-01-02", 4)}
+
+    monkeypatch.setattr(TickerInfoManager, "get_many_ticker_details", get_many_ticker_details)
+    monkeypatch.setattr(TickerInfoManager, "get_coverage", lambda ticker_code, store: [])
+    monkeypatch.setattr(TickerInfoManager, "update_coverage", coverages.__setitem__)
+    monkeypatch.setattr(
+        manager, "get_ticker_store", lambda code: stores.setdefault(code, FakeStore())
+    )
+    monkeypatch.setattr(manager, "get_tickers_data", get_tickers_data)
+    monkeypatch.setattr(manager.forecast_cache, "invalidate", lambda ticker_codes: None)
+    monkeypatch.setattr(manager.config, "INDICATORS_ON_INGEST", False)
+
+    ingested = TickerDataManager.backfill_stock_data(
+        ["AAPL", "MSFT"], start_date=datetime(2024, 1, 1), end_date=datetime(2024, 1, 10)
+    )
+    return ingested, stores, coverages, downloads
+
+
+def test_tickers_missing_the_same_range_are_downloaded_together(backfill):
+    _, _, _, downloads = backfill
+    assert downloads == [["AAPL", "MSFT"]]
+
+
+def test_only_downloaded_tickers_are_covered(backfill):
+    ingested, stores, coverages, _ = backfill
+    assert ingested == {"AAPL": 4}
+    assert len(stores["AAPL"].rows) == 4
+    # The settled days after the last bar too, a failed download covers nothing
+    assert coverages["AAPL"] == [(datetime(2024, 1, 1), datetime(2024, 1, 10))]
+    assert coverages["MSFT"] == []
+
+
+def test_failed_indicator_refresh_still_updates_coverage(monkeypatch):
+    coverages = {}
+
+    def refresh_indicators(ticker_code, ticker_store):
+        raise RuntimeError("duplicate key")
+
+    monkeypatch.setattr(TickerInfoManager, "get_coverage", lambda ticker_code, store: [])
+    monkeypatch.setattr(TickerInfoManager, "update_coverage", coverages.__setitem__)
+    monkeypatch.setattr(manager, "get_ticker_data", lambda *args, **kwargs: None)
+    monkeypatch.setattr(manager, "preprocess_ticker_data", lambda df: make_frame("2024-01-02", 4))
+    monkeypatch.setattr(manager, "refresh_indicators", refresh_indicators)
+    monkeypatch.setattr(manager.forecast_cache, "invalidate", lambda ticker_codes: None)
+    monkeypatch.setattr(manager.config, "INDICATORS_ON_INGEST", True)
+
+    store = FakeStore()
+    TickerDataManager.sync_stock_data(
+        {"ticker_code": "AAPL"},
+        store,
+        start_date=datetime(2024, 1, 1),
+        end_date=datetime(2024, 1, 10),
+    )
+    assert len(store.rows) == 4
+    assert coverages["AAPL"]
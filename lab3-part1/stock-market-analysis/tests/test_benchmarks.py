@@ -0,0 +1,184 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+import storage
+import yf
+from benchmark import get_benchmark_client, make_synthetic_yahoo_frame
+from ingest import validate_ohlc_frame
+from intraday import rollup_bars
+from replay import CacheFixtures, FixtureAdapter
+from storage import CollectionTickerStore
+from yf import TokenBucket, get_ticker_data, preprocess_ticker_data
+
+TICKERS = [1, 10, 100, 1000]
+YEARS = 2
+
+
+def get_chart_url(ticker_code: str):
+    # Without a query, the fixture answers every chart request of the ticker
+    return f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker_code}"
+
+
+def make_chart_response(ticker_code: str, df: pd.DataFrame):
+    # Yahoo Finance v8 chart response holding a Yahoo shaped frame, missing values as null
+    def values(column):
+        return df[column].astype(object).where(df[column].notna(), None).tolist()
+
+    quote = {column.lower(): values(column) for column in ["Open", "High", "Low", "Close"]}
+    quote["volume"] = values("Volume")
+    result = {
+        "meta": {
+            "symbol": ticker_code,
+            "currency": "USD",
+            "instrumentType": "EQUITY",
+            "exchangeTimezoneName": "UTC",
+            "dataGranularity": "1d",
+            "priceHint": 2,
+        },
+        "timestamp": df.index.to_numpy(dtype="datetime64[s]").astype("int64").tolist(),
+        "indicators": {"quote": [quote], "adjclose": [{"adjclose": values("Adj Close")}]},
+    }
+    return json.dumps({"chart": {"result": [result], "error": None}}).encode()
+
+
+def get_ticker_codes(n_tickers: int):
+    return [f"T{i:04d}" for i in range(n_tickers)]
+
+
+@pytest.fixture(scope="module")
+def yahoo(tmp_path_factory):
+    """Replay synthetic chart responses on `yf.session`. Yields the downloaded date range."""
+    fixtures = CacheFixtures(str(tmp_path_factory.mktemp("replay") / "yfinance.cache"))
+    for i, ticker_code in enumerate(get_ticker_codes(max(TICKERS))):
+        df = make_synthetic_yahoo_frame(int(YEARS * 261), seed=i)
+        fixtures.add(get_chart_url(ticker_code), make_chart_response(ticker_code, df))
+
+    # Answered by the fixtures in process, without the rate limit and the requests cache
+    adapter, bucket = yf.session.get_adapter("https://"), yf.session.bucket
+    yf.session.mount("https://", FixtureAdapter(fixtures))
+    yf.session.bucket = TokenBucket(rate=10**9, period=1)
+    try:
+        with yf.session.cache_disabled():
+            # Every synthetic frame has the same days, Yahoo treats the end date as exclusive
+            yield df.index[0].to_pydatetime(), df.index[-1].to_pydatetime() + pd.Timedelta(days=1)
+    finally:
+        yf.session.mount("https://", adapter)
+        yf.session.bucket = bucket
+
+
+@pytest.fixture(scope="module")
+def db():
+    client = get_benchmark_client(
+        os.environ.get("BENCHMARK_BACKEND", "mongomock"), os.environ.get("BENCHMARK_MONGODB_URI")
+    )
+    yield client["bench_suite"]
+    client.drop_database("bench_suite")
+
+
+@pytest.fixture(scope="module")
+def stages(yahoo):
+    """Outputs of the stages for every number of tickers, computed once outside the timings."""
+    start_date, end_date = yahoo
+    outputs = {}
+
+    def get(n_tickers: int):
+        if n_tickers not in outputs:
+            downloads = {
+                code: get_ticker_data(code, start_date=start_date, end_date=end_date)
+                for code in get_ticker_codes(n_tickers)
+            }
+            frames = {code: preprocess_ticker_data(df, "trading") for code, df in downloads.items()}
+            outputs[n_tickers] = downloads, frames
+        return outputs[n_tickers]
+
+    return get
+
+
+def drop_ticker(db, ticker_code: str):
+    # The unique index is created again by the next insert
+    db.drop_collection(ticker_code)
+    storage._indexed_collections.discard((db.name, ticker_code))
+
+
+def count_rows(benchmark, frames: dict):
+    benchmark.extra_info["rows"] = sum(len(df) for df in frames.values())
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_fetch(benchmark, yahoo, stages, n_tickers):
+    start_date, end_date = yahoo
+    responses = []
+
+    def count_response(response, *args, **kwargs):
+        responses.append(response.url)
+
+    def fetch():
+        responses.clear()
+        return [
+            get_ticker_data(code, start_date=start_date, end_date=end_date)
+            for code in get_ticker_codes(n_tickers)
+        ]
+
+    yf.session.hooks["response"].append(count_response)
+    try:
+        benchmark(fetch)
+    finally:
+        yf.session.hooks["response"].remove(count_response)
+    # At least one request per ticker, yfinance has no multi-symbol endpoint
+    benchmark.extra_info["requests"] = len(responses)
+    count_rows(benchmark, stages(n_tickers)[1])
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_clean(benchmark, stages, n_tickers):
+    downloads, frames = stages(n_tickers)
+    benchmark(lambda: [preprocess_ticker_data(df, "trading") for df in downloads.values()])
+    count_rows(benchmark, frames)
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_resample(benchmark, stages, n_tickers):
+    _, frames = stages(n_tickers)
+    benchmark(lambda: [rollup_bars(df, "7d") for df in frames.values()])
+    count_rows(benchmark, frames)
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_validate(benchmark, stages, n_tickers):
+    _, frames = stages(n_tickers)
+    benchmark(lambda: [validate_ohlc_frame(df) for df in frames.values()])
+    count_rows(benchmark, frames)
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_insert(benchmark, db, stages, n_tickers):
+    _, frames = stages(n_tickers)
+
+    def drop_tickers():
+        for code in frames:
+            drop_ticker(db, code)
+
+    def insert():
+        for code, df in frames.items():
+            CollectionTickerStore(code, db=db).insert(df)
+
+    benchmark.pedantic(insert, setup=drop_tickers, rounds=3)
+    count_rows(benchmark, frames)
+
+
+@pytest.mark.parametrize("n_tickers", TICKERS)
+def test_read(benchmark, db, stages, n_tickers):
+    _, frames = stages(n_tickers)
+    for code, df in frames.items():
+        drop_ticker(db, code)
+        CollectionTickerStore(code, db=db).insert(df)
+
+    benchmark(
+        lambda: [
+            pd.DataFrame(list(CollectionTickerStore(code, db=db).find({}, {"_id": 0})))
+            for code in frames
+        ]
+    )
+    count_rows(benchmark, frames)
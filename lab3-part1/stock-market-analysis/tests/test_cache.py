@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import mongomock
+import pandas as pd
+from cache import ForecastCache
+
+
+def test_forecasts_are_only_read_for_the_latest_stored_day():
+    cache = ForecastCache(mongomock.MongoClient()["stocks"]["forecasts"])
+    forecasts = pd.DataFrame(
+        {"AAPL": [1.0, 2.0], "MSFT": [3.0, 4.0]},
+        index=pd.date_range("2024-01-03", periods=2),
+    )
+    cache.set_many(
+        forecasts,
+        "hash",
+        {"AAPL": datetime(2024, 1, 2), "MSFT": datetime(2024, 1, 2)},
+    )
+
+    # MSFT has a newer bar than its stored forecast was made from
+    cached = cache.get_many(
+        {"AAPL": datetime(2024, 1, 2), "MSFT": datetime(2024, 1, 3)}, "hash", horizon=2
+    )
+    assert list(cached) == ["AAPL"]
+    assert cached["AAPL"]["prices"] == [1.0, 2.0]
+    assert cache.get_many({"AAPL": datetime(2024, 1, 2)}, "other", horizon=2) == {}
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import manager
+import mongomock
+import pandas as pd
+import pytest
+import storage
+from manager import TickerDataManager, TickerInfoManager
+from storage import CollectionTickerStore
+
+
+def make_frame(start: datetime, end: datetime):
+    days = pd.date_range(start, end)
+    df = pd.DataFrame(
+        1.0, index=range(len(days)), columns=["open", "high", "low", "close", "adj_close", "volume"]
+    )
+    df.insert(0, "datetime", days)
+    return df
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = mongomock.MongoClient()
+    client["stocks"]["tickers_info"].insert_one({"ticker_code": "AAPL"})
+    monkeypatch.setattr(manager, "tickers_info_collection", client["stocks"]["tickers_info"])
+    monkeypatch.setattr(storage, "_indexed_collections", set())
+    monkeypatch.setattr(manager.forecast_cache, "invalidate", lambda ticker_codes: None)
+    monkeypatch.setattr(manager.config, "INDICATORS_ON_INGEST", False)
+    # Downloads return a bar for every requested day
+    monkeypatch.setattr(
+        manager,
+        "get_ticker_data",
+        lambda code, start_date=None, end_date=None: (start_date, end_date),
+    )
+    monkeypatch.setattr(
+        manager,
+        "preprocess_ticker_data",
+        lambda request: make_frame(request[0], request[1] - manager.ONE_DAY),
+    )
+    return client
+
+
+def sync(store, start_date: datetime, end_date: datetime):
+    TickerDataManager.sync_stock_data(
+        {"ticker_code": "AAPL"}, store, start_date=start_date, end_date=end_date
+    )
+
+
+def test_interleaved_syncs_keep_each_others_coverage(client, monkeypatch):
+    store = CollectionTickerStore("AAPL", db=client["ticker_data"])
+    get_ticker_data = manager.get_ticker_data
+    interleaved = []
+
+    def get_ticker_data_interleaved(code, start_date=None, end_date=None):
+        # A second sync of an overlapping range runs to completion while the first downloads
+        if not interleaved:
+            interleaved.append(True)
+            sync(store, datetime(2023, 12, 20), datetime(2024, 1, 5))
+        return get_ticker_data(code, start_date=start_date, end_date=end_date)
+
+    monkeypatch.setattr(manager, "get_ticker_data", get_ticker_data_interleaved)
+    sync(store, datetime(2024, 1, 2), datetime(2024, 1, 10))
+
+    assert TickerInfoManager.get_coverage("AAPL", store) == [
+        (datetime(2023, 12, 20), datetime(2024, 1, 10))
+    ]
+    days = [row["datetime"] for row in store.find({}, {"_id": 0, "datetime": 1})]
+    assert days == list(pd.date_range("2023-12-20", "2024-01-10"))
+
+    # Nothing left to download
+    monkeypatch.setattr(manager, "get_ticker_data", None)
+    sync(store, datetime(2023, 12, 20), datetime(2024, 1, 10))
+
+
+def test_coverage_is_compacted(client):
+    store = CollectionTickerStore("AAPL", db=client["ticker_data"])
+    sync(store, datetime(2024, 1, 1), datetime(2024, 1, 5))
+    sync(store, datetime(2024, 1, 6), datetime(2024, 1, 10))
+
+    stored = client["stocks"]["tickers_info"].find_one({"ticker_code": "AAPL"})["coverage"]
+    assert stored == [{"start": datetime(2024, 1, 1), "end": datetime(2024, 1, 10)}]
+
+
+def test_collection_insert_skips_stored_rows(client):
+    store = CollectionTickerStore("AAPL", db=client["ticker_data"])
+    assert store.insert(make_frame(datetime(2024, 1, 1), datetime(2024, 1, 5))) == 5
+    assert store.insert(make_frame(datetime(2024, 1, 3), datetime(2024, 1, 8))) == 3
+    assert store.count() == 8
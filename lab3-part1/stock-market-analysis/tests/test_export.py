@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+from export import write_frames
+
+COLUMNS = ["datetime", "close"]
+
+
+def test_csv_export_without_rows_has_a_header(tmp_path):
+    path = tmp_path / "empty.csv"
+    assert write_frames(iter([]), str(path), columns=COLUMNS) == 0
+    assert path.read_text().strip() == "datetime,close"
+
+
+def test_parquet_export_without_rows_has_the_columns(tmp_path):
+    path = tmp_path / "empty.parquet"
+    assert write_frames(iter([]), str(path), columns=COLUMNS) == 0
+    assert list(pd.read_parquet(path).columns) == COLUMNS
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_export_writes_every_batch(tmp_path, extension):
+    frames = [pd.DataFrame({"datetime": pd.date_range("2024-01-01", periods=2), "close": 1.0})] * 2
+    path = tmp_path / f"data{extension}"
+    assert write_frames(iter(frames), str(path), columns=COLUMNS) == 4
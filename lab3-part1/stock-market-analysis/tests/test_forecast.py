@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+from forecast import forecast_prices
+
+
+class FlatModel:
+    """Forecasts unchanged prices."""
+
+    window = 3
+
+    def forecast(self, windows, horizon):
+        return np.zeros((len(windows), horizon))
+
+
+def test_halted_tickers_are_forecast_from_their_last_price():
+    dates = pd.date_range("2024-01-01", periods=10).to_numpy(dtype="datetime64[D]")
+    prices = np.column_stack([np.arange(10, 20.0), np.arange(30, 40.0)])
+    # MSFT stopped trading three days before AAPL
+    prices[-3:, 1] = np.nan
+
+    df = forecast_prices(
+        FlatModel(), dates, ["AAPL", "MSFT"], prices, horizon=2, calendar="calendar"
+    )
+
+    assert df["AAPL"].dropna().index.tolist() == list(pd.date_range("2024-01-11", periods=2))
+    assert df["MSFT"].dropna().index.tolist() == list(pd.date_range("2024-01-08", periods=2))
+    assert df["MSFT"].dropna().tolist() == [36.0, 36.0]
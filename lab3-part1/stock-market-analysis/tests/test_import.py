@@ -0,0 +1,85 @@
+import main
+import mongomock
+import pymongo
+import pytest
+from manager import PortfolioManager, TickerInfoManager
+
+
+@pytest.fixture
+def portfolios_collection(monkeypatch):
+    def get_many_ticker_details(ticker_codes):
+        # Codes resolve case-insensitively, "BAD" is unknown
+        return {
+            code: {"ticker_code": code.upper(), "name": code.upper(), "exchange": "NMS"}
+            for code in ticker_codes
+            if code.upper() != "BAD"
+        }
+
+    monkeypatch.setattr(TickerInfoManager, "get_many_ticker_details", get_many_ticker_details)
+    collection = mongomock.MongoClient()["stocks"]["portfolios"]
+    collection.create_index(
+        [("username", pymongo.ASCENDING), ("portfolio_name", pymongo.ASCENDING)], unique=True
+    )
+    return collection
+
+
+def stored_codes(collection, portfolio_name: str, username: str = "john"):
+    portfolio = collection.find_one({"username": username, "portfolio_name": portfolio_name})
+    return [ticker["ticker_code"] for ticker in portfolio["tickers"]]
+
+
+def test_read_portfolio_files(tmp_path):
+    (tmp_path / "tech.yaml").write_text("tickers:\n  - ticker_code: AAPL\n  - ticker_code: MSFT\n")
+    (tmp_path / "many.yaml").write_text(
+        "portfolios:\n"
+        "  - portfolio_name: tech\n"
+        "    tickers:\n"
+        "      - ticker_code: NVDA\n"
+        "  - portfolio_name: empty\n"
+    )
+    assert main.read_portfolio_files([tmp_path / "tech.yaml", tmp_path / "many.yaml"]) == {
+        "tech": ["AAPL", "MSFT", "NVDA"],
+        "empty": [],
+    }
+
+
+def test_import_creates_and_extends_portfolios(portfolios_collection):
+    portfolios_collection.insert_many(
+        [
+            {"username": "john", "portfolio_name": "tech", "tickers": [{"ticker_code": "AAPL"}]},
+            {"username": "john", "portfolio_name": "empty", "tickers": None},
+            # Same name for another user
+            {"username": "jane", "portfolio_name": "new", "tickers": []},
+        ]
+    )
+    summary = PortfolioManager("john", portfolios_collection).import_portfolios(
+        {"tech": ["aapl", "MSFT", "msft"], "empty": ["NVDA"], "new": ["AAPL", "BAD"]}
+    )
+
+    assert summary == {"created": 1, "updated": 2, "failed": [], "invalid_tickers": ["BAD"]}
+    assert stored_codes(portfolios_collection, "tech") == ["AAPL", "MSFT"]
+    assert stored_codes(portfolios_collection, "empty") == ["NVDA"]
+    assert stored_codes(portfolios_collection, "new") == ["AAPL"]
+    assert stored_codes(portfolios_collection, "new", username="jane") == []
+
+
+def test_portfolio_created_concurrently_is_imported_as_an_update(
+    portfolios_collection, monkeypatch
+):
+    manager = PortfolioManager("john", portfolios_collection)
+    import_requests = manager._import_requests
+
+    def import_requests_then_create(tickers):
+        requests = import_requests(tickers)
+        if portfolios_collection.count_documents({}) == 0:
+            # Created by another import after this one read the stored portfolios
+            portfolios_collection.insert_one(
+                {"username": "john", "portfolio_name": "tech", "tickers": [{"ticker_code": "AAPL"}]}
+            )
+        return requests
+
+    monkeypatch.setattr(manager, "_import_requests", import_requests_then_create)
+    summary = manager.import_portfolios({"tech": ["AAPL", "MSFT"]})
+
+    assert summary["failed"] == []
+    assert stored_codes(portfolios_collection, "tech") == ["AAPL", "MSFT"]
@@ -0,0 +1,35 @@
+import mongomock
+import pandas as pd
+import pymongo
+from indicators import read_indicators, refresh_indicators
+from storage import CollectionTickerStore
+
+
+def make_frame(start: str, periods: int):
+    df = pd.DataFrame(
+        1.0, index=range(periods), columns=["open", "high", "low", "close", "adj_close", "volume"]
+    )
+    df.insert(0, "datetime", pd.date_range(start, periods=periods))
+    df["close"] = 100.0 + df.index
+    return df
+
+
+def test_refresh_rewrites_rows_of_an_update_that_did_not_save_its_state():
+    client = mongomock.MongoClient()
+    db = client["indicators"]
+    db["daily"].create_index(
+        [("ticker_code", pymongo.ASCENDING), ("datetime", pymongo.ASCENDING)], unique=True
+    )
+    store = CollectionTickerStore("AAPL", db=client["stocks"])
+    df = make_frame("2024-01-01", 45)
+    store.insert(df.iloc[:40])
+    refresh_indicators("AAPL", store, db=db)
+    state = db["state"].find_one({"_id": "AAPL"})
+
+    store.insert(df.iloc[40:])
+    refresh_indicators("AAPL", store, db=db)
+    # The process died before saving the new rolling state
+    db["state"].replace_one({"_id": "AAPL"}, state)
+
+    assert refresh_indicators("AAPL", store, db=db) == 5
+    assert len(read_indicators("AAPL", db=db)) == 45
@@ -0,0 +1,103 @@
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+from ingest import InvalidOHLCDataError
+from intraday import (
+    OPEN_TIER,
+    get_bars,
+    ingest_intraday_data,
+    parse_interval,
+    read_bars,
+    replace_bars,
+    rollup_bars,
+    select_tier,
+)
+
+
+def make_bars(start: str, periods: int, freq: str = "1min", seed: int = 0):
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(periods).cumsum()
+    return pd.DataFrame(
+        {
+            "datetime": pd.date_range(start, periods=periods, freq=freq),
+            "open": close + rng.standard_normal(periods),
+            "high": close + 2,
+            "low": close - 2,
+            "close": close,
+            "adj_close": close,
+            "volume": rng.integers(0, 1000, periods).astype(float),
+        }
+    )
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()["intraday"]
+
+
+@pytest.mark.parametrize("interval", ["5m", "15m", "1h", "1d"])
+def test_rollup_matches_resample(interval):
+    df = make_bars("2024-01-02 14:30", 2000)
+    expected = (
+        df.set_index("datetime")
+        .resample(parse_interval(interval))
+        .agg(
+            {
+                "open": "first",
+                "high": "max",
+                "low": "min",
+                "close": "last",
+                "adj_close": "last",
+                "volume": "sum",
+            }
+        )
+        .dropna()
+        .reset_index()
+    )
+    pd.testing.assert_frame_equal(rollup_bars(df, interval), expected, check_freq=False)
+
+
+def test_ingest_refreshes_coarser_tiers(db):
+    df = make_bars("2024-01-02 14:30", 600)
+    ingest_intraday_data("AAPL", "1m", df.iloc[:300], db=db)
+    # The latest bar was still forming
+    ingest_intraday_data("AAPL", "1m", df.iloc[299:], db=db)
+
+    pd.testing.assert_frame_equal(read_bars("AAPL", "1m", db=db), df)
+    for interval in ["5m", "15m", "1h", "1d", "30m"]:
+        pd.testing.assert_frame_equal(
+            get_bars("AAPL", interval, db=db), rollup_bars(df, interval), check_dtype=False
+        )
+
+
+def test_replace_bars_deletes_stale_bars(db):
+    df = make_bars("2024-01-02 14:30", 10)
+    replace_bars("AAPL", "1m", df, df["datetime"].min(), df["datetime"].max(), db=db)
+    # Bars 2 to 4 are gone from the new download of the range
+    new = make_bars("2024-01-02 14:30", 10, seed=1).drop(index=[2, 3, 4])
+    replace_bars("AAPL", "1m", new, df["datetime"].min(), df["datetime"].max(), db=db)
+
+    pd.testing.assert_frame_equal(read_bars("AAPL", "1m", db=db), new.reset_index(drop=True))
+
+
+def test_invalid_bars_keep_the_stored_ones(db):
+    df = make_bars("2024-01-02 14:30", 10)
+    replace_bars("AAPL", "1m", df, df["datetime"].min(), df["datetime"].max(), db=db)
+
+    invalid = df.assign(close=-1.0)
+    with pytest.raises(InvalidOHLCDataError):
+        replace_bars("AAPL", "1m", invalid, df["datetime"].min(), df["datetime"].max(), db=db)
+    pd.testing.assert_frame_equal(read_bars("AAPL", "1m", db=db), df)
+
+
+def test_hourly_bars_keep_their_market_open_alignment(db):
+    df = make_bars("2023-01-03 14:30", 7, freq="1h")
+    assert ingest_intraday_data("AAPL", "1h", df, db=db) == {OPEN_TIER: 7}
+
+    pd.testing.assert_frame_equal(read_bars("AAPL", OPEN_TIER, db=db), df)
+    assert read_bars("AAPL", "1h", db=db).empty
+    start = df["datetime"].min().to_pydatetime()
+    assert select_tier("1h", start) == OPEN_TIER
+    pd.testing.assert_frame_equal(get_bars("AAPL", "1h", start, db=db), df)
+    assert get_bars("AAPL", "1d", start, db=db)["volume"].tolist() == [df["volume"].sum()]
@@ -0,0 +1,39 @@
+import db
+import main
+import migrations
+import mongomock
+import pytest
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, "get_client", lambda: client)
+    monkeypatch.setattr(migrations, "_applied", False)
+    return client
+
+
+def test_migrations_are_applied_once_on_the_first_query(client):
+    assert db.users_collection.find_one({"username": "john"}) is None
+
+    applied = client["yf_panels"]["migrations"].distinct("_id")
+    assert applied == [version for version, _, _ in migrations.INDEX_MIGRATIONS]
+    assert client["yf_panels"]["portfolios"].index_information()["username_1_portfolio_name_1"][
+        "unique"
+    ]
+    assert migrations.ensure_indexes() == []
+
+
+def test_ensure_indexes_command_reports_the_versions_applied(client):
+    assert migrations.ensure_indexes() == [version for version, _, _ in migrations.INDEX_MIGRATIONS]
+
+
+def test_commands_without_queries_do_not_connect(client, monkeypatch, tmp_path):
+    def get_client():
+        raise AssertionError("Connected to MongoDB")
+
+    monkeypatch.setattr(db, "get_client", get_client)
+    script = tmp_path / "script.txt"
+    script.write_text("# Nothing to run\n")
+    monkeypatch.setattr("sys.argv", ["main.py", "batch", "--script", str(script)])
+    main.main()
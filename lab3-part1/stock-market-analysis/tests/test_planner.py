@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pandas as pd
+from planner import fetched_range, missing_ranges, plan_backfill
+
+REQUEST = (datetime(2024, 1, 1), datetime(2024, 1, 10))
+
+
+def make_frame(start: str, end: str):
+    return pd.DataFrame({"datetime": pd.date_range(start, end), "close": 1.0})
+
+
+def test_recent_days_after_the_last_bar_are_not_covered():
+    df = make_frame("2024-01-01", "2024-01-05")
+    assert fetched_range(REQUEST, df, settled_day=datetime(2024, 1, 3)) == (
+        datetime(2024, 1, 1),
+        datetime(2024, 1, 5),
+    )
+    assert fetched_range(REQUEST, df) == (datetime(2024, 1, 1), datetime(2024, 1, 5))
+
+
+def test_settled_days_after_the_last_bar_are_covered():
+    df = make_frame("2024-01-01", "2024-01-05")
+    assert fetched_range(REQUEST, df, settled_day=datetime(2024, 1, 8)) == (
+        datetime(2024, 1, 1),
+        datetime(2024, 1, 8),
+    )
+    assert fetched_range(REQUEST, df, settled_day=datetime(2024, 2, 1)) == REQUEST
+
+
+def test_empty_downloads_are_covered_only_when_settled_before_a_later_bar():
+    empty = make_frame("2024-01-01", "2024-01-05").iloc[:0]
+    settled_day = datetime(2024, 2, 1)
+    assert fetched_range(REQUEST, empty, settled_day=settled_day) is None
+    assert fetched_range(REQUEST, None, settled_day=settled_day) is None
+    assert fetched_range(REQUEST, empty, latest_day=datetime(2024, 1, 20)) is None
+    assert (
+        fetched_range(REQUEST, empty, settled_day=settled_day, latest_day=datetime(2024, 1, 20))
+        == REQUEST
+    )
+
+
+def test_only_the_missing_ranges_are_planned():
+    coverage = [(datetime(2024, 1, 5), datetime(2024, 1, 10))]
+    assert missing_ranges(coverage, datetime(2024, 1, 1), datetime(2024, 1, 20)) == [
+        (datetime(2024, 1, 1), datetime(2024, 1, 4)),
+        (datetime(2024, 1, 11), datetime(2024, 1, 20)),
+    ]
+    # Close gaps are downloaded with one request
+    assert plan_backfill(
+        coverage, datetime(2024, 1, 1), datetime(2024, 1, 20), max_gap_days=30
+    ) == [(datetime(2024, 1, 1), datetime(2024, 1, 20))]
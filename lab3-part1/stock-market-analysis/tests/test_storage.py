@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+import storage
+from storage import migrate_to_timeseries
+
+
+def make_rows(start: datetime, days: int):
+    return [
+        {
+            "datetime": start + timedelta(days=i),
+            "open": 1.0,
+            "high": 1.0,
+            "low": 1.0,
+            "close": 1.0,
+            "adj_close": 1.0,
+            "volume": 1.0,
+        }
+        for i in range(days)
+    ]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock.MongoClient()["stocks"]
+    # mongomock cannot create time-series collections, a plain one stands in for it
+    monkeypatch.setattr(storage, "_timeseries_collections", {(db.name, "ohlc")})
+    return db
+
+
+def test_migration_copies_the_history_before_rows_synced_to_the_timeseries(db):
+    db["AAPL"].insert_many(make_rows(datetime(2024, 1, 1), 10))
+    # Synced after switching the backend, before migrating
+    db["ohlc"].insert_many(
+        [{**row, "ticker_code": "AAPL"} for row in make_rows(datetime(2024, 1, 10), 5)]
+    )
+
+    assert migrate_to_timeseries(drop=True, batch_size=4, db=db) == {"AAPL": 9}
+    assert db["ohlc"].count_documents({"ticker_code": "AAPL"}) == 14
+    assert "AAPL" not in db.list_collection_names()
+
+
+def test_migration_resumes_without_copying_rows_twice(db):
+    rows = make_rows(datetime(2024, 1, 1), 10)
+    db["AAPL"].insert_many(rows)
+    db["ohlc"].insert_many([{**row, "ticker_code": "AAPL"} for row in rows[:6]])
+
+    assert migrate_to_timeseries(batch_size=4, db=db) == {"AAPL": 4}
+    assert db["ohlc"].count_documents({"ticker_code": "AAPL"}) == 10
+    assert "AAPL" in db.list_collection_names()
@@ -0,0 +1,482 @@
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+import schema
+from embeddings import decode_embeddings, encode_embedding
+from extract import TextCleaner, TextPreprocessor
+from fetch import USER_AGENT, ArticleFetcher, html_to_text
+from gensim.models.doc2vec import Doc2Vec
+from inference import infer_page, init_worker, map_pages, tag_page
+from requests.exceptions import RequestException
+from rich.pretty import pretty_repr
+from settings import get_logger
+
+logger = get_logger(__file__)
+
+
+########################################################################################################################
+# Helpers
+########################################################################################################################
+# Behaviour of every simulated domain: seconds before answering, status code and share of the posts linking to it
+FIXTURE_DOMAINS = {
+    "fast": {"delay": 0.05, "status": 200, "share": 0.6},
+    "slow": {"delay": 1.5, "status": 200, "share": 0.2},
+    "failing": {"delay": 0.05, "status": 503, "share": 0.15},
+    "hanging": {"delay": 12.0, "status": 200, "share": 0.05},
+}
+
+ARTICLE_HTML = "<html><body>{}</body></html>".format(
+    "".join(f"<p>Paragraph {i} of an article linked from a Reddit post.</p>" for i in range(20))
+).encode()
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    status = 200
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        try:
+            self.send_response(self.status)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(ARTICLE_HTML)))
+            self.end_headers()
+            self.wfile.write(ARTICLE_HTML)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    Local HTTP server standing in for one domain linked from Reddit posts
+    """
+
+    def __init__(self, delay: float, status: int, host: str = "127.0.0.1"):
+        handler = type("Handler", (FixtureRequestHandler,), {"delay": delay, "status": status})
+        self.server = ThreadingHTTPServer((host, 0), handler)
+        # Don't wait for requests still sleeping when shutting down
+        self.server.block_on_close = False
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SimulatedBrowserPool:
+    """
+    Stands in for `extract.BrowserPool`, every page takes `seconds` to load on one of `size` browsers
+    """
+
+    def __init__(self, size: int, seconds: float):
+        self.size = size
+        self.seconds = seconds
+        self.browsers = threading.BoundedSemaphore(size)
+        self.pages = 0
+
+    def get_text(self, url):
+        with self.browsers:
+            time.sleep(self.seconds)
+            self.pages += 1
+        return ""
+
+    def close(self):
+        pass
+
+
+def make_listing(servers: dict, n_posts: int):
+    # Urls linked from `n_posts` posts, spread over the domains by their share
+    urls = []
+    for name, server in servers.items():
+        n = round(n_posts * FIXTURE_DOMAINS[name]["share"])
+        urls.extend(f"{server.url}/{name}/{i}" for i in range(n))
+    return urls[:n_posts]
+
+
+def sequential_fetch(urls: list, browser, timeout: float = 30):
+    # The scraper before the fetch stage: one fresh request after another, falling back to the browser in line
+    texts = {}
+    for url in urls:
+        try:
+            response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+            response.raise_for_status()
+            texts[url] = html_to_text(response.text)
+        except RequestException:
+            texts[url] = browser.get_text(url)
+    return texts
+
+
+# Pieces of the synthetic posts, with what the cleaner strips out of scraped articles
+CORPUS_WORDS = (
+    "the new phone is not as fast as the old one but battery life is great and it does not overheat while gaming "
+    "apple google microsoft released an update for their laptops with a faster chip and better display in march"
+).split()
+CORPUS_EXTRAS = [
+    "I'm",
+    "don't",
+    "it's",
+    "won't",
+    "gonna",
+    "idk",
+    "café",
+    "naïve",
+    "U.S.",
+    "$1,299",
+    "100%",
+    '"quoted"',
+    "(yes)",
+    "<b>bold</b>",
+    "<a href='https://example.com'>link</a>",
+    "https://www.theverge.com/2024/1/1/review",
+    "www.reddit.com/r/tech",
+    "press@example.com",
+    "?",
+    "!!",
+    "...",
+    "\n",
+]
+
+
+def make_synthetic_corpus(n_docs: int, words_per_doc: int = 120, seed: int = 0):
+    # Titles followed by article text, about one word in eight needing more than lowercasing
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        n_words = rng.randint(words_per_doc // 2, words_per_doc * 3 // 2)
+        words = [
+            rng.choice(CORPUS_EXTRAS) if rng.random() < 0.125 else rng.choice(CORPUS_WORDS) for _ in range(n_words)
+        ]
+        docs.append(" ".join(words).capitalize())
+    return docs
+
+
+def legacy_clean_text(text):
+    # `TextCleaner.clean_text` before it was fused, one regex pass per step
+    text = "".join(c for c in unicodedata.normalize("NFD", text.lower().strip()) if unicodedata.category(c) != "Mn")
+    text = re.sub(r"[a-zA-Z0-9_\-\.]+@[a-zA-Z0-9_\-\.]+\.[a-zA-Z]{2,5}", " ", text)
+    text = re.sub(r"\bhttps?:\/\/\S+|www\.\S+", " ", text)
+    text = re.sub(r"<.*?>", "", text)
+    text = TextCleaner.expand_contractions(text)
+    text = re.sub(r"([?.!,¿])", r" \1 ", text)
+    text = re.sub(r'[" "]+', " ", text)
+    text = re.sub(r"[^a-zA-Z\s]+", "", text)
+    text = re.sub(" +", " ", text)
+    return text.strip()
+
+
+def legacy_preprocess_texts(texts):
+    # `TextPreprocessor.preprocess_text` before the set based filter, an alternation of all the stopwords
+    pattern = TextPreprocessor.get_stopwords_pattern()
+    return [pattern.sub("", text) for text in texts]
+
+
+def legacy_load_embeddings(rows):
+    # `crud.fetch_posts_embeddings` with the JSON column: parsed by the column type then again from the dumped string,
+    # one pydantic model per row, stacked into a matrix afterwards
+    embeddings = [
+        schema.EmbeddingData(
+            reddit_post_id=id, embedding_array=np.array(list(json.loads(json.loads(value))), dtype=float)
+        )
+        for id, value in rows
+    ]
+    return [m.reddit_post_id for m in embeddings], np.stack([m.embedding_array for m in embeddings])
+
+
+def report(name: str, results: dict):
+    logger.info(f"Benchmark '{name}':\n{pretty_repr(results)}")
+
+
+########################################################################################################################
+# Benchmarks
+########################################################################################################################
+def bench_fetch(args):
+    servers = {name: FixtureServer(domain["delay"], domain["status"]) for name, domain in FIXTURE_DOMAINS.items()}
+    for server in servers.values():
+        server.__enter__()
+
+    try:
+        urls = make_listing(servers, args.posts)
+        results = {"posts": len(urls), "domains": {name: server.url for name, server in servers.items()}}
+
+        def run(name, fetch):
+            start = time.perf_counter()
+            texts = fetch()
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "seconds": seconds,
+                "posts_per_minute": len(urls) / seconds * 60,
+                "articles": sum(bool(text) for text in texts.values()),
+            }
+
+        if args.sequential:
+            browser = SimulatedBrowserPool(1, args.browser_seconds)
+            run("sequential", lambda: sequential_fetch(urls, browser))
+            results["sequential"]["browser_pages"] = browser.pages
+
+        browser = SimulatedBrowserPool(args.browsers, args.browser_seconds)
+        fetcher = ArticleFetcher(
+            fallback=browser,
+            max_workers=args.max_workers,
+            per_domain=args.per_domain,
+            timeout=args.timeout,
+            fallback_queue_size=args.queue_size,
+        )
+        run("pooled", lambda: fetcher.fetch_all(urls))
+        results["pooled"]["browser_pages"] = browser.pages
+        fetcher.session.close()
+    finally:
+        for server in servers.values():
+            server.__exit__()
+
+    if args.sequential:
+        results["speedup"] = results["pooled"]["posts_per_minute"] / results["sequential"]["posts_per_minute"]
+    report("fetch", results)
+
+
+def bench_exists(args):
+    # Imported here as they connect to the configured database
+    import crud
+    import model
+    from database import engine, get_db
+    from sqlalchemy import event
+
+    db = get_db()
+    stored_ids = [post.id for post in db.query(model.RedditPostNew.id).limit(args.stored)]
+    listing = stored_ids + [f"bench{i}" for i in range(args.posts - len(stored_ids))]
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, *event_args):
+        statements.append(statement)
+
+    def run(name, dedupe):
+        # Statements sent and time spent to find the new posts of one listing
+        statements.clear()
+        start = time.perf_counter()
+        new_ids = dedupe()
+        results[name] = {
+            "round_trips": len(statements),
+            "seconds": time.perf_counter() - start,
+            "new_posts": len(new_ids),
+        }
+
+    def batched_dedupe():
+        existing_ids = crud.get_existing_post_ids(listing, db)
+        return [id for id in listing if id not in existing_ids]
+
+    results = {"posts": len(listing), "stored_posts": len(stored_ids)}
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        run("per_post", lambda: [id for id in listing if not crud.post_exists(id, db)])
+        run("batched", batched_dedupe)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+        db.close()
+
+    report("exists", results)
+
+
+def bench_clean(args):
+    docs = make_synthetic_corpus(args.docs, args.words)
+    results = {"docs": len(docs), "words": sum(doc.count(" ") + 1 for doc in docs)}
+
+    def run(name, clean, preprocess):
+        start = time.perf_counter()
+        cleaned = clean(docs)
+        clean_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        preprocessed = preprocess(cleaned)
+        preprocess_seconds = time.perf_counter() - start
+        results[name] = {
+            "clean_seconds": clean_seconds,
+            "preprocess_seconds": preprocess_seconds,
+            "docs_per_second": len(docs) / (clean_seconds + preprocess_seconds),
+        }
+        return cleaned, preprocessed
+
+    legacy = run("legacy", lambda docs: [legacy_clean_text(doc) for doc in docs], legacy_preprocess_texts)
+    fused = run("fused", TextCleaner.clean_texts, TextPreprocessor.preprocess_texts)
+    results["speedup"] = results["fused"]["docs_per_second"] / results["legacy"]["docs_per_second"]
+
+    # The outputs of the legacy pipeline are the golden outputs, the fused one must match every document
+    mismatches = [i for i in range(len(docs)) if (legacy[0][i], legacy[1][i]) != (fused[0][i], fused[1][i])]
+    results["mismatched_docs"] = len(mismatches)
+    report("clean", results)
+    if mismatches:
+        logger.error(f"Outputs differ from the legacy pipeline, first on: {docs[mismatches[0]]!r}")
+        sys.exit(1)
+
+
+def bench_embed(args):
+    docs = TextPreprocessor.preprocess_texts(TextCleaner.clean_texts(make_synthetic_corpus(args.docs, seed=1)))
+    rows = [(f"post{i}", doc) for i, doc in enumerate(docs)]
+
+    def iter_pages():
+        # Stands in for `crud.iter_ids_and_content`
+        for start in range(0, len(rows), args.page_size):
+            yield rows[start : start + args.page_size]
+
+    results = {"docs": len(rows), "page_size": args.page_size, "cpus": os.cpu_count()}
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Same settings as `doc2vec.model_train_save`, inference runs as many epochs as training
+        model_path = os.path.join(model_dir, "bench_embeddings")
+        corpus = tag_page(rows[: args.train_docs])
+        model = Doc2Vec(vector_size=200, min_count=5, epochs=args.epochs)
+        model.build_vocab(corpus)
+        model.train(corpus, total_examples=model.corpus_count, epochs=model.epochs)
+        model.save(model_path)
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            pages = map_pages(infer_page, iter_pages(), workers, init_worker, (model_path,))
+            n_docs = sum(len(page) for page in pages)
+            seconds = time.perf_counter() - start
+            results[f"workers_{workers}"] = {"seconds": seconds, "docs_per_second": n_docs / seconds}
+
+    baseline = results[f"workers_{args.workers[0]}"]["docs_per_second"]
+    for workers in args.workers:
+        results[f"workers_{workers}"]["speedup"] = results[f"workers_{workers}"]["docs_per_second"] / baseline
+    report("embed", results)
+
+
+def bench_load(args):
+    # SQLite stands in for MySQL, both return the rows as (id, JSON text) or (id, bytes) tuples
+    rng = np.random.default_rng(0)
+    n_legacy = min(args.legacy_vectors, args.vectors)
+    results = {"vectors": args.vectors, "dimension": args.dimension, "legacy_vectors": n_legacy}
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        connection = sqlite3.connect(os.path.join(db_dir, "embeddings.db"))
+        connection.execute("CREATE TABLE binary_vectors (reddit_post_id TEXT PRIMARY KEY, vector BLOB)")
+        connection.execute("CREATE TABLE json_vectors (reddit_post_id TEXT PRIMARY KEY, embedding TEXT)")
+        for start in range(0, args.vectors, 10_000):
+            vectors = rng.standard_normal((min(10_000, args.vectors - start), args.dimension), dtype="float32")
+            ids = [f"post{start + i}" for i in range(len(vectors))]
+            connection.executemany(
+                "INSERT INTO binary_vectors VALUES (?, ?)", zip(ids, map(encode_embedding, vectors))
+            )
+            if start < n_legacy:
+                rows = [(id, json.dumps(json.dumps(vector.tolist()))) for id, vector in zip(ids, vectors)]
+                connection.executemany("INSERT INTO json_vectors VALUES (?, ?)", rows[: n_legacy - start])
+        connection.commit()
+
+        for name, table, column in [("json", "json_vectors", "embedding"), ("binary", "binary_vectors", "vector")]:
+            results[f"{name}_bytes_per_vector"] = connection.execute(
+                f"SELECT AVG(LENGTH({column})) FROM {table}"
+            ).fetchone()[0]
+
+        start = time.perf_counter()
+        _, legacy_matrix = legacy_load_embeddings(connection.execute("SELECT * FROM json_vectors").fetchall())
+        legacy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = connection.execute("SELECT * FROM binary_vectors").fetchall()
+        ids, matrix = [row[0] for row in rows], decode_embeddings([row[1] for row in rows])
+        binary_seconds = time.perf_counter() - start
+        connection.close()
+
+    # The JSON embeddings don't fit in memory for large runs, their load time is extrapolated from the ones loaded
+    results["json_seconds"] = legacy_seconds * args.vectors / n_legacy
+    results["json_seconds_extrapolated"] = n_legacy < args.vectors
+    results["binary_seconds"] = binary_seconds
+    results["speedup"] = results["json_seconds"] / binary_seconds
+    results["identical"] = bool((legacy_matrix == matrix[:n_legacy]).all())
+    results["matrix_c_contiguous"] = bool(matrix.flags["C_CONTIGUOUS"])
+    report("load", results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Reddit scraper")
+    subparsers = parser.add_subparsers(dest="benchmark", help="Available benchmarks")
+
+    # Subparser for the "fetch" benchmark
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="Compare sequential and pooled article fetching posts/minute on slow and failing domains"
+    )
+    fetch_parser.add_argument("--posts", type=int, default=50, help="Number of posts in the listing")
+    fetch_parser.add_argument("--max_workers", type=int, default=16, help="Concurrent requests")
+    fetch_parser.add_argument("--per_domain", type=int, default=4, help="Concurrent requests per domain")
+    fetch_parser.add_argument("--timeout", type=float, default=5.0, help="Pooled request timeout seconds")
+    fetch_parser.add_argument("--browsers", type=int, default=2, help="Browsers serving the fallback queue")
+    fetch_parser.add_argument("--browser_seconds", type=float, default=2.0, help="Simulated browser page load seconds")
+    fetch_parser.add_argument("--queue_size", type=int, default=20, help="Fallback queue size")
+    fetch_parser.add_argument(
+        "--no_sequential", dest="sequential", action="store_false", help="Skip the sequential baseline"
+    )
+
+    # Subparser for the "exists" benchmark
+    exists_parser = subparsers.add_parser(
+        "exists", help="Compare database round trips of per post and batched existence checks of a listing"
+    )
+    exists_parser.add_argument("--posts", type=int, default=50, help="Number of posts in the listing")
+    exists_parser.add_argument("--stored", type=int, default=40, help="Posts of the listing already stored")
+
+    # Subparser for the "clean" benchmark
+    clean_parser = subparsers.add_parser(
+        "clean", help="Compare legacy and fused text cleaning docs/second and check their outputs are identical"
+    )
+    clean_parser.add_argument("--docs", type=int, default=100_000, help="Number of synthetic documents")
+    clean_parser.add_argument("--words", type=int, default=120, help="Average words per document")
+
+    # Subparser for the "embed" benchmark
+    embed_parser = subparsers.add_parser(
+        "embed", help="Compare docs/second of the Doc2Vec inference stage for different numbers of worker processes"
+    )
+    embed_parser.add_argument("--docs", type=int, default=20_000, help="Number of synthetic documents to embed")
+    embed_parser.add_argument("--train_docs", type=int, default=2_000, help="Documents the model is trained on")
+    embed_parser.add_argument("--epochs", type=int, default=60, help="Training and inference epochs")
+    embed_parser.add_argument("--page_size", type=int, default=1000, help="Documents per page")
+    embed_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts")
+
+    # Subparser for the "load" benchmark
+    load_parser = subparsers.add_parser(
+        "load", help="Compare load times of JSON and binary embeddings from a SQLite stand-in of the database"
+    )
+    load_parser.add_argument("--vectors", type=int, default=1_000_000, help="Number of embeddings")
+    load_parser.add_argument("--dimension", type=int, default=200, help="Embedding dimension")
+    load_parser.add_argument(
+        "--legacy_vectors", type=int, default=100_000, help="JSON embeddings loaded, the rest is extrapolated"
+    )
+
+    args = parser.parse_args()
+    if args.benchmark == "fetch":
+        bench_fetch(args)
+    elif args.benchmark == "exists":
+        bench_exists(args)
+    elif args.benchmark == "clean":
+        bench_clean(args)
+    elif args.benchmark == "embed":
+        bench_embed(args)
+    elif args.benchmark == "load":
+        bench_load(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
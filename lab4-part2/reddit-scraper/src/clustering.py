@@ -1,8 +1,7 @@
 import pickle
 
 import numpy as np
-import pandas as pd
-from crud import fetch_posts_embeddings
+from crud import fetch_embedding_matrix
 from database import get_db
 from settings import Path, config
 from sklearn.cluster import KMeans
@@ -17,10 +16,10 @@ def load_kmeans_model():
 
 
 def train_save_kmeans():
-    embeddings = fetch_posts_embeddings(db)
-    embeddings = pd.DataFrame([m.model_dump() for m in embeddings])
+    _, embeddings = fetch_embedding_matrix(db)
 
-    X_train = np.stack(embeddings["embedding_array"])
+    # Inferred vectors are float64, as the embeddings used to be once read from JSON
+    X_train = embeddings.astype(float)
 
     kmeans_model = KMeans(random_state=config.RANDOM_STATE, n_clusters=config.OPTIMAL_CLUSTERS, n_init="auto")
     kmeans_model.fit(X_train)
@@ -1,7 +1,9 @@
 from typing import List
 import model
 import schema
+from embeddings import decode_embeddings
 from settings import get_logger
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.orm import Session
 
 logger = get_logger(__file__)
@@ -50,44 +52,82 @@ def post_exists(id: str, db: Session):
     return False
 
 
-def get_all_ids_and_content(db: Session):
+def get_existing_post_ids(ids: List[str], db: Session):
     """
-    Retrieve IDs and content of the latest 10 documents from the RedditPostNew table.
+    Ids among `ids` of the posts already in the database, looked up with a single query.
 
     Args:
+        ids (List[str]): Reddit post ids, e.g. all the posts of a listing.
         db (Session): SQLAlchemy database session.
     """
-    posts = db.query(model.RedditPostNew.id, model.RedditPostNew.content).all()
+    if not ids:
+        return set()
+    posts = db.query(model.RedditPostNew.id).filter(model.RedditPostNew.id.in_(ids)).all()
+    return {post.id for post in posts}
 
-    # Create a list of dictionaries containing IDs and content of each post
-    posts_with_ids_and_content = [
-        schema.RedditPostTextModel(id=post.id, content=post.content) for post in posts if post.content
-    ]
-    return posts_with_ids_and_content
 
+def iter_ids_and_content(db: Session, page_size: int = 1000):
+    """
+    Pages of (id, content) of the posts with content, read by id ranges so the table is never loaded at once.
 
-def bulk_insert_embeddings(requests: List[schema.EmbeddingsModel], db: Session):
-    new_posts = []
+    Args:
+        db (Session): SQLAlchemy database session.
+        page_size (int): Posts read per query.
+    """
+    last_id = ""
+    while True:
+        posts = (
+            db.query(model.RedditPostNew.id, model.RedditPostNew.content)
+            .filter(model.RedditPostNew.id > last_id)
+            .order_by(model.RedditPostNew.id)
+            .limit(page_size)
+            .all()
+        )
+        if not posts:
+            return
+        last_id = posts[-1].id
+        page = [(post.id, post.content) for post in posts if post.content]
+        if page:
+            yield page
 
-    for np in requests:
-        new_post = model.EmbeddingVector(**np.model_dump())
-        new_posts.append(new_post)
 
-    db.bulk_save_objects(new_posts)
+def upsert_embeddings(embeddings: List[dict], db: Session):
+    """
+    Insert embeddings in a single statement, replacing the ones of posts embedded already.
+
+    Args:
+        embeddings (List[dict]): Rows with the `reddit_post_id` and encoded `vector` of a post.
+        db (Session): SQLAlchemy database session.
+    """
+    statement = insert(model.EmbeddingVector).values(embeddings)
+    statement = statement.on_duplicate_key_update(vector=statement.inserted.vector)
+    db.execute(statement)
     db.commit()
 
-    logger.info(f"Successfully added '{len(new_posts)}' embeddings to the database")
-    return new_posts
+
+def fetch_embedding_matrix(db: Session):
+    """
+    Ids of the embedded posts and their embeddings as one (n, dimension) float32 matrix, in the same order.
+
+    Rows without a binary vector, not migrated yet or without any embedding, are left out.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+    """
+    posts = (
+        db.query(model.EmbeddingVector.reddit_post_id, model.EmbeddingVector.vector)
+        .filter(model.EmbeddingVector.vector.isnot(None))
+        .all()
+    )
+    ids = [post.reddit_post_id for post in posts]
+    return ids, decode_embeddings([post.vector for post in posts])
 
 
 def fetch_posts_embeddings(db: Session):
-    embeddings_list = db.query(model.EmbeddingVector.reddit_post_id, model.EmbeddingVector.embedding).all()
+    ids, matrix = fetch_embedding_matrix(db)
 
-    # Create a list of dictionaries containing IDs and content of each post
-    embeddings = [
-        schema.EmbeddingsModel(reddit_post_id=post.reddit_post_id, embedding=post.embedding).get_embedding_array()
-        for post in embeddings_list
-    ]
+    # Create a list of models containing the ID and embedding of each post
+    embeddings = [schema.EmbeddingData(reddit_post_id=id, embedding_array=vector) for id, vector in zip(ids, matrix)]
     return embeddings
 
 
@@ -1,22 +1,17 @@
-import json
-from crud import get_all_ids_and_content, bulk_insert_embeddings
+import time
+from crud import iter_ids_and_content, upsert_embeddings
 from database import get_db
+from embeddings import encode_embedding
 from extract import TextCleaner, TextPreprocessor
-from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+from gensim.models.doc2vec import Doc2Vec
 from gensim.utils import simple_preprocess
-from settings import Path
+from inference import infer_page, init_worker, map_pages, tag_page
+from settings import Path, config, get_logger
 from tqdm import tqdm
-import schema
-
-db = get_db()
 
+logger = get_logger(__file__)
 
-def preprocess_docs(documents):
-    tagged_doc = []
-    for doc in tqdm(documents):
-        tokens = simple_preprocess(doc.content)
-        tagged_doc.append(TaggedDocument(words=tokens, tags=[doc.id]))
-    return tagged_doc
+db = get_db()
 
 
 def model_train_save(corpora):
@@ -30,9 +25,18 @@ def load_emb_model():
     return Doc2Vec.load(Path.embeddings_model)
 
 
-def train_embedding_generation_model():
-    documents = get_all_ids_and_content(db)
-    documents = preprocess_docs(documents)
+def preprocess_corpus(workers: int = config.EMBEDDING_WORKERS, page_size: int = config.EMBEDDING_PAGE_SIZE):
+    """
+    Training documents of all the posts, read in pages and tokenized by `workers` processes
+    """
+    tagged_doc = []
+    for page in tqdm(map_pages(tag_page, iter_ids_and_content(db, page_size), workers), unit="page"):
+        tagged_doc.extend(page)
+    return tagged_doc
+
+
+def train_embedding_generation_model(workers: int = config.EMBEDDING_WORKERS):
+    documents = preprocess_corpus(workers)
     model_train_save(documents)
     return documents
 
@@ -44,19 +48,20 @@ def get_embedding_vector(text, model):
     return model.infer_vector(text).astype(float)
 
 
-def get_emb_vect(text, model):
-    text = simple_preprocess(text)
-    return model.infer_vector(text)
-
-
-def add_to_embeddings_table():
-    documents = get_all_ids_and_content(db)
-    embeddings = []
-    model = load_emb_model()
+def add_to_embeddings_table(workers: int = config.EMBEDDING_WORKERS, page_size: int = config.EMBEDDING_PAGE_SIZE):
+    """
+    Embed all the posts with the saved model and store them, replacing the embeddings of a previous model.
 
-    for doc in tqdm(documents):
-        emb = json.dumps(get_emb_vect(doc.content, model).tolist())
-        emb_rec = schema.EmbeddingsModel(reddit_post_id=doc.id, embedding=emb)
-        embeddings.append(emb_rec)
+    Pages of posts are read from the database as `workers` processes, each loading the model once, embed them.
+    Every page is written back with a single statement.
+    """
+    n_docs, start = 0, time.perf_counter()
+    pages = iter_ids_and_content(db, page_size)
+    for embeddings in tqdm(map_pages(infer_page, pages, workers, init_worker, (Path.embeddings_model,)), unit="page"):
+        upsert_embeddings(
+            [{"reddit_post_id": id, "vector": encode_embedding(vector)} for id, vector in embeddings], db
+        )
+        n_docs += len(embeddings)
 
-    bulk_insert_embeddings(embeddings, db)
+    seconds = time.perf_counter() - start
+    logger.info(f"Added embeddings of '{n_docs}' posts with '{workers}' workers, {n_docs / seconds:.0f} docs/second")
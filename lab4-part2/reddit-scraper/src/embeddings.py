@@ -0,0 +1,53 @@
+import json
+import struct
+
+import numpy as np
+
+# Stored embeddings are a header of the format version and the dimension, followed by the float32 values
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_HEADER = struct.Struct("<HH")
+
+
+def get_record_dtype(dimension: int):
+    return np.dtype([("version", "<u2"), ("dimension", "<u2"), ("vector", "<f4", (dimension,))])
+
+
+def encode_embedding(vector):
+    vector = np.asarray(vector, dtype="<f4")
+    return EMBEDDING_HEADER.pack(EMBEDDING_FORMAT_VERSION, len(vector)) + vector.tobytes()
+
+
+def decode_embeddings(blobs):
+    """
+    Embeddings stored by `encode_embedding` as one contiguous (n, dimension) float32 matrix.
+
+    All the embeddings must have the same dimension, they are read with a single `np.frombuffer` over their
+    concatenation.
+    """
+    if not len(blobs):
+        return np.empty((0, 0), dtype="float32")
+
+    version, dimension = EMBEDDING_HEADER.unpack_from(blobs[0])
+    if version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version '{version}'")
+    record_dtype = get_record_dtype(dimension)
+    buffer = b"".join(blobs)
+    if len(buffer) != record_dtype.itemsize * len(blobs):
+        raise ValueError("Embeddings have different dimensions")
+
+    records = np.frombuffer(buffer, dtype=record_dtype)
+    if (records["version"] != version).any() or (records["dimension"] != dimension).any():
+        raise ValueError("Embeddings have different versions or dimensions")
+    return np.ascontiguousarray(records["vector"], dtype="float32")
+
+
+def decode_embedding(blob):
+    return decode_embeddings([blob])[0]
+
+
+def parse_json_embedding(value):
+    # Legacy JSON column, the vectors were serialized with `json.dumps` before being stored as JSON again
+    vector = json.loads(value) if isinstance(value, (str, bytes)) else value
+    if isinstance(vector, str):
+        vector = json.loads(vector)
+    return vector
@@ -1,17 +1,16 @@
 import re
+import threading
 import unicodedata
 import warnings
 
 import contractions
 import nltk
-import requests
-from bs4 import BeautifulSoup
 from chromedriver_py import binary_path
+from fetch import html_to_text
 from nltk.corpus import stopwords, wordnet
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import word_tokenize
 from rake_nltk import Rake
-from requests.exceptions import RequestException
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.chrome.options import Options
@@ -19,7 +18,7 @@ from selenium.webdriver.chrome.options import Options
 # from selenium.webdriver.common.by import By
 # from selenium.webdriver.support import expected_conditions as EC
 # from selenium.webdriver.support.ui import WebDriverWait
-from settings import get_logger
+from settings import config, get_logger
 
 warnings.filterwarnings("ignore")
 nltk.download("stopwords", quiet=True)
@@ -29,10 +28,34 @@ nltk.download("averaged_perceptron_tagger", quiet=True)
 logger = get_logger(__file__)
 
 
+EMAIL_PATTERN = re.compile(r"[a-zA-Z0-9_\-\.]+@[a-zA-Z0-9_\-\.]+\.[a-zA-Z]{2,5}")
+URL_PATTERN = re.compile(r"\bhttps?:\/\/\S+|www\.\S+")
+HTML_TAG_PATTERN = re.compile(r"<.*?>")
+# Punctuation and double quotes end up as spaces between the words around them
+SEPARATORS = str.maketrans({c: " " for c in '?.!,¿"'})
+NON_ALPHA_PATTERN = re.compile(r"[^a-zA-Z\s]+")
+SPACES_PATTERN = re.compile(r"  +")
+WORD_PATTERN = re.compile(r"(\w+)")
+
+
+class NonspacingMarks(dict):
+    """
+    `str.translate` table removing nonspacing marks, filled in with the characters seen so far
+    """
+
+    def __missing__(self, codepoint):
+        self[codepoint] = None if unicodedata.category(chr(codepoint)) == "Mn" else codepoint
+        return self[codepoint]
+
+
 class TextCleaner:
+    nonspacing_marks = NonspacingMarks()
+
     @staticmethod
     def unicode_to_ascii(s):
-        return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+        if s.isascii():
+            return s
+        return unicodedata.normalize("NFD", s).translate(TextCleaner.nonspacing_marks)
 
     @staticmethod
     def expand_contractions(text):
@@ -40,49 +63,50 @@ class TextCleaner:
 
     @staticmethod
     def remove_email_addresses(text):
-        return re.sub(r"[a-zA-Z0-9_\-\.]+@[a-zA-Z0-9_\-\.]+\.[a-zA-Z]{2,5}", " ", text)
+        return EMAIL_PATTERN.sub(" ", text) if "@" in text else text
 
     @staticmethod
     def remove_urls(text):
-        return re.sub(r"\bhttps?:\/\/\S+|www\.\S+", " ", text)
+        return URL_PATTERN.sub(" ", text) if "http" in text or "www." in text else text
 
     @staticmethod
     def remove_html_tags(text):
-        return re.sub(r"<.*?>", "", text)
+        return HTML_TAG_PATTERN.sub("", text) if "<" in text else text
 
     @staticmethod
     def clean_text(text):
         text = TextCleaner.unicode_to_ascii(text.lower().strip())
-        # replacing email addresses with empty string
+        # replacing email addresses, urls and HTML tags, skipped when the text can't contain any
         text = TextCleaner.remove_email_addresses(text)
-        # replacing urls with empty string
         text = TextCleaner.remove_urls(text)
-        # Remove HTML tags
         text = TextCleaner.remove_html_tags(text)
         # Expand contraction for eg., wouldn't => would not
         text = TextCleaner.expand_contractions(text)
-        # creating a space between a word and the punctuation following it
-        text = re.sub(r"([?.!,¿])", r" \1 ", text)
-        text = re.sub(r'[" "]+', " ", text)
-        # removes all non-alphabetical characters
-        text = re.sub(r"[^a-zA-Z\s]+", "", text)
-        # remove extra spaces
-        text = re.sub(" +", " ", text)
-        text = text.strip()
-        return text
+        # removes all non-alphabetical characters and extra spaces
+        text = NON_ALPHA_PATTERN.sub("", text.translate(SEPARATORS))
+        text = SPACES_PATTERN.sub(" ", text)
+        return text.strip()
+
+    @staticmethod
+    def clean_texts(texts):
+        return [TextCleaner.clean_text(text) for text in texts]
 
 
 class TextPreprocessor:
     lemmatizer = WordNetLemmatizer()
 
     @staticmethod
-    def get_stopwords_pattern():
+    def get_stopwords():
         # Stopword list
         og_stopwords = set(stopwords.words("english"))
 
         # Define a list of negative words to remove
         neg_words = ["no", "not", "nor", "neither", "none", "never", "nobody", "nowhere"]
-        custom_stopwords = [word for word in og_stopwords if word not in neg_words]
+        return {word for word in og_stopwords if word not in neg_words}
+
+    @staticmethod
+    def get_stopwords_pattern():
+        custom_stopwords = TextPreprocessor.get_stopwords()
         pattern = re.compile(r"\b(" + r"|".join(custom_stopwords) + r")\b\s*")
         return pattern
 
@@ -112,15 +136,27 @@ class TextPreprocessor:
         lemmatized_words = [TextPreprocessor.lemmatizer.lemmatize(word) for word in words]
         return " ".join(lemmatized_words)
 
-    pattern = get_stopwords_pattern()
+    stopword_set = get_stopwords()
 
     @staticmethod
     def preprocess_text(text):
-        # replacing all the stopwords
-        text = TextPreprocessor.pattern.sub("", text)
+        """
+        Remove the stopwords of a text cleaned by `TextCleaner.clean_text` and the whitespace following them
+        """
+        # Words and the text between them alternate, starting and ending with the text between
+        parts = WORD_PATTERN.split(text)
+        for i in range(1, len(parts), 2):
+            if parts[i] in TextPreprocessor.stopword_set:
+                parts[i] = ""
+                parts[i + 1] = parts[i + 1].lstrip()
+        text = "".join(parts)
         # text = TextPreprocessor.lemmatize_text(text)
         return text
 
+    @staticmethod
+    def preprocess_texts(texts):
+        return [TextPreprocessor.preprocess_text(text) for text in texts]
+
 
 def add_driver_options(options):
     """
@@ -152,30 +188,80 @@ def initialize_driver():
     return driver
 
 
-def get_text(url, driver):
-    headers = {"User-Agent": "DSCI560-Lab4"}
-    logger.info(f"Scraping text data from '{url}'")
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "lxml")
+class BrowserPool:
+    """
+    Headless browsers started on first use and reused for every page loaded after
+    """
+
+    def __init__(self, size: int = config.BROWSER_POOL_SIZE):
+        self.size = size
+        self.started = 0
+        self.starting = 0
+        self.available = threading.Condition()
+        self.drivers = []
+
+    def acquire(self):
+        with self.available:
+            while not self.drivers and self.started + self.starting >= self.size:
+                self.available.wait()
+            if self.drivers:
+                return self.drivers.pop()
+            # Browsers being started hold their place, so concurrent callers don't start more than `size`
+            self.starting += 1
+
+        driver = None
+        try:
+            driver = initialize_driver()
+            return driver
+        finally:
+            with self.available:
+                self.starting -= 1
+                if driver is not None:
+                    self.started += 1
+                # A browser that failed to start frees its place for a waiting caller
+                self.available.notify()
+
+    def release(self, driver):
+        with self.available:
+            self.drivers.append(driver)
+            self.available.notify()
 
-    except RequestException as e:
-        logger.error(f"Failed to fetch URL: '{url}', Error: {e}. Trying with Selenium...")
+    def discard(self, driver):
+        # A crashed browser frees its place, so a waiting caller can start a new one
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.available:
+            self.started -= 1
+            self.available.notify()
+
+    def get_text(self, url):
+        try:
+            driver = self.acquire()
+        except Exception as e:
+            logger.error(f"Failed to start a browser for URL: '{url}', Error: {e}")
+            return ""
 
         try:
             driver.get(url)
             # WebDriverWait(driver, 60).until(EC.visibility_of_element_located((By.TAG_NAME, "p")))
-            soup = BeautifulSoup(driver.page_source, "lxml")
-
+            return html_to_text(driver.page_source)
         except WebDriverException:
             logger.error(f"Failed to fetch URL: '{url}'")
+            self.discard(driver)
+            driver = None
             return ""
+        finally:
+            if driver is not None:
+                self.release(driver)
 
-    elements = soup.find_all("p")
-    all_text = [element.get_text() for element in elements]
-    text = " ".join(all_text)
-    return text
+    def close(self):
+        with self.available:
+            drivers, self.drivers = self.drivers, []
+            self.started = 0
+        for driver in drivers:
+            driver.quit()
 
 
 def extract_keywords(text, topn: int = 10):
@@ -0,0 +1,179 @@
+import queue
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from settings import config, get_logger
+
+logger = get_logger(__file__)
+
+USER_AGENT = "DSCI560-Lab4"
+
+
+def html_to_text(html):
+    soup = BeautifulSoup(html, "lxml")
+    return " ".join(element.get_text() for element in soup.find_all("p"))
+
+
+def get_domain(url):
+    # Host and port, servers on other ports of a host are limited separately
+    return urlsplit(url).netloc.lower()
+
+
+def create_session(pool_size: int = config.FETCH_MAX_WORKERS):
+    """
+    Session keeping up to `pool_size` connections open per host, reused across requests
+    """
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def interleave_domains(urls):
+    """
+    Order urls round robin over their domains, so workers waiting on a busy domain don't hold up the others
+    """
+    by_domain = defaultdict(deque)
+    for url in urls:
+        by_domain[get_domain(url)].append(url)
+    ordered = []
+    while by_domain:
+        for domain in list(by_domain):
+            ordered.append(by_domain[domain].popleft())
+            if not by_domain[domain]:
+                del by_domain[domain]
+    return ordered
+
+
+class DomainLimiter:
+    """
+    Semaphore per domain allowing at most `limit` concurrent requests to it
+    """
+
+    def __init__(self, limit: int = config.FETCH_PER_DOMAIN_LIMIT):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.semaphores = {}
+
+    def __call__(self, url):
+        domain = get_domain(url)
+        with self.lock:
+            if domain not in self.semaphores:
+                self.semaphores[domain] = threading.BoundedSemaphore(self.limit)
+            return self.semaphores[domain]
+
+
+class ArticleFetcher:
+    """
+    Download the text of linked articles concurrently.
+
+    Requests share one pooled session and at most `per_domain` of them run against a domain at once.
+    Pages that fail to download are queued for `fallback`, e.g. a `BrowserPool`, served by as many
+    threads as it has browsers. The queue is bounded, pages that don't fit are given up on.
+    """
+
+    def __init__(
+        self,
+        fallback=None,
+        session=None,
+        max_workers: int = config.FETCH_MAX_WORKERS,
+        per_domain: int = config.FETCH_PER_DOMAIN_LIMIT,
+        timeout: float = config.FETCH_TIMEOUT,
+        fallback_queue_size: int = config.FETCH_FALLBACK_QUEUE_SIZE,
+    ):
+        self.fallback = fallback
+        self.session = session or create_session(max_workers)
+        self.max_workers = max_workers
+        self.limiter = DomainLimiter(per_domain)
+        self.timeout = timeout
+        self.fallback_queue_size = fallback_queue_size
+
+    def fetch(self, url):
+        """
+        Text of the page at `url`, or None if it could not be downloaded
+        """
+        logger.info(f"Scraping text data from '{url}'")
+        try:
+            with self.limiter(url):
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                return html_to_text(response.text)
+        except RequestException as e:
+            logger.error(f"Failed to fetch URL: '{url}', Error: {e}")
+            return None
+
+    def _serve_fallback(self, fallback_queue, texts):
+        while True:
+            url = fallback_queue.get()
+            if url is None:
+                return
+            logger.info(f"Trying '{url}' with a browser...")
+            try:
+                texts[url] = self.fallback.get_text(url)
+            except Exception as e:
+                # The thread keeps serving the queue, `fetch_all` waits for it to take every url
+                logger.error(f"Failed to fetch URL: '{url}' with a browser, Error: {e}")
+
+    @staticmethod
+    def _stop_fallback(fallback_queue, fallback_threads):
+        for _ in fallback_threads:
+            # Waits for room in the queue only as long as a thread is left to make it
+            while any(thread.is_alive() for thread in fallback_threads):
+                try:
+                    fallback_queue.put(None, timeout=1)
+                    break
+                except queue.Full:
+                    pass
+
+    def fetch_all(self, urls):
+        """
+        Texts of the pages at `urls` as a dict of url -> text, empty for pages that could not be fetched
+        """
+        urls = interleave_domains(dict.fromkeys(urls))
+        texts = {}
+        if not urls:
+            return texts
+
+        fallback_queue = queue.Queue(maxsize=self.fallback_queue_size)
+        fallback_threads = []
+        if self.fallback is not None:
+            for _ in range(self.fallback.size):
+                thread = threading.Thread(target=self._serve_fallback, args=(fallback_queue, texts), daemon=True)
+                thread.start()
+                fallback_threads.append(thread)
+
+        def fetch_one(url):
+            try:
+                text = self.fetch(url)
+            except Exception as e:
+                # E.g. a malformed url or a page that cannot be parsed, a browser won't do better
+                logger.error(f"Failed to fetch URL: '{url}', Error: {e}")
+                texts[url] = ""
+                return
+            if text is not None:
+                texts[url] = text
+                return
+            texts[url] = ""
+            if fallback_threads:
+                try:
+                    fallback_queue.put_nowait(url)
+                except queue.Full:
+                    logger.error(f"Browser queue is full, giving up on '{url}'")
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+                list(executor.map(fetch_one, urls))
+        finally:
+            # Fallback threads hold browsers of the pool, they must not outlive this call
+            self._stop_fallback(fallback_queue, fallback_threads)
+            for thread in fallback_threads:
+                thread.join()
+        return texts
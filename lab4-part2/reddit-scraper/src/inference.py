@@ -0,0 +1,52 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+from gensim.utils import simple_preprocess
+
+# Embedding model of the current process, loaded once by `init_worker`. Workers only import this module, not the
+# database ones, so they don't connect to the database
+worker_model = None
+
+
+def init_worker(model_path):
+    global worker_model
+    worker_model = Doc2Vec.load(model_path)
+
+
+def tag_page(page):
+    """
+    Training documents of a page of (id, content) rows
+    """
+    return [TaggedDocument(words=simple_preprocess(content), tags=[id]) for id, content in page]
+
+
+def infer_page(page):
+    """
+    Embedding vectors of a page of (id, content) rows as (id, vector) pairs, using the model of the process
+    """
+    return [(id, worker_model.infer_vector(simple_preprocess(content))) for id, content in page]
+
+
+def map_pages(fn, pages, workers: int, initializer=None, initargs=()):
+    """
+    Results of `fn` over every page in order, computed by `workers` processes.
+
+    At most two pages per worker are in flight, so pages are read as the workers need them rather than all at once.
+    With a single worker everything runs in this process.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for page in pages:
+            yield fn(page)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque()
+        for page in pages:
+            pending.append(executor.submit(fn, page))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
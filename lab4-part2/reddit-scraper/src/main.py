@@ -10,7 +10,8 @@ import schema
 from clustering import infer_clusters, load_kmeans_model
 from database import get_db
 from doc2vec import get_embedding_vector, load_emb_model
-from extract import TextCleaner, TextPreprocessor, extract_keywords, get_text, initialize_driver
+from extract import BrowserPool, TextCleaner, TextPreprocessor, extract_keywords
+from fetch import ArticleFetcher
 from settings import config, get_logger
 
 logger = get_logger(__file__)
@@ -31,9 +32,9 @@ def initialize_reddit_client():
     )
 
 
-def create_submission_dict(submission, driver):
+def create_submission_dict(submission, raw_content):
     """
-    Create a dictionary representing a Reddit submission.
+    Create a dictionary representing a Reddit submission and the text of the page it links to.
     """
     submission_dict = {
         "id": submission.id,
@@ -56,7 +57,6 @@ def create_submission_dict(submission, driver):
     if hasattr(submission, "preview"):
         submission_dict["preview"] = submission.preview["images"][0]["source"]["url"]
 
-    raw_content = get_text(submission_dict["url"], driver)
     submission_dict["content"] = TextCleaner.clean_text(submission_dict["title"] + " " + raw_content)
     submission_dict["keywords"] = ",".join(extract_keywords(submission_dict["content"]))
     submission_dict["content"] = TextPreprocessor.preprocess_text(submission_dict["content"])
@@ -69,44 +69,50 @@ def validate_post_data(submission_dict):
     return schema.RedditPostModelNew(**submission_dict)
 
 
-def scrape_subreddit_posts(subreddit_name):
+def scrape_subreddit_posts(subreddit_name, fetcher):
     """
     Scrape posts from a subreddit.
     """
-    driver = initialize_driver()
     reddit = initialize_reddit_client()
     subreddit = reddit.subreddit(subreddit_name)
 
     post_data_list = []  # List to store post data
 
-    for submission in subreddit.new(limit=50):
-        try:
-            if not crud.post_exists(submission.id, db):
-                # Process each submission here
-                submission_dict = create_submission_dict(submission, driver)
-
-                post_data = validate_post_data(submission_dict)
-
-                # Append post data to the list
-                logger.info(
-                    f"Post with id '{submission.id}' not found in the database. Post data has been extracted,"
-                    " processed, and added to the update queue."
-                )
-                post_data_list.append(post_data)
-
-        except praw.exceptions.APIException as e:
-            # Handle rate limit exceeded error
-            if e.error_type == "RATELIMIT":
-                # Sleep for the recommended time specified by Reddit's API
-                logger.error("Rate limit exceeded. Sleeping for '{}' seconds.".format(e.sleep_time))
-                time.sleep(e.sleep_time)
-                continue
-            else:
-                # Handle other API exceptions
-                logger.exception("API Exception:", e)
-                continue
-
-    driver.close()
+    try:
+        submissions = list(subreddit.new(limit=50))
+
+    except praw.exceptions.APIException as e:
+        # Handle rate limit exceeded error
+        if e.error_type == "RATELIMIT":
+            # Sleep for the recommended time specified by Reddit's API
+            logger.error("Rate limit exceeded. Sleeping for '{}' seconds.".format(e.sleep_time))
+            time.sleep(e.sleep_time)
+        else:
+            # Handle other API exceptions
+            logger.exception("API Exception:", e)
+        return
+
+    # Look up which posts of the listing are stored already in one query, before processing any of them
+    existing_ids = crud.get_existing_post_ids([submission.id for submission in submissions], db)
+    if existing_ids:
+        logger.info(f"'{len(existing_ids)}' of the '{len(submissions)}' latest posts are already in the database")
+    new_submissions = [submission for submission in submissions if submission.id not in existing_ids]
+
+    # Download the linked articles of all the new posts at once
+    articles = fetcher.fetch_all([submission.url for submission in new_submissions])
+
+    for submission in new_submissions:
+        # Process each submission here
+        submission_dict = create_submission_dict(submission, articles[submission.url])
+
+        post_data = validate_post_data(submission_dict)
+
+        # Append post data to the list
+        logger.info(
+            f"Post with id '{submission.id}' not found in the database. Post data has been extracted,"
+            " processed, and added to the update queue."
+        )
+        post_data_list.append(post_data)
 
     # Perform bulk insertion of post data
     if len(post_data_list) > 0:
@@ -120,11 +126,18 @@ def background_task(subreddit_name, interval_minutes, stop_event):
     """
     Background task for updating the database at regular intervals.
     """
-    while not stop_event.is_set():
-        logger.info(f"Fetching data from subreddit '{subreddit_name}'...")
-        scrape_subreddit_posts(subreddit_name)
-        logger.info(f"Waiting for {interval_minutes} minutes before fetching data again...")
-        stop_event.wait(interval_minutes * 60)  # Convert minutes to seconds
+    # Connections and browsers are kept open between updates
+    browser_pool = BrowserPool()
+    fetcher = ArticleFetcher(fallback=browser_pool)
+    try:
+        while not stop_event.is_set():
+            logger.info(f"Fetching data from subreddit '{subreddit_name}'...")
+            scrape_subreddit_posts(subreddit_name, fetcher)
+            logger.info(f"Waiting for {interval_minutes} minutes before fetching data again...")
+            stop_event.wait(interval_minutes * 60)  # Convert minutes to seconds
+    finally:
+        browser_pool.close()
+        fetcher.session.close()
 
 
 def infer_user_input(text: str):
@@ -141,9 +154,7 @@ def infer_user_input(text: str):
         for i in similar_documents.loc[:, columns].to_dict(orient="records"):
             logger.info(i)
 
-        content_text = ",".join(
-            [TextPreprocessor.preprocess_text(TextCleaner.clean_text(i)) for i in similar_documents["title"]]
-        )
+        content_text = ",".join(TextPreprocessor.preprocess_texts(TextCleaner.clean_texts(similar_documents["title"])))
         keywords = extract_keywords(content_text)
         logger.info("Keywords: %s", keywords)
     except Exception:
@@ -0,0 +1,88 @@
+import argparse
+
+from database import get_db
+from embeddings import encode_embedding, parse_json_embedding
+from settings import get_logger
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+logger = get_logger(__file__)
+
+
+def migrate_embeddings_to_binary(db: Session, page_size: int = 10_000, drop_json: bool = False):
+    """
+    Convert the embeddings stored in the legacy JSON `embedding` column into the binary `vector` column.
+
+    Embeddings are converted by pages and every page is committed, an interrupted migration resumes where it stopped.
+    The JSON column is kept unless `drop_json` is set. Returns the number of embeddings converted.
+    """
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns("embedding_vectors")}
+    if "vector" not in columns:
+        logger.info("Adding the binary 'vector' column")
+        db.execute(text("ALTER TABLE embedding_vectors ADD COLUMN vector BLOB"))
+        db.commit()
+    if "embedding" not in columns:
+        logger.info("No JSON embeddings left to convert")
+        return 0
+
+    n_converted = 0
+    while True:
+        rows = db.execute(
+            text(
+                "SELECT reddit_post_id, embedding FROM embedding_vectors"
+                " WHERE vector IS NULL AND embedding IS NOT NULL LIMIT :page_size"
+            ),
+            {"page_size": page_size},
+        ).all()
+        if not rows:
+            break
+        db.execute(
+            text("UPDATE embedding_vectors SET vector = :vector WHERE reddit_post_id = :reddit_post_id"),
+            [
+                {"reddit_post_id": row.reddit_post_id, "vector": encode_embedding(parse_json_embedding(row.embedding))}
+                for row in rows
+            ],
+        )
+        db.commit()
+        n_converted += len(rows)
+        logger.info(f"Converted '{n_converted}' embeddings")
+
+    n_empty = db.execute(
+        text("SELECT COUNT(*) FROM embedding_vectors WHERE vector IS NULL AND embedding IS NULL")
+    ).scalar()
+    if n_empty:
+        # Nothing to convert, the loader skips them until the posts are embedded again
+        logger.warning(f"Skipped '{n_empty}' rows without an embedding, their vector is left NULL")
+
+    if drop_json:
+        logger.info("Dropping the JSON 'embedding' column")
+        db.execute(text("ALTER TABLE embedding_vectors DROP COLUMN embedding"))
+        db.commit()
+    return n_converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database migrations of the Reddit scraper")
+    subparsers = parser.add_subparsers(dest="migration", help="Available migrations")
+
+    # Subparser for the "embeddings-to-binary" migration
+    binary_parser = subparsers.add_parser(
+        "embeddings-to-binary", help="Convert the JSON embeddings into binary float32 vectors"
+    )
+    binary_parser.add_argument("--page_size", type=int, default=10_000, help="Embeddings converted per commit")
+    binary_parser.add_argument("--drop_json", action="store_true", help="Drop the JSON column once converted")
+
+    args = parser.parse_args()
+    if args.migration == "embeddings-to-binary":
+        db = get_db()
+        try:
+            n_converted = migrate_embeddings_to_binary(db, args.page_size, args.drop_json)
+            logger.info(f"Converted '{n_converted}' embeddings to the binary format")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
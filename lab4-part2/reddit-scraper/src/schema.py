@@ -1,8 +1,8 @@
-import json
 from datetime import datetime
 from typing import Optional
 
 import numpy as np
+from embeddings import decode_embedding
 from pydantic import BaseModel
 
 
@@ -58,11 +58,9 @@ class EmbeddingData(BaseModel):
 
 class EmbeddingsModel(BaseModel):
     reddit_post_id: str
-    embedding: str
+    vector: bytes
 
     def get_embedding_array(self):
-        # Deserialize the JSON string into a Python dictionary
-        embedding = json.loads(self.embedding)
-        embedding_array = np.array(list(embedding), dtype=float)
+        embedding_array = decode_embedding(self.vector)
 
         return EmbeddingData(reddit_post_id=self.reddit_post_id, embedding_array=embedding_array)
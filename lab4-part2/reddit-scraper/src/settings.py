@@ -40,6 +40,15 @@ class Settings(BaseSettings):
     RANDOM_STATE: int = Field(default=42)
     OPTIMAL_CLUSTERS: int = Field(default=4)
 
+    FETCH_MAX_WORKERS: int = Field(default=16)
+    FETCH_PER_DOMAIN_LIMIT: int = Field(default=4)
+    FETCH_TIMEOUT: float = Field(default=10.0)
+    FETCH_FALLBACK_QUEUE_SIZE: int = Field(default=20)
+    BROWSER_POOL_SIZE: int = Field(default=2)
+
+    EMBEDDING_WORKERS: int = Field(default_factory=os.cpu_count)
+    EMBEDDING_PAGE_SIZE: int = Field(default=1000)
+
 
 def get_logger(name):
     # Create a logger
@@ -0,0 +1,37 @@
+import pytest
+from benchmark import legacy_clean_text, legacy_preprocess_texts
+from extract import TextCleaner, TextPreprocessor
+
+# Text -> (cleaned, without stopwords)
+GOLDEN = {
+    "Contact me at John.Doe@example.com for details!": ("contact me at for details", "contact details"),
+    "Read more at https://www.reuters.com/tech?id=42 or www.bbc.co.uk/news now.": ("read more at or now", "read "),
+    "<p>Breaking <b>news</b>:</p> <a href='x'>markets</a> rally": (
+        "breaking news markets rally",
+        "breaking news markets rally",
+    ),
+    "Café naïve résumé Zürich": ("cafe naive resume zurich", "cafe naive resume zurich"),
+    "I can't believe it's not butter, you wouldn't either.": (
+        "i cannot believe it is not butter you would not either",
+        "cannot believe not butter would not either",
+    ),
+    "This is the best of all the things we have never seen": (
+        "this is the best of all the things we have never seen",
+        "best things never seen",
+    ),
+    "  Spaces,   punctuation?!  and 123 numbers... ": ("spaces punctuation and numbers", "spaces punctuation numbers"),
+    "": ("", ""),
+}
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN.items())
+def test_clean_text(text, expected):
+    cleaned = TextCleaner.clean_text(text)
+    assert (cleaned, TextPreprocessor.preprocess_text(cleaned)) == expected
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN.items())
+def test_legacy_clean_text(text, expected):
+    # The benchmark compares the speed of both, their outputs must not differ
+    cleaned = legacy_clean_text(text)
+    assert (cleaned, legacy_preprocess_texts([cleaned])[0]) == expected
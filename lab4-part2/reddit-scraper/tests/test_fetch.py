@@ -0,0 +1,103 @@
+import threading
+
+import extract
+from extract import BrowserPool
+from fetch import ArticleFetcher
+from requests.exceptions import ConnectionError
+
+
+class FailingSession:
+    def get(self, url, timeout=None):
+        raise ConnectionError("refused")
+
+
+class FailingBrowser:
+    size = 1
+
+    def get_text(self, url):
+        raise RuntimeError("browser crashed")
+
+
+class FakeDriver:
+    page_source = "<p>Loaded</p>"
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        pass
+
+
+def test_fetch_all_returns_when_the_browser_raises():
+    fetcher = ArticleFetcher(
+        fallback=FailingBrowser(), session=FailingSession(), max_workers=4, fallback_queue_size=1
+    )
+    urls = [f"http://example.com/{i}" for i in range(20)]
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(fetcher.fetch_all(urls)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert result == dict.fromkeys(urls, "")
+
+
+def test_browsers_that_fail_to_start_free_their_place(monkeypatch):
+    starts = []
+
+    def initialize_driver():
+        starts.append(None)
+        if len(starts) == 1:
+            raise RuntimeError("chrome not found")
+        return FakeDriver()
+
+    monkeypatch.setattr(extract, "initialize_driver", initialize_driver)
+    pool = BrowserPool(size=1)
+
+    assert pool.get_text("http://example.com/1") == ""
+    assert pool.get_text("http://example.com/2") == "Loaded"
+    assert pool.get_text("http://example.com/3") == "Loaded"
+    assert len(starts) == 2
+    assert pool.started == 1
+
+
+def test_crashed_browsers_are_replaced(monkeypatch):
+    class CrashingDriver(FakeDriver):
+        quits = 0
+
+        def get(self, url):
+            raise extract.WebDriverException("chrome not reachable")
+
+        def quit(self):
+            CrashingDriver.quits += 1
+
+    drivers = [CrashingDriver(), FakeDriver()]
+    monkeypatch.setattr(extract, "initialize_driver", lambda: drivers.pop(0))
+    pool = BrowserPool(size=1)
+
+    assert pool.get_text("http://example.com/1") == ""
+    assert pool.get_text("http://example.com/2") == "Loaded"
+    assert CrashingDriver.quits == 1
+    assert pool.started == 1
+
+
+def test_fetch_all_keeps_going_past_unexpected_errors(monkeypatch):
+    class ParserErrorSession:
+        def get(self, url, timeout=None):
+            if url.endswith("/bad"):
+                raise UnicodeError("label empty or too long")
+            return FakeResponse()
+
+    class FakeResponse:
+        text = "<p>Loaded</p>"
+
+        def raise_for_status(self):
+            pass
+
+    fetcher = ArticleFetcher(
+        fallback=FailingBrowser(), session=ParserErrorSession(), max_workers=2
+    )
+    urls = ["http://example.com/bad", "http://example.org/good"]
+
+    assert fetcher.fetch_all(urls) == {urls[0]: "", urls[1]: "Loaded"}